@@ -1,20 +1,42 @@
+import time
+# Antes de cualquier import: el reporte de arranque mide el tiempo total de imports
+INICIO_ARRANQUE = time.perf_counter()
+
 from flask import Flask, render_template, request, jsonify, Response, session
 import os
-import cv2
-import numpy as np
-import base64
-import re
-from datetime import datetime
-import face_recognition
+import logging
+from datetime import datetime, timedelta
 import sqlite3
 from flask import redirect, url_for
 from decorators import facial_auth_required, role_required
+import visualizacion
 from visualizacion import visualizacion_bp
+from graficos import importar_matplotlib
+from indice_rostros import IndiceRostros, BackendLSH, crear_backend
+from config import Config
+from servicio_encoding import ServicioEncoding, ColaLlena
+from serializacion import migrar_encodings
+from enrolamiento_lote import enrolar_directorio
+from reconocimiento_flujo import partes_multipart, reconocer_flujo
+from carga_imagen import ImagenInvalida, leer_imagen, validar_imagen
+from calidad_rostro import CalidadInsuficiente
+from control_acceso import ControlAcceso
+from autorizaciones import normalizar_area
+from db import DB_PATH, get_conn, init_db, liberar_conexion, transaccion
+import resumen_diario
+import galeria_rostros
+import metricas
+import arranque
+import click
 import csv
-import json
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # necesario para sesiones
+app.config.from_object(Config)
+
+# Logs estructurados (JSON) con request_id y métricas de latencia por request (expuestas en /metrics)
+metricas.configurar_logs(app.config["LOG_NIVEL"])
+metricas.instalar(app)
 
 # Registrar el blueprint en una ruta base (ej: "/dashboard")
 app.register_blueprint(visualizacion_bp, url_prefix="/visualizacion")
@@ -24,39 +46,67 @@ SAVE_DIR = os.path.join(BASE_DIR, "Data")
 ROSTROS_DIR = os.path.join(BASE_DIR, "rostros")
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-
-DB_PATH = os.path.join(BASE_DIR, "Data", "usuarios.db")
-
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        email TEXT NOT NULL,
-        rostro_path TEXT,
-        role TEXT NOT NULL DEFAULT 'operador',
-        encoding TEXT
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS registros (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_empleado INTEGER,
-        username TEXT NOT NULL,
-        fecha TEXT NOT NULL,
-        hora_ingreso TEXT,
-        hora_egreso TEXT,
-        area TEXT,
-        FOREIGN KEY (id_empleado) REFERENCES usuarios(id)
-    )
-    """)
-    conn.commit()
-    conn.close()
-
+# Conexiones por hilo, esquema y migraciones viven en db.py
 init_db()
+app.teardown_appcontext(liberar_conexion)
+
+# Índice en memoria de encodings, compartido por todo el proceso
+if app.config["BACKEND_RECONOCIMIENTO"] == BackendLSH.nombre:
+    backend_rostros = crear_backend(BackendLSH.nombre, tablas=app.config["LSH_TABLAS"], bits=app.config["LSH_BITS"])
+else:
+    backend_rostros = crear_backend(app.config["BACKEND_RECONOCIMIENTO"])
+indice_rostros = IndiceRostros(backend=backend_rostros,
+                               snapshot_dir=app.config["SNAPSHOT_ROSTROS_DIR"] or None,
+                               intervalo_revision=app.config["SNAPSHOT_ROSTROS_REVISION"],
+                               candidatos_galeria=app.config["GALERIA_CANDIDATOS"])
+
+# Pool de procesos que hace el encoding facial fuera del hilo del request
+servicio_encoding = ServicioEncoding(
+    procesos=app.config["ENCODING_PROCESOS"],
+    max_pendientes=app.config["ENCODING_MAX_PENDIENTES"],
+    timeout=app.config["ENCODING_TIMEOUT"],
+    al_medir=lambda tiempos: [metricas.ETAPAS_RECONOCIMIENTO.observar(s, etapa=e) for e, s in tiempos.items()],
+)
+
+# Autorizaciones por área (molinetes de áreas críticas), en memoria y refrescadas desde el CSV
+control_acceso = ControlAcceso(app.config["AUTORIZACIONES_CSV"], intervalo=app.config["AUTORIZACIONES_REFRESCO"])
+
+# Precarga en segundo plano (PRECARGA=1) de lo que el arranque dejó para el primer uso
+precarga = arranque.Precarga([
+    ("imports", arranque.cargar_diferidos),
+    ("matplotlib", importar_matplotlib),
+    ("datasets", visualizacion.datasets.precargar),
+    ("indice_stock", visualizacion.motor_stock.precargar),
+    ("indice_rostros", indice_rostros.precargar),
+    ("modelos_encoding", servicio_encoding.precalentar),
+])
+
+@app.before_request
+def iniciar_precarga():
+    if app.config["PRECARGA"]:
+        precarga.iniciar()
+
+if not app.config["IMPORTS_DIFERIDOS"]:
+    importar_matplotlib()
+arranque.reportar_arranque(INICIO_ARRANQUE, precarga=app.config["PRECARGA"])
+
+@app.errorhandler(ColaLlena)
+def cola_encoding_llena(e):
+    mensaje = "⏳ El servidor está ocupado procesando otros rostros. Intente nuevamente en unos segundos."
+    respuesta = jsonify({"success": False, "message": mensaje, "error": mensaje})
+    respuesta.status_code = 503
+    respuesta.headers["Retry-After"] = str(app.config["ENCODING_RETRY_AFTER"])
+    return respuesta
+
+@app.errorhandler(TimeoutError)
+def encoding_timeout(e):
+    mensaje = "⏳ El reconocimiento facial tardó demasiado. Intente nuevamente."
+    return jsonify({"success": False, "message": mensaje, "error": mensaje}), 504
+
+@app.errorhandler(ImagenInvalida)
+def imagen_invalida(e):
+    mensaje = f"❌ {e}"
+    return jsonify({"success": False, "message": mensaje, "error": mensaje}), e.status
 
 # ====== RUTA PRINCIPAL ======
 @app.route("/")
@@ -75,11 +125,11 @@ def login():
         error = "❌ El usuario no coincide con el rostro detectado"
         return render_template("login.html", error=error)
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute("SELECT * FROM usuarios WHERE username=? AND password=?", (username, password))
-    user = c.fetchone()
-    conn.close()
+    with metricas.CONSULTAS_DB.medir(consulta="login_usuario"):
+        c.execute("SELECT * FROM usuarios WHERE username=? AND password=?", (username, password))
+        user = c.fetchone()
 
     if user:
         session["user"] = username
@@ -102,120 +152,225 @@ def login():
 # ====== LOGIN CON RECONOCIMIENTO FACIAL ======
 @app.route("/login_face", methods=["POST"])
 def login_face():
-    data = request.get_json()
-    image_data = re.sub('^data:image/.+;base64,', '', data['image'])
-    image_bytes = base64.b64decode(image_data)
-
-    np_arr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-    face_encodings = face_recognition.face_encodings(frame)
-    if not face_encodings:
-        return jsonify({"success": False, "message": "❌ No se detectó rostro en la imagen"})
-    input_encoding = face_encodings[0]
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT username, encoding, role FROM usuarios WHERE encoding IS NOT NULL")
-    rostros = c.fetchall()
-    conn.close()
-
-    usuario_identificado = None
-
-    for username, encoding_json, role in rostros:
-        if encoding_json:
-            known_encoding = np.array(json.loads(encoding_json))
-            match = face_recognition.compare_faces([known_encoding], input_encoding, tolerance=0.6)
-            if match[0]:
-                usuario_identificado = username
-                break
-
-    if usuario_identificado:
-        session["pending_face_user"] = usuario_identificado
+    tiempos = {}
+    # Imagen binaria (cuerpo directo o multipart) o, por compatibilidad, JSON con data URL
+    inicio = time.perf_counter()
+    image_bytes = leer_imagen(request, app.config["IMAGEN_MAX_BYTES"], app.config["IMAGEN_MAX_LADO"])
+    _medir_etapa(tiempos, "lectura", inicio)
+
+    # imdecode, detección, control de calidad y encoding se miden dentro del worker
+    try:
+        input_encoding = servicio_encoding.codificar(image_bytes, app.config["DETECCION_LOGIN"], tiempos)
+    except CalidadInsuficiente as e:
+        # Rechazado antes del encoding: el kiosco usa el motivo para indicarle al usuario qué corregir
+        _resultado_login("login_face", e.motivo, tiempos, calidad=e.medidas)
+        return jsonify({"success": False, "message": f"⚠️ {e}", "motivo": e.motivo, "calidad": e.medidas})
+    if input_encoding is None:
+        _resultado_login("login_face", "sin_rostro", tiempos)
+        return jsonify({"success": False, "message": "❌ No se detectó rostro en la imagen", "motivo": "sin_rostro"})
+
+    # Se elige el más cercano de toda la plantilla y recién después se aplica el umbral
+    inicio = time.perf_counter()
+    resultado = indice_rostros.buscar(input_encoding)
+    _medir_etapa(tiempos, "matching", inicio)
+    coincidencia = {
+        "distancia": None if resultado.distancia is None else round(resultado.distancia, 4),
+        "margen": None if resultado.margen is None else round(resultado.margen, 4),
+        "umbral": app.config["UMBRAL_RECONOCIMIENTO"],
+        "backend": indice_rostros.backend.nombre,
+    }
+
+    if resultado.username is not None and resultado.distancia <= app.config["UMBRAL_RECONOCIMIENTO"]:
+        _resultado_login("login_face", "coincidencia", tiempos, username=resultado.username, **coincidencia)
+        session["pending_face_user"] = resultado.username
         return jsonify({
             "success": True,
             "message": f"✅ Rostro identificado. Por favor, ingrese su usuario y contraseña.",
-            "username": usuario_identificado
+            "username": resultado.username,
+            **coincidencia
         })
 
-    return jsonify({"success": False, "message": "❌ Rostro no coincide con ningún usuario registrado"})
+    _resultado_login("login_face", "sin_coincidencia", tiempos, **coincidencia)
+    return jsonify({"success": False, "message": "❌ Rostro no coincide con ningún usuario registrado", **coincidencia})
+
+def _medir_etapa(tiempos, etapa, inicio):
+    tiempos[etapa] = time.perf_counter() - inicio
+    metricas.ETAPAS_RECONOCIMIENTO.observar(tiempos[etapa], etapa=etapa)
+
+def _resultado_login(endpoint, resultado, tiempos=None, **campos):
+    # Contador por resultado y un log estructurado con los milisegundos de cada etapa
+    metricas.RESULTADOS_LOGIN.incrementar(endpoint=endpoint, resultado=resultado)
+    if tiempos:
+        campos["etapas_ms"] = {etapa: round(s * 1000, 2) for etapa, s in tiempos.items()}
+    metricas.registrar_evento(endpoint, resultado=resultado, **campos)
+
+# ====== LOGIN CON FLUJO CONTINUO DE LA CÁMARA (KIOSCO / MOLINETE) ======
+@app.route("/login_face/stream", methods=["POST"])
+def login_face_stream():
+    # Cuerpo multipart (MJPEG multipart/x-mixed-replace o form-data con Transfer-Encoding: chunked),
+    # una imagen JPEG/PNG por parte; se procesa a medida que llega
+    boundary = request.mimetype_params.get("boundary")
+    if not request.mimetype.startswith("multipart/") or not boundary:
+        return jsonify({"success": False, "message": "❌ Se esperaba un flujo multipart de imágenes"}), 400
+
+    perfil = app.config["DETECCION_LOGIN"]
+    rechazos = {}
+    max_bytes, max_lado = app.config["IMAGEN_MAX_BYTES"], app.config["IMAGEN_MAX_LADO"]
+    # Cada frame pasa por los mismos límites que /login_face antes de decodificarse; uno
+    # inválido corta el flujo con el mismo error (ImagenInvalida, 400/413/415)
+    frames = (validar_imagen(parte, max_bytes, max_lado)
+              for parte in partes_multipart(request.stream, boundary, max_bytes_parte=max_bytes))
+
+    def analizar(imagen, caja):
+        # Un frame que no pasa el control de calidad cuenta como frame sin rostro
+        try:
+            return servicio_encoding.analizar(imagen, perfil, caja)
+        except CalidadInsuficiente as e:
+            rechazos[e.motivo] = rechazos.get(e.motivo, 0) + 1
+            return None, None
+
+    resultado = reconocer_flujo(
+        frames,
+        analizar=analizar,
+        buscar=indice_rostros.buscar,
+        umbral=app.config["UMBRAL_RECONOCIMIENTO"],
+        detectar_cada=app.config["STREAM_DETECTAR_CADA"],
+        confirmaciones=app.config["STREAM_CONFIRMACIONES"],
+        max_frames=app.config["STREAM_MAX_FRAMES"],
+        timeout=app.config["STREAM_TIMEOUT"],
+        ancho_seguimiento=perfil["ancho_deteccion"],
+    )
+
+    estadisticas = {
+        "frames": resultado.frames,
+        "detecciones": resultado.detecciones,
+        "encodings": resultado.encodings,
+        "motivo": resultado.motivo,
+        "rechazos_calidad": rechazos,
+        "umbral": app.config["UMBRAL_RECONOCIMIENTO"],
+    }
+    if resultado.username is None:
+        _resultado_login("login_face_stream", "sin_rostro" if not resultado.encodings else "sin_coincidencia",
+                         **estadisticas)
+        return jsonify({"success": False, "message": "❌ No se pudo confirmar la identidad en el flujo", **estadisticas})
+
+    _resultado_login("login_face_stream", "coincidencia", username=resultado.username, **estadisticas)
+    session["pending_face_user"] = resultado.username
+    return jsonify({
+        "success": True,
+        "message": f"✅ Rostro identificado. Por favor, ingrese su usuario y contraseña.",
+        "username": resultado.username,
+        "distancia": round(resultado.distancia, 4),
+        **estadisticas
+    })
+
+# ====== CONTROL DE ACCESO A ÁREAS (MOLINETE, DESPUÉS DEL RECONOCIMIENTO FACIAL) ======
+@app.route("/acceso/<area>", methods=["POST"])
+def verificar_acceso(area):
+    # El usuario sale del rostro identificado en /login_face o /login_face/stream (o de la sesión)
+    username = session.get("pending_face_user") or (session.get("authenticated") and session.get("user"))
+    if not username:
+        return jsonify({"success": False, "permitido": False, "motivo": "sin_identificar",
+                        "message": "❌ Primero debe identificarse con reconocimiento facial"}), 401
+
+    # El CSV de autorizaciones identifica al empleado por su legajo (usuarios.legajo, ver asignar-legajo)
+    with metricas.CONSULTAS_DB.medir(consulta="legajo"):
+        fila = get_conn().execute("SELECT legajo FROM usuarios WHERE username = ?", (username,)).fetchone()
+    if fila is None:
+        permitido, motivo = False, "usuario_inexistente"
+    elif fila[0] is None:
+        permitido, motivo = False, "sin_legajo"
+    else:
+        permitido, motivo = control_acceso.decidir(fila[0], area)
+
+    # Las áreas libres se agrupan para no abrir una serie de métricas por cada nombre recibido
+    etiqueta = normalizar_area(area) if motivo in ("autorizado", "no_autorizado", "sin_autorizacion") else "otras"
+    metricas.ACCESOS_AREA.incrementar(area=etiqueta, motivo=motivo)
+    metricas.registrar_evento("acceso_area", logging.INFO if permitido else logging.WARNING,
+                              username=username, area=area, permitido=permitido, motivo=motivo)
+
+    mensaje = f"✅ Acceso permitido a {area}" if permitido else f"⛔ {username} no está autorizado a ingresar a {area}"
+    return jsonify({
+        "success": permitido,
+        "permitido": permitido,
+        "motivo": motivo,
+        "area": area,
+        "username": username,
+        "legajo": None if fila is None else fila[0],
+        "message": mensaje,
+    }), 200 if permitido else 403
 
 # Función para registrar ingreso automático
-def registrar_ingreso_automatico(username):
+def registrar_ingreso_automatico(username, area="Sistema"):
     ahora = datetime.now()
     fecha_actual = ahora.strftime("%d/%m/%Y")
     hora_actual = ahora.strftime("%H:%M")
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    # Buscar usuario
-    c.execute("SELECT id FROM usuarios WHERE username = ?", (username,))
-    usuario = c.fetchone()
-    if not usuario:
-        conn.close()
-        print(f"❌ Usuario {username} no encontrado en la base de datos")
-        return False
-
-    user_id = usuario[0]
-
-    # Verificar si ya existe un ingreso sin egreso hoy
-    c.execute("""
-        SELECT id FROM registros
-        WHERE id_empleado=? AND fecha=? AND hora_ingreso IS NOT NULL 
-        AND (hora_egreso IS NULL OR hora_egreso='')
-    """, (user_id, fecha_actual))
-    existe = c.fetchone()
-
-    if existe:
-        conn.close()
-        print(f"ℹ️ {username} ya tiene un ingreso registrado hoy sin egreso")
+    ingreso_ts = ahora.isoformat(timespec="seconds")
+    inicio_ventana = (ahora - timedelta(hours=app.config["SESION_MAX_HORAS"])).isoformat(timespec="seconds")
+
+    # Búsqueda del usuario, control de sesión abierta e INSERT en una sola sentencia atómica
+    with metricas.CONSULTAS_DB.medir(consulta="registrar_ingreso"), transaccion() as c:
+        c.execute("""
+            INSERT INTO registros (id_empleado, username, fecha, hora_ingreso, area, ingreso_ts)
+            SELECT u.id, u.username, ?, ?, ?, ?
+            FROM usuarios u
+            WHERE u.username = ?
+            AND NOT EXISTS (
+                SELECT 1 FROM registros r
+                WHERE r.id_empleado = u.id AND r.egreso_ts IS NULL AND r.ingreso_ts >= ?
+            )
+        """, (fecha_actual, hora_actual, area, ingreso_ts, username, inicio_ventana))
+        insertado = c.rowcount == 1
+        if insertado:
+            resumen_diario.actualizar_dia(c, username, ingreso_ts)
+
+    if not insertado:
+        # Solo en el caso de rechazo se averigua el motivo, para el log
+        existe = get_conn().execute("SELECT 1 FROM usuarios WHERE username = ?", (username,)).fetchone()
+        if not existe:
+            metricas.registrar_evento("ingreso_rechazado", logging.WARNING, username=username,
+                                      motivo="usuario_inexistente")
+        else:
+            metricas.registrar_evento("ingreso_rechazado", username=username, motivo="sesion_abierta")
         return False
 
-    # Insertar nuevo ingreso
-    c.execute("""
-        INSERT INTO registros (id_empleado, username, fecha, hora_ingreso, area)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, username, fecha_actual, hora_actual, "Sistema"))
-    conn.commit()
-    conn.close()
-
-    print(f"✅ Ingreso registrado automáticamente para {username} a las {hora_actual}")
+    metricas.registrar_evento("ingreso_registrado", username=username, area=area, ingreso_ts=ingreso_ts)
     return True
 
 # Agregar esta función para registrar egreso
 def registrar_egreso_automatico(username):
     ahora = datetime.now()
-    fecha_actual = ahora.strftime("%d/%m/%Y")
     hora_actual = ahora.strftime("%H:%M")
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    # Buscar el último ingreso del día sin egreso
-    print(f"🔍 Buscando ingreso sin egreso para {username} en {fecha_actual}")
-    c.execute("""
-        SELECT id FROM registros
-        WHERE username=? AND fecha=? AND hora_ingreso IS NOT NULL 
-        AND (hora_egreso IS NULL OR hora_egreso='')
-        ORDER BY id DESC LIMIT 1
-    """, (username, fecha_actual))
-    registro = c.fetchone()
-    print(f"Resultado de búsqueda: {registro}")
-
-    if not registro:
-        conn.close()
-        print(f"⚠️ No se encontró ingreso pendiente de egreso para {username}")
+    egreso_ts = ahora.isoformat(timespec="seconds")
+    inicio_ventana = (ahora - timedelta(hours=app.config["SESION_MAX_HORAS"])).isoformat(timespec="seconds")
+
+    # Cierra el último ingreso abierto aunque haya empezado el día anterior (turnos de noche)
+    # El lock de escritura se toma al inicio, así la sesión elegida no puede cambiar antes del UPDATE
+    with metricas.CONSULTAS_DB.medir(consulta="registrar_egreso"), transaccion() as c:
+        abierta = c.execute("""
+            SELECT id, ingreso_ts FROM registros
+            WHERE username = ? AND egreso_ts IS NULL AND ingreso_ts >= ?
+            ORDER BY ingreso_ts DESC LIMIT 1
+        """, (username, inicio_ventana)).fetchone()
+        actualizado = abierta is not None
+        if actualizado:
+            c.execute("UPDATE registros SET hora_egreso = ?, egreso_ts = ? WHERE id = ?",
+                      (hora_actual, egreso_ts, abierta[0]))
+            # El resumen del día del ingreso se actualiza en la misma transacción
+            resumen_diario.actualizar_dia(c, username, abierta[1])
+
+    if not actualizado:
+        metricas.registrar_evento("egreso_rechazado", logging.WARNING, username=username, motivo="sin_ingreso_abierto")
         return False
 
-    # Actualizar con hora de egreso
-    c.execute("UPDATE registros SET hora_egreso=? WHERE id=?", (hora_actual, registro[0]))
-    conn.commit()
-    conn.close()
-
-    print(f"✅ Egreso registrado automáticamente para {username} a las {hora_actual}")
+    metricas.registrar_evento("egreso_registrado", username=username, egreso_ts=egreso_ts)
     return True
 
+# ====== MÉTRICAS (formato de texto de Prometheus) ======
+@app.route("/metrics")
+def metrics():
+    return Response(metricas.registro.exposicion(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Modificar la ruta de logout
 @app.route("/logout")
 def logout():
@@ -254,17 +409,16 @@ def register():
             error = "❌ Las contraseñas no coinciden"
             return render_template("register.html", error=error)
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_conn()
         c = conn.cursor()
         try:
             c.execute("INSERT INTO usuarios (username, password, email, role) VALUES (?, ?, ?, ?)",
                       (username, password, email, role))
             conn.commit()
         except sqlite3.IntegrityError:
-            conn.close()
+            conn.rollback()
             error = "❌ El usuario ya existe"
             return render_template("register.html", error=error)
-        conn.close()
         # Guardar el usuario en sesión temporal para el registro facial
         session["user"] = username
         require_face = True
@@ -273,30 +427,27 @@ def register():
 
 @app.route("/register_face", methods=["POST"])
 def register_face():
-    data = request.get_json()
-    image_data = re.sub('^data:image/.+;base64,', '', data['image'])
-    image_bytes = base64.b64decode(image_data)
+    image_bytes = leer_imagen(request, app.config["IMAGEN_MAX_BYTES"], app.config["IMAGEN_MAX_LADO"])
 
     username = session.get("user", None)
     if not username:
         return jsonify({"error": "No se pudo registrar el rostro del usuario"}), 400
 
-    # Convertir a imagen OpenCV
-    np_arr = np.frombuffer(image_bytes, np.uint8)
-    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-
-    # Obtener encoding del rostro capturado
-    new_encodings = face_recognition.face_encodings(frame)
-    if not new_encodings:
-        return jsonify({"error": "No se detectó rostro en la imagen"}), 400
-    new_encoding = new_encodings[0]
-
-    # Guardar encoding como JSON en DB
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE usuarios SET encoding=? WHERE username=?", (json.dumps(new_encoding.tolist()), username))
-    conn.commit()
-    conn.close()
+    # Obtener encoding del rostro capturado (decodificación y encoding corren en el pool)
+    try:
+        new_encoding = servicio_encoding.codificar(image_bytes, app.config["DETECCION_REGISTRO"])
+    except CalidadInsuficiente as e:
+        # La foto del registro es la referencia de todos los logins: se pide otra antes de guardarla
+        return jsonify({"error": str(e), "motivo": e.motivo, "calidad": e.medidas}), 400
+    if new_encoding is None:
+        return jsonify({"error": "No se detectó rostro en la imagen", "motivo": "sin_rostro"}), 400
+
+    # Cada captura se suma a la galería del usuario (las más viejas se descartan) y
+    # usuarios.encoding pasa a ser el centroide de la galería
+    with metricas.CONSULTAS_DB.medir(consulta="registrar_rostro"), transaccion() as c:
+        centroide, galeria = galeria_rostros.agregar(c, username, new_encoding, app.config["GALERIA_MAX"],
+                                                     origen="register_face")
+    indice_rostros.actualizar(username, centroide, galeria)
 
     return jsonify({
     "success": "✅ Te registraste correctamente.",
@@ -307,11 +458,11 @@ def register_face():
 def register_face_reject():
     username = session.get("user", None)
     if username:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_conn()
         c = conn.cursor()
         c.execute("DELETE FROM usuarios WHERE username=?", (username,))
         conn.commit()
-        conn.close()
+        indice_rostros.eliminar(username)
         session.pop("user", None)
     return render_template("register.html", rejected=True)
 
@@ -327,6 +478,59 @@ def dashboard():
         return render_template("dashboard_operador.html", username=username)
 
 
+# ====== COMANDOS DE MANTENIMIENTO (flask --app App <comando>) ======
+@app.cli.command("migrar-encodings")
+def migrar_encodings_command():
+    """Convierte los encodings guardados como JSON al formato binario."""
+    usuarios, galeria, antes, despues = migrar_encodings(DB_PATH)
+    print(f"✅ {usuarios} encodings de usuarios y {galeria} de galerías migrados. "
+          f"Tamaño de la DB: {antes / 1024:.1f} KB → {despues / 1024:.1f} KB")
+
+@app.cli.command("enrolar-rostros")
+@click.argument("directorio", default=ROSTROS_DIR, type=click.Path(exists=True, file_okay=False))
+@click.option("--procesos", type=int, default=None, help="Procesos para el encoding (por defecto, uno por núcleo).")
+@click.option("--password-inicial", default=None, help="Contraseña para los usuarios nuevos (por defecto, una aleatoria).")
+def enrolar_rostros_command(directorio, procesos, password_inicial):
+    """Enrola en lote las imágenes de un directorio (nombre del archivo = usuario)."""
+    resumen = enrolar_directorio(directorio, app.config["DETECCION_REGISTRO"], procesos, password_inicial,
+                                 galeria_max=app.config["GALERIA_MAX"])
+    print(f"📂 {resumen['encontradas']} imágenes encontradas, {resumen['salteadas']} ya procesadas")
+    print(f"✅ {resumen['enrolados']} rostros enrolados ({resumen['usuarios_nuevos']} usuarios nuevos), "
+          f"{resumen['sin_rostro']} sin rostro detectado")
+    if resumen["rechazadas_calidad"]:
+        detalle = ", ".join(f"{motivo}: {n}" for motivo, n in sorted(resumen["rechazadas_calidad"].items()))
+        print(f"⚠️ Rechazadas por calidad de imagen: {detalle}")
+    print(f"⏱️ {resumen['procesadas']} imágenes en {resumen['segundos']:.1f} s "
+          f"({resumen['imagenes_por_segundo']:.1f} imágenes/s)")
+
+@app.cli.command("asignar-legajo")
+@click.argument("username")
+@click.argument("legajo", type=int)
+def asignar_legajo_command(username, legajo):
+    """Asocia un usuario con su legajo (el id_empleado de autorizaciones.csv)."""
+    try:
+        with transaccion() as c:
+            c.execute("UPDATE usuarios SET legajo = ? WHERE username = ?", (legajo, username))
+            actualizados = c.rowcount
+    except sqlite3.IntegrityError:
+        raise click.ClickException(f"el legajo {legajo} ya está asignado a otro usuario")
+    if not actualizados:
+        raise click.ClickException(f"no existe el usuario {username}")
+    print(f"✅ {username} → legajo {legajo}")
+
+@app.cli.command("reconstruir-resumen")
+@click.option("--desde", default=None, help="Primer día a regenerar (AAAA-MM-DD); por defecto, todo.")
+def reconstruir_resumen_command(desde):
+    """Regenera la tabla resumen_diario a partir de registros."""
+    if desde is not None:
+        try:
+            datetime.strptime(desde, "%Y-%m-%d")
+        except ValueError:
+            raise click.BadParameter("usar el formato AAAA-MM-DD", param_hint="--desde")
+    inicio = time.perf_counter()
+    with transaccion() as c:
+        filas = resumen_diario.reconstruir(c, desde)
+    print(f"✅ resumen_diario regenerado: {filas} filas (empleado x día) en {time.perf_counter() - inicio:.1f} s")
 
 if __name__ == "__main__":
      app.run(port=int(os.environ.get("FLASK_PORT", 5000)))
\ No newline at end of file
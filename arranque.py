@@ -0,0 +1,129 @@
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+import metricas
+from config import Config
+
+# Arranque en frío: pandas, matplotlib y cv2 suman ~1 s de imports que no hacen falta para
+# servir /login. Los módulos que los usan los piden con importar_diferido y se importan
+# recién cuando una ruta los usa. Con PRECARGA, un hilo los importa (y carga datasets,
+# índice de rostros y modelos) en segundo plano apenas llega el primer request.
+
+# Módulos diferidos (nombre -> ModuloDiferido), para el reporte de arranque y la precarga
+_diferidos = {}
+
+
+class ModuloDiferido:
+    """Se comporta como el módulo `nombre`, pero lo importa recién al usar un atributo.
+
+    El import lo hace importlib.import_module, así que es seguro entre hilos: si dos
+    requests lo piden a la vez, el segundo espera a que el módulo termine de cargarse.
+    """
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+
+    def __getattr__(self, atributo):
+        modulo = self._modulo
+        if modulo is None:
+            modulo = self.cargar()
+        return getattr(modulo, atributo)
+
+    def cargar(self):
+        if self._modulo is None:
+            inicio = time.perf_counter()
+            modulo = importlib.import_module(self._nombre)
+            if self._modulo is None:
+                self._modulo = modulo
+                segundos = time.perf_counter() - inicio
+                metricas.ARRANQUE.observar(segundos, etapa=f"import:{self._nombre}")
+                metricas.registrar_evento("import_diferido", modulo=self._nombre, ms=round(segundos * 1000, 1),
+                                          hilo=threading.current_thread().name)
+        return self._modulo
+
+    @property
+    def cargado(self):
+        return self._modulo is not None
+
+    def __repr__(self):
+        estado = "cargado" if self.cargado else "sin cargar"
+        return f"<módulo diferido {self._nombre!r} ({estado})>"
+
+
+def importar_diferido(nombre):
+    """Módulo `nombre` importado recién en su primer uso (con IMPORTS_DIFERIDOS=0, en el acto).
+
+    Como un import común, lanza ImportError en el acto si el módulo no está instalado.
+    """
+    if not Config.IMPORTS_DIFERIDOS:
+        return importlib.import_module(nombre)
+    if importlib.util.find_spec(nombre) is None:
+        raise ModuleNotFoundError(f"No module named {nombre!r}", name=nombre)
+    if nombre not in _diferidos:
+        _diferidos[nombre] = ModuloDiferido(nombre)
+    return _diferidos[nombre]
+
+
+def cargar_diferidos():
+    """Importa los módulos diferidos que todavía no se usaron."""
+    for modulo in list(_diferidos.values()):
+        modulo.cargar()
+
+
+def pendientes():
+    return sorted(nombre for nombre, modulo in _diferidos.items() if not modulo.cargado)
+
+
+def reportar_arranque(inicio, **campos):
+    """Registra cuánto tardó el arranque desde `inicio` (perf_counter), en logs y en /metrics."""
+    segundos = time.perf_counter() - inicio
+    metricas.ARRANQUE.observar(segundos, etapa="imports")
+    metricas.registrar_evento("arranque", ms=round(segundos * 1000, 1),
+                              imports_diferidos=Config.IMPORTS_DIFERIDOS, pendientes=pendientes(), **campos)
+    return segundos
+
+
+class Precarga:
+    """Hilo de fondo que ejecuta las `tareas` ([(nombre, función)]) una sola vez por proceso.
+
+    Se inicia con el primer request (no al importar la app): con gunicorn --preload el hilo
+    corre en el worker, después del fork, y no en el proceso maestro.
+    """
+
+    def __init__(self, tareas):
+        self.tareas = tareas
+        self.tiempos = {}
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return self._hilo
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name="precarga", daemon=True)
+                self._hilo.start()
+        return self._hilo
+
+    def _ejecutar(self):
+        inicio = time.perf_counter()
+        for nombre, tarea in self.tareas:
+            inicio_tarea = time.perf_counter()
+            try:
+                tarea()
+            except Exception as e:
+                # La precarga es una optimización: si falla, la ruta lo carga al usarlo
+                metricas.registrar_evento("precarga_error", nivel=logging.WARNING, tarea=nombre, error=str(e))
+                continue
+            segundos = time.perf_counter() - inicio_tarea
+            self.tiempos[nombre] = segundos
+            metricas.ARRANQUE.observar(segundos, etapa=f"precarga:{nombre}")
+        metricas.registrar_evento("precarga", ms=round((time.perf_counter() - inicio) * 1000, 1),
+                                  etapas_ms={n: round(s * 1000, 1) for n, s in self.tiempos.items()})
+
+    def esperar(self, timeout=None):
+        if self._hilo is not None:
+            self._hilo.join(timeout)
@@ -0,0 +1,80 @@
+import csv
+import unicodedata
+from datetime import datetime
+
+# Autorizaciones de ingreso a áreas críticas (Data/autorizaciones.csv) copiadas a SQLite con
+# clave (id_empleado, area). El área se guarda normalizada (sin tildes ni mayúsculas), así
+# "Cámara Fría" y "camara fria" son la misma puerta.
+
+FUENTE_CSV = "autorizaciones.csv"
+
+_VALORES_SI = {"si", "sí", "s", "1", "true", "yes"}
+
+
+def normalizar_area(area):
+    sin_tildes = unicodedata.normalize("NFKD", area).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_tildes.casefold().split())
+
+
+def crear_tabla(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS autorizaciones (
+        id_empleado INTEGER NOT NULL,
+        area TEXT NOT NULL,
+        area_nombre TEXT NOT NULL,
+        nombre TEXT,
+        autorizado INTEGER NOT NULL,
+        PRIMARY KEY (id_empleado, area)
+    ) WITHOUT ROWID
+    """)
+    # Huella (mtime y tamaño) del archivo importado, compartida por todos los procesos
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS importaciones (
+        fuente TEXT PRIMARY KEY,
+        huella TEXT NOT NULL,
+        fecha TEXT NOT NULL
+    )
+    """)
+    # Mismo contador de cambios que registros: cada proceso sabe cuándo recargar su índice
+    c.execute("INSERT OR IGNORE INTO versiones_tablas (tabla, version) VALUES ('autorizaciones', 0)")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_autorizaciones_version_{evento.lower()}
+        AFTER {evento} ON autorizaciones
+        BEGIN
+            UPDATE versiones_tablas SET version = version + 1 WHERE tabla = 'autorizaciones';
+        END
+        """)
+
+
+def huella_importada(c, fuente=FUENTE_CSV):
+    fila = c.execute("SELECT huella FROM importaciones WHERE fuente = ?", (fuente,)).fetchone()
+    return fila[0] if fila else None
+
+
+def importar_csv(c, ruta, huella, fuente=FUENTE_CSV):
+    """Reemplaza la tabla con el contenido del CSV (en la transacción de `c`). Devuelve las filas."""
+    with open(ruta, newline="", encoding="utf-8") as f:
+        filas = {}
+        for fila in csv.DictReader(f):
+            area = fila["area_critica"].strip()
+            # Si un empleado figura dos veces para la misma área, vale la última fila
+            filas[(int(fila["id_empleado"]), normalizar_area(area))] = (
+                area, (fila.get("nombre") or "").strip(), int(fila["autorizado"].strip().casefold() in _VALORES_SI))
+    c.execute("DELETE FROM autorizaciones")
+    c.executemany(
+        "INSERT INTO autorizaciones (id_empleado, area, area_nombre, nombre, autorizado) VALUES (?, ?, ?, ?, ?)",
+        ((id_empleado, area, *datos) for (id_empleado, area), datos in filas.items()),
+    )
+    c.execute("""
+        INSERT INTO importaciones (fuente, huella, fecha) VALUES (?, ?, ?)
+        ON CONFLICT(fuente) DO UPDATE SET huella = excluded.huella, fecha = excluded.fecha
+    """, (fuente, huella, datetime.now().isoformat(timespec="seconds")))
+    return len(filas)
+
+
+def leer_indice(conn):
+    """({(id_empleado, area): autorizado}, {áreas críticas}) para decidir sin tocar la DB."""
+    indice = {(id_empleado, area): bool(autorizado)
+              for id_empleado, area, autorizado in conn.execute("SELECT id_empleado, area, autorizado FROM autorizaciones")}
+    return indice, {area for _, area in indice}
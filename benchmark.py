@@ -0,0 +1,347 @@
+"""Benchmark reproducible del login facial, de los dashboards y del arranque de la app.
+
+Arma un entorno descartable (usuarios.db y Data/ propios, vía USUARIOS_DB y DATA_DIR),
+así nunca toca la base real:
+
+    python benchmark.py --usuarios 100,1000,10000,100000 --escalas 1,10,100 --salida bench.json
+    python benchmark.py --comparar bench_anterior.json   # sale con código 1 si hay regresiones
+    python benchmark.py --solo arranque                  # arranque en frío (import App)
+"""
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import click
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROSTROS_DIR = os.path.join(BASE_DIR, "rostros")
+DATA_ORIGEN = os.path.join(BASE_DIR, "Data")
+
+# Dispersión por componente de los encodings sintéticos (parecida a la de los de face_recognition)
+DESVIO_ENCODING = 0.09
+
+
+def _enteros(valor):
+    return [int(v) for v in valor.split(",") if v.strip()]
+
+
+def _estadisticas(latencias, segundos):
+    """p50/p95/p99 y media en ms, más requests por segundo (sobre el tiempo total de pared)."""
+    ms = np.asarray(latencias) * 1000
+    return {
+        "requests": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "media_ms": round(float(ms.mean()), 3),
+        "rps": round(len(ms) / segundos, 2) if segundos else None,
+    }
+
+
+def _medir(pedido, repeticiones, hilos=1):
+    """Ejecuta `pedido()` `repeticiones` veces (en `hilos` hilos) y devuelve (latencias, segundos, respuestas)."""
+    def uno(_):
+        inicio = time.perf_counter()
+        respuesta = pedido()
+        return time.perf_counter() - inicio, respuesta
+
+    inicio = time.perf_counter()
+    if hilos > 1:
+        with ThreadPoolExecutor(max_workers=hilos) as executor:
+            resultados = list(executor.map(uno, range(repeticiones)))
+    else:
+        resultados = [uno(i) for i in range(repeticiones)]
+    segundos = time.perf_counter() - inicio
+    return [r[0] for r in resultados], segundos, [r[1] for r in resultados]
+
+
+# ====== DATOS SINTÉTICOS ======
+def escalar_csvs(destino, escala):
+    """Copia los CSV de Data/ multiplicando sus filas por `escala`.
+
+    Cada réplica corre las fechas un período completo hacia adelante, así las claves
+    (fecha, turno) siguen siendo únicas y los joins del OEE escalan linealmente. Los
+    CSV sin fechas (maestros como proveedores o autorizaciones) se copian sin escalar.
+    """
+    from datasets import DATASETS
+
+    os.makedirs(destino, exist_ok=True)
+    fechas_por_archivo = {spec.archivo: spec.fechas for spec in DATASETS.values()}
+    for archivo in os.listdir(DATA_ORIGEN):
+        if not archivo.endswith(".csv"):
+            continue
+        origen = os.path.join(DATA_ORIGEN, archivo)
+        fechas = fechas_por_archivo.get(archivo)
+        if escala == 1 or not fechas:
+            shutil.copyfile(origen, os.path.join(destino, archivo))
+            continue
+        df = pd.read_csv(origen, dtype=str, keep_default_na=False)
+        parseadas = {col: pd.to_datetime(df[col], format=fmt) for col, fmt in fechas.items()}
+        periodo = max((s.max() - s.min()).days for s in parseadas.values()) + 1
+        replicas = []
+        for k in range(escala):
+            replica = df.copy()
+            for col, fmt in fechas.items():
+                replica[col] = (parseadas[col] + pd.Timedelta(days=k * periodo)).dt.strftime(fmt)
+            replicas.append(replica)
+        pd.concat(replicas, ignore_index=True).to_csv(os.path.join(destino, archivo), index=False)
+
+
+def cargar_plantilla(conn, cantidad, reales, semilla=0):
+    """Deja en usuarios `cantidad` encodings aleatorios más los rostros reales de rostros/."""
+    from serializacion import encoding_a_blob
+
+    rng = np.random.default_rng(semilla)
+    c = conn.cursor()
+    c.execute("DELETE FROM usuarios")
+    c.executemany(
+        "INSERT INTO usuarios (username, password, email, role, encoding) VALUES (?, ?, ?, 'operador', ?)",
+        ((f"sintetico_{i}", "bench", f"sintetico_{i}@bench", encoding_a_blob(e))
+         for i, e in enumerate(rng.normal(0, DESVIO_ENCODING, (cantidad, 128)).astype(np.float32))),
+    )
+    c.executemany(
+        "INSERT INTO usuarios (username, password, email, role, encoding) VALUES (?, 'bench', ?, 'ADMIN', ?)",
+        ((username, f"{username}@bench", encoding_a_blob(encoding)) for username, encoding in reales.items()),
+    )
+    conn.commit()
+
+
+def cargar_registros(conn, empleados, dias, semilla=0):
+    """Ingresos y egresos sintéticos de los últimos `dias` días, con su resumen_diario."""
+    import resumen_diario
+
+    rnd = random.Random(semilla)
+    hoy = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
+    filas = []
+    for d in range(dias, 0, -1):
+        for e in range(empleados):
+            ingreso = hoy - timedelta(days=d) + timedelta(minutes=rnd.randint(0, 600))
+            egreso = ingreso + timedelta(hours=rnd.uniform(4, 10))
+            filas.append((e + 1, f"sintetico_{e}", ingreso.strftime("%d/%m/%Y"), ingreso.strftime("%H:%M"),
+                          egreso.strftime("%H:%M"), "Sistema", ingreso.isoformat(timespec="seconds"),
+                          egreso.isoformat(timespec="seconds")))
+    c = conn.cursor()
+    c.execute("DELETE FROM registros")
+    c.executemany("""
+        INSERT INTO registros (id_empleado, username, fecha, hora_ingreso, hora_egreso, area, ingreso_ts, egreso_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, filas)
+    resumen_diario.reconstruir(c)
+    conn.commit()
+    return len(filas)
+
+
+# ====== ESCENARIOS ======
+def bench_login(app, indice, tamaños, repeticiones, hilos):
+    """Reenvía las imágenes de rostros/ a /login_face con plantillas de distintos tamaños."""
+    from db import get_conn
+    from enrolamiento_lote import EXTENSIONES_IMAGEN, username_desde_archivo
+    from servicio_encoding import codificar_imagen
+
+    imagenes = {}
+    for archivo in sorted(os.listdir(ROSTROS_DIR)):
+        if archivo.lower().endswith(EXTENSIONES_IMAGEN):
+            with open(os.path.join(ROSTROS_DIR, archivo), "rb") as f:
+                imagenes[username_desde_archivo(archivo)] = f.read()
+    reales = {u: codificar_imagen(img, app.config["DETECCION_REGISTRO"]) for u, img in imagenes.items()}
+    reales = {u: e for u, e in reales.items() if e is not None}
+    pedidos = list(imagenes.items())
+
+    resultados = []
+    for cantidad in tamaños:
+        with app.app_context():
+            cargar_plantilla(get_conn(), cantidad, reales)
+        inicio = time.perf_counter()
+        indice.cargar()
+        carga_indice = time.perf_counter() - inicio
+
+        contador = itertools.count()
+
+        def pedido():
+            username, imagen = pedidos[next(contador) % len(pedidos)]
+            with app.test_client() as cliente:
+                respuesta = cliente.post("/login_face", data=imagen, content_type="image/png")
+                datos = respuesta.get_json() or {}
+                return respuesta.status_code, datos.get("username") == username
+
+        pedido()  # calentamiento (pool de encoding, caches de numpy)
+        latencias, segundos, respuestas = _medir(pedido, repeticiones, hilos)
+        resultado = {
+            "usuarios": cantidad + len(reales),
+            "hilos": hilos,
+            "carga_indice_ms": round(carga_indice * 1000, 3),
+            "aciertos": sum(1 for status, acierto in respuestas if acierto),
+            "errores": sum(1 for status, _ in respuestas if status != 200),
+            **_estadisticas(latencias, segundos),
+        }
+        click.echo(f"👤 login_face con {resultado['usuarios']} usuarios: p50 {resultado['p50_ms']} ms, "
+                   f"p95 {resultado['p95_ms']} ms, p99 {resultado['p99_ms']} ms, {resultado['rps']} req/s")
+        resultados.append(resultado)
+    return resultados
+
+
+# Query string para los endpoints de la API que tienen parámetros obligatorios
+CONSULTAS_API = {"stock_fefo": "?producto=Harina&kg=300"}
+
+
+def rutas_dashboard(visualizacion):
+    """URLs a medir: las páginas de /visualizacion, cada gráfico y cada endpoint de la API."""
+    rutas = ["/visualizacion/", "/visualizacion/oee", "/visualizacion/desperdicios", "/visualizacion/horarios",
+             "/visualizacion/inventario", "/visualizacion/horarios/exportar.csv"]
+    rutas += [f"/visualizacion/grafico/{nombre}.png" for nombre in visualizacion.GRAFICOS]
+    rutas += [f"/visualizacion/api/{nombre}{CONSULTAS_API.get(nombre, '')}" for nombre in visualizacion.API]
+    return rutas
+
+
+def bench_dashboards(app, data_dir, escalas, repeticiones):
+    """Mide cada ruta de /visualizacion con los CSV escalados: sin cache (render completo) y con cache."""
+    import visualizacion
+
+    resultados = []
+    for escala in escalas:
+        escalar_csvs(data_dir, escala)
+        with app.test_client() as cliente:
+            with cliente.session_transaction() as sesion:
+                sesion.update(user="bench", role="ADMIN", authenticated=True)
+            for ruta in rutas_dashboard(visualizacion):
+                inicio = time.perf_counter()
+                primera = cliente.get(ruta)
+                primera.get_data()
+                resultado = {"escala": escala, "ruta": ruta, "status": primera.status_code,
+                             "primera_ms": round((time.perf_counter() - inicio) * 1000, 3)}
+
+                def pedido():
+                    respuesta = cliente.get(ruta)
+                    respuesta.get_data()
+                    return respuesta.status_code
+
+                # Sin cache cada pedido vuelve a renderizar; con cache se mide el camino de un acierto
+                visualizacion.cache_graficos.configurar(max_entradas=0)
+                latencias, segundos, _ = _medir(pedido, repeticiones)
+                resultado["sin_cache"] = _estadisticas(latencias, segundos)
+                visualizacion.cache_graficos.configurar(max_entradas=app.config["CACHE_GRAFICOS_MAX_ENTRADAS"])
+                pedido()
+                latencias, segundos, _ = _medir(pedido, repeticiones)
+                resultado["con_cache"] = _estadisticas(latencias, segundos)
+                click.echo(f"📊 x{escala} {ruta}: {resultado['primera_ms']} ms la primera vez, "
+                           f"p95 {resultado['sin_cache']['p95_ms']} ms sin cache, "
+                           f"{resultado['con_cache']['p95_ms']} ms con cache")
+                resultados.append(resultado)
+    return resultados
+
+
+def bench_arranque(repeticiones):
+    """Arranque en frío: `import App` en un proceso nuevo, con y sin imports diferidos.
+
+    Cada arranque tarda alrededor de un segundo: se hacen como mucho 10 por modo.
+    """
+    resultados = []
+    for diferidos in (True, False):
+        entorno = dict(os.environ, IMPORTS_DIFERIDOS="1" if diferidos else "0", PRECARGA="0")
+
+        def arrancar():
+            return subprocess.run([sys.executable, "-c", "import App"], cwd=BASE_DIR, env=entorno,
+                                  capture_output=True, check=True).returncode
+
+        latencias, segundos, _ = _medir(arrancar, min(repeticiones, 10))
+        resultado = {"imports_diferidos": diferidos, **_estadisticas(latencias, segundos)}
+        click.echo(f"🚀 Arranque {'con' if diferidos else 'sin'} imports diferidos: "
+                   f"p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms")
+        resultados.append(resultado)
+    return resultados
+
+
+# ====== COMPARACIÓN ENTRE CORRIDAS ======
+def comparar(actual, anterior, tolerancia):
+    """Lista las mediciones cuyo p95 empeoró más que `tolerancia` (0.2 = 20%) respecto de `anterior`."""
+    def indexar(resultados):
+        claves = {}
+        for r in resultados.get("login", []):
+            claves[("login", r["usuarios"], r["hilos"])] = r["p95_ms"]
+        for r in resultados.get("dashboards", []):
+            for modo in ("sin_cache", "con_cache"):
+                claves[(r["ruta"], r["escala"], modo)] = r[modo]["p95_ms"]
+        for r in resultados.get("arranque", []):
+            claves[("arranque", r["imports_diferidos"])] = r["p95_ms"]
+        return claves
+
+    antes = indexar(anterior)
+    regresiones = []
+    for clave, p95 in indexar(actual).items():
+        base = antes.get(clave)
+        if base and p95 > base * (1 + tolerancia):
+            regresiones.append({"medicion": list(clave), "p95_anterior_ms": base, "p95_ms": p95,
+                                "variacion": round(p95 / base - 1, 3)})
+    return regresiones
+
+
+@click.command()
+@click.option("--usuarios", default="100,1000,10000,100000", help="Tamaños de plantilla a medir (separados por coma).")
+@click.option("--escalas", default="1,10,100", help="Factores de escala de los CSV de Data/ (separados por coma).")
+@click.option("--repeticiones", default=50, type=int, help="Requests por medición.")
+@click.option("--hilos", default=1, type=int, help="Requests concurrentes contra /login_face.")
+@click.option("--salida", default="benchmark.json", type=click.Path(dir_okay=False), help="Archivo JSON de resultados.")
+@click.option("--comparar", "anterior", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="JSON de una corrida anterior: sale con código 1 si algún p95 empeoró más que la tolerancia.")
+@click.option("--tolerancia", default=0.2, type=float, help="Empeoramiento de p95 admitido al comparar (0.2 = 20%).")
+@click.option("--solo", type=click.Choice(["login", "dashboards", "arranque"]), default=None, help="Correr un solo escenario.")
+def main(usuarios, escalas, repeticiones, hilos, salida, anterior, tolerancia, solo):
+    """Mide latencia (p50/p95/p99) y throughput del login facial y de los dashboards, y el arranque en frío."""
+    directorio = tempfile.mkdtemp(prefix="bench_control_ingreso_")
+    data_dir = os.path.join(directorio, "Data")
+    # Antes de importar la app: la DB y los CSV se leen de estas rutas
+    os.environ["USUARIOS_DB"] = os.path.join(directorio, "usuarios.db")
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+    escalar_csvs(data_dir, 1)
+
+    import App
+
+    try:
+        resultados = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                        "cpus": os.cpu_count(), "encoding_procesos": App.app.config["ENCODING_PROCESOS"],
+                        "backend": App.app.config["BACKEND_RECONOCIMIENTO"]},
+            "parametros": {"usuarios": _enteros(usuarios), "escalas": _enteros(escalas),
+                           "repeticiones": repeticiones, "hilos": hilos},
+        }
+        if solo in (None, "login"):
+            resultados["login"] = bench_login(App.app, App.indice_rostros, _enteros(usuarios), repeticiones, hilos)
+        if solo in (None, "dashboards"):
+            with App.app.app_context():
+                from db import get_conn
+                cargar_registros(get_conn(), empleados=50, dias=App.app.config["HORARIOS_DIAS"])
+            resultados["dashboards"] = bench_dashboards(App.app, data_dir, _enteros(escalas), repeticiones)
+        if solo in (None, "arranque"):
+            resultados["arranque"] = bench_arranque(repeticiones)
+
+        if anterior:
+            with open(anterior, encoding="utf-8") as f:
+                resultados["regresiones"] = comparar(resultados, json.load(f), tolerancia)
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        click.echo(f"💾 Resultados guardados en {salida}")
+    finally:
+        App.servicio_encoding.cerrar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    if resultados.get("regresiones"):
+        for r in resultados["regresiones"]:
+            click.echo(f"⚠️ Regresión en {r['medicion']}: p95 {r['p95_anterior_ms']} → {r['p95_ms']} ms "
+                       f"(+{r['variacion']:.0%})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheGraficos:
+    """Cache LRU de gráficos ya renderizados (PNG), acotada por cantidad y por memoria.
+
+    La clave incluye la huella de los datos de origen, así un cambio en los CSV o en
+    la DB genera una clave nueva y la entrada vieja termina expulsada por LRU.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entradas=256):
+        self.max_bytes = max_bytes
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def configurar(self, max_bytes=None, max_entradas=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_entradas is not None:
+                self.max_entradas = max_entradas
+            self._expulsar()
+
+    def obtener(self, clave):
+        with self._lock:
+            png = self._entradas.get(clave)
+            if png is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return png
+
+    def guardar(self, clave, png):
+        with self._lock:
+            if len(png) > self.max_bytes:
+                return
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = png
+            self._bytes += len(png)
+            self._expulsar()
+
+    def _expulsar(self):
+        # Se descartan los menos usados hasta respetar ambos límites
+        while self._entradas and (self._bytes > self.max_bytes or len(self._entradas) > self.max_entradas):
+            _, png = self._entradas.popitem(last=False)
+            self._bytes -= len(png)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
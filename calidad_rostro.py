@@ -0,0 +1,74 @@
+import numpy as np
+from arranque import importar_diferido
+
+# Control de calidad del rostro detectado, antes del encoding (la etapa cara): tamaño de
+# la caja, nitidez (varianza del Laplaciano) y brillo (del histograma de grises).
+# Solo usa OpenCV, así el proceso web puede importar CalidadInsuficiente sin cargar dlib.
+
+cv2 = importar_diferido("cv2")
+
+# Ancho al que se lleva el recorte del rostro antes de medir nitidez y brillo: así los
+# umbrales no dependen de la resolución de la cámara ni de la distancia
+ANCHO_RECORTE = 128
+
+MENSAJES = {
+    "rostro_chico": "Rostro demasiado lejos: acérquese a la cámara",
+    "desenfocada": "Imagen movida o desenfocada: quédese quieto frente a la cámara",
+    "oscura": "Muy poca luz sobre el rostro",
+    "sobreexpuesta": "Demasiada luz sobre el rostro",
+}
+
+
+class CalidadInsuficiente(Exception):
+    """El rostro no alcanza la calidad mínima para codificarlo.
+
+    `motivo` es un código estable para el cliente (rostro_chico, desenfocada, oscura,
+    sobreexpuesta) y `medidas` los valores medidos.
+    """
+
+    def __init__(self, motivo, medidas):
+        # Los args coinciden con el constructor, así la excepción viaja desde los workers
+        super().__init__(motivo, medidas)
+        self.motivo = motivo
+        self.medidas = medidas
+
+    def __str__(self):
+        return MENSAJES.get(self.motivo, self.motivo)
+
+
+def medir_calidad(frame, caja, escala=1):
+    """Lado menor de la caja (en px de la imagen original), nitidez y brillo medio del rostro."""
+    top, right, bottom, left = caja
+    recorte = frame[top:bottom, left:right]
+    if recorte.ndim == 3:
+        recorte = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+    if recorte.shape[1] > ANCHO_RECORTE:
+        factor = ANCHO_RECORTE / recorte.shape[1]
+        recorte = cv2.resize(recorte, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    histograma = cv2.calcHist([recorte], [0], None, [256], [0, 256]).ravel()
+    return {
+        "lado_rostro": int(min(bottom - top, right - left) * escala),
+        "nitidez": round(float(cv2.Laplacian(recorte, cv2.CV_64F).var()), 1),
+        "brillo": round(float(np.dot(histograma, np.arange(256)) / max(histograma.sum(), 1)), 1),
+    }
+
+
+def evaluar_calidad(frame, caja, perfil, escala=1):
+    """Lanza CalidadInsuficiente si el rostro de `caja` no pasa los umbrales del perfil.
+
+    Un umbral en 0 desactiva ese control. `escala` lleva las medidas del frame
+    (decodificado reducido) a píxeles de la imagen original.
+    """
+    if caja is None or not any(perfil.get(k) for k in ("min_lado_rostro", "min_nitidez", "brillo_min", "brillo_max")):
+        return None
+    medidas = medir_calidad(frame, caja, escala)
+    if perfil.get("min_lado_rostro") and medidas["lado_rostro"] < perfil["min_lado_rostro"]:
+        raise CalidadInsuficiente("rostro_chico", medidas)
+    if perfil.get("brillo_min") and medidas["brillo"] < perfil["brillo_min"]:
+        raise CalidadInsuficiente("oscura", medidas)
+    if perfil.get("brillo_max") and medidas["brillo"] > perfil["brillo_max"]:
+        raise CalidadInsuficiente("sobreexpuesta", medidas)
+    if perfil.get("min_nitidez") and medidas["nitidez"] < perfil["min_nitidez"]:
+        raise CalidadInsuficiente("desenfocada", medidas)
+    return medidas
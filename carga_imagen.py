@@ -0,0 +1,101 @@
+import base64
+import binascii
+import re
+import struct
+
+# Tipos aceptados como cuerpo binario directo (además de multipart/form-data y JSON con data URL)
+TIPOS_BINARIOS = ("image/jpeg", "image/png", "application/octet-stream")
+
+_PREFIJO_DATA_URL = re.compile(r"^data:image/.+;base64,")
+
+
+class ImagenInvalida(Exception):
+    """La imagen subida no cumple los límites o no se puede leer; `status` es el código HTTP."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+# ====== DIMENSIONES DESDE LA CABECERA ======
+def _dimensiones_png(datos):
+    # Firma (8) + largo y tipo del chunk IHDR (8) + ancho y alto (4 + 4, big endian)
+    if len(datos) >= 24 and datos[12:16] == b"IHDR":
+        return struct.unpack(">II", datos[16:24])
+    return None
+
+
+def _dimensiones_jpeg(datos):
+    # Se recorren los segmentos hasta el primer SOFn, que trae alto y ancho
+    i = 2
+    while i + 9 <= len(datos):
+        if datos[i] != 0xFF:
+            return None
+        marcador = datos[i + 1]
+        if marcador == 0xFF:
+            i += 1
+            continue
+        if marcador in (0xD8, 0x01) or 0xD0 <= marcador <= 0xD7:
+            i += 2
+            continue
+        largo = struct.unpack(">H", datos[i + 2:i + 4])[0]
+        if 0xC0 <= marcador <= 0xCF and marcador not in (0xC4, 0xC8, 0xCC):
+            alto, ancho = struct.unpack(">HH", datos[i + 5:i + 9])
+            return ancho, alto
+        i += 2 + largo
+    return None
+
+
+def dimensiones_imagen(datos):
+    """(ancho, alto) leídos de la cabecera PNG/JPEG sin decodificar, o None si no se reconoce."""
+    if datos.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _dimensiones_png(datos)
+    if datos.startswith(b"\xff\xd8"):
+        return _dimensiones_jpeg(datos)
+    return None
+
+
+def validar_imagen(datos, max_bytes, max_lado):
+    """Controla tamaño y dimensiones antes de decodificar (lanza ImagenInvalida)."""
+    if not datos:
+        raise ImagenInvalida("No se recibió ninguna imagen")
+    if len(datos) > max_bytes:
+        raise ImagenInvalida("La imagen supera el tamaño máximo permitido", 413)
+    dimensiones = dimensiones_imagen(datos)
+    if dimensiones is None:
+        raise ImagenInvalida("Formato de imagen no soportado (se aceptan PNG y JPEG)", 415)
+    ancho, alto = dimensiones
+    if not ancho or not alto or max(ancho, alto) > max_lado:
+        raise ImagenInvalida(f"Dimensiones de imagen no permitidas ({ancho}x{alto}, máximo {max_lado} px por lado)")
+    return datos
+
+
+# ====== LECTURA DEL REQUEST ======
+def leer_imagen(request, max_bytes, max_lado):
+    """Devuelve los bytes de la imagen del request, ya validados.
+
+    Acepta el cuerpo binario directo (image/jpeg, image/png), multipart/form-data con
+    el campo `image`, o el formato anterior: JSON con una data URL en base64.
+    """
+    # Si el cliente declara el tamaño, se rechaza antes de leer el cuerpo (con margen para
+    # el base64 del formato JSON y los encabezados de multipart)
+    if request.content_length is not None and request.content_length > max_bytes * 4 // 3 + 1024:
+        raise ImagenInvalida("La imagen supera el tamaño máximo permitido", 413)
+
+    if request.mimetype in TIPOS_BINARIOS:
+        # Se lee directo del stream, como mucho un byte más del límite
+        datos = request.stream.read(max_bytes + 1)
+    elif request.mimetype == "multipart/form-data":
+        archivo = request.files.get("image")
+        if archivo is None:
+            raise ImagenInvalida("Falta el campo 'image'")
+        datos = archivo.stream.read(max_bytes + 1)
+    else:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data.get("image"), str):
+            raise ImagenInvalida("Falta la imagen")
+        try:
+            datos = base64.b64decode(_PREFIJO_DATA_URL.sub("", data["image"]))
+        except binascii.Error:
+            raise ImagenInvalida("La imagen no es base64 válido")
+    return validar_imagen(datos, max_bytes, max_lado)
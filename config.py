@@ -0,0 +1,107 @@
+import os
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _perfil_deteccion(prefijo, ancho_deteccion, modelo, upsample, jitters, reduccion=1,
+                      min_lado_rostro=0, min_nitidez=0, brillo_min=0, brillo_max=0):
+    """Arma los parámetros de detección de un endpoint, sobrescribibles con <PREFIJO>_*."""
+    return {
+        # 1, 2, 4 u 8: la imagen se decodifica ya reducida (cv2.IMREAD_REDUCED_COLOR_N)
+        "reduccion": int(os.environ.get(f"{prefijo}_REDUCCION", reduccion)),
+        # Ancho al que se reduce el frame antes de buscar rostros (0 = no reducir)
+        "ancho_deteccion": int(os.environ.get(f"{prefijo}_ANCHO", ancho_deteccion)),
+        # "hog" (CPU) o "cnn" (más preciso, pensado para GPU)
+        "modelo": os.environ.get(f"{prefijo}_MODELO", modelo),
+        "upsample": int(os.environ.get(f"{prefijo}_UPSAMPLE", upsample)),
+        "jitters": int(os.environ.get(f"{prefijo}_JITTERS", jitters)),
+        # Control de calidad antes del encoding (0 = desactivado): lado mínimo de la caja del
+        # rostro en px, varianza mínima del Laplaciano y rango de brillo medio (0-255)
+        "min_lado_rostro": int(os.environ.get(f"{prefijo}_MIN_LADO_ROSTRO", min_lado_rostro)),
+        "min_nitidez": float(os.environ.get(f"{prefijo}_MIN_NITIDEZ", min_nitidez)),
+        "brillo_min": float(os.environ.get(f"{prefijo}_BRILLO_MIN", brillo_min)),
+        "brillo_max": float(os.environ.get(f"{prefijo}_BRILLO_MAX", brillo_max)),
+    }
+
+
+class Config:
+    """Configuración de la aplicación (se puede sobrescribir con variables de entorno)."""
+
+    # ====== RECONOCIMIENTO FACIAL ======
+    # Distancia máxima para aceptar una coincidencia (face_recognition usa 0.6 por defecto)
+    UMBRAL_RECONOCIMIENTO = float(os.environ.get("UMBRAL_RECONOCIMIENTO", 0.6))
+    # "exacto" (fuerza bruta sobre la matriz) o "lsh" (aproximado, para plantillas grandes)
+    BACKEND_RECONOCIMIENTO = os.environ.get("BACKEND_RECONOCIMIENTO", "exacto")
+    LSH_TABLAS = int(os.environ.get("LSH_TABLAS", 8))
+    LSH_BITS = int(os.environ.get("LSH_BITS", 12))
+    # Encodings que se guardan por usuario y centroides más cercanos cuya galería se compara
+    GALERIA_MAX = int(os.environ.get("GALERIA_MAX", 5))
+    GALERIA_CANDIDATOS = int(os.environ.get("GALERIA_CANDIDATOS", 3))
+
+    # ====== DETECCIÓN DE ROSTROS POR ENDPOINT ======
+    # En el login se prioriza la latencia; en el registro, la calidad del encoding guardado
+    DETECCION_LOGIN = _perfil_deteccion("DETECCION_LOGIN", 320, "hog", 1, 1,
+                                        min_lado_rostro=50, min_nitidez=40, brillo_min=40, brillo_max=220)
+    DETECCION_REGISTRO = _perfil_deteccion("DETECCION_REGISTRO", 640, "hog", 1, 3,
+                                           min_lado_rostro=80, min_nitidez=60, brillo_min=40, brillo_max=220)
+
+    # ====== IMÁGENES SUBIDAS (/login_face, /register_face) ======
+    # Límites que se controlan antes de decodificar: bytes y píxeles por lado (leídos de la cabecera)
+    IMAGEN_MAX_BYTES = int(os.environ.get("IMAGEN_MAX_BYTES", 4 * 1024 * 1024))
+    IMAGEN_MAX_LADO = int(os.environ.get("IMAGEN_MAX_LADO", 4096))
+
+    # ====== LOGIN POR FLUJO DE CÁMARA (/login_face/stream) ======
+    # Cada cuántos frames se vuelve a detectar el rostro (en los demás se sigue la caja)
+    STREAM_DETECTAR_CADA = int(os.environ.get("STREAM_DETECTAR_CADA", 5))
+    # Frames seguidos en los que tiene que coincidir el mismo usuario para confirmarlo
+    STREAM_CONFIRMACIONES = int(os.environ.get("STREAM_CONFIRMACIONES", 3))
+    # Límites por request: frames procesados y segundos
+    STREAM_MAX_FRAMES = int(os.environ.get("STREAM_MAX_FRAMES", 300))
+    STREAM_TIMEOUT = float(os.environ.get("STREAM_TIMEOUT", 15))
+
+    # ====== SNAPSHOT DE ENCODINGS ======
+    # Directorio del snapshot mapeado en memoria que comparten los workers (vacío = cada
+    # proceso arma su matriz desde la DB) y cada cuántos segundos se revisa si quedó viejo
+    SNAPSHOT_ROSTROS_DIR = os.environ.get(
+        "SNAPSHOT_ROSTROS_DIR", os.path.join(os.environ.get("DATA_DIR", os.path.join(_BASE_DIR, "Data")), "snapshot_rostros"))
+    SNAPSHOT_ROSTROS_REVISION = float(os.environ.get("SNAPSHOT_ROSTROS_REVISION", 2))
+
+    # ====== CONTROL DE ACCESO A ÁREAS CRÍTICAS ======
+    # CSV con (id_empleado, area_critica, autorizado); se reimporta a la DB cuando cambia
+    AUTORIZACIONES_CSV = os.environ.get(
+        "AUTORIZACIONES_CSV", os.path.join(os.environ.get("DATA_DIR", os.path.join(_BASE_DIR, "Data")), "autorizaciones.csv"))
+    # Cada cuántos segundos se revisa si cambió el CSV (entre revisiones se decide solo en memoria)
+    AUTORIZACIONES_REFRESCO = float(os.environ.get("AUTORIZACIONES_REFRESCO", 5))
+
+    # ====== ARRANQUE ======
+    # pandas, matplotlib y cv2 se importan recién en la primera ruta que los usa (0 = al arrancar)
+    IMPORTS_DIFERIDOS = os.environ.get("IMPORTS_DIFERIDOS", "1") != "0"
+    # Con el primer request, un hilo importa esos módulos y carga datasets, índice y modelos
+    PRECARGA = os.environ.get("PRECARGA", "0") == "1"
+
+    # ====== OBSERVABILIDAD ======
+    # Nivel de los logs estructurados (una línea JSON por evento, con request_id)
+    LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
+
+    # ====== REGISTRO DE INGRESOS / EGRESOS ======
+    # Una sesión sin egreso más vieja que esto se considera abandonada (no bloquea un nuevo ingreso)
+    SESION_MAX_HORAS = float(os.environ.get("SESION_MAX_HORAS", 16))
+
+    # ====== DASHBOARDS ======
+    # Límite de memoria y de entradas de la cache de gráficos renderizados
+    CACHE_GRAFICOS_MAX_MB = int(os.environ.get("CACHE_GRAFICOS_MAX_MB", 32))
+    CACHE_GRAFICOS_MAX_ENTRADAS = int(os.environ.get("CACHE_GRAFICOS_MAX_ENTRADAS", 256))
+    # Días que muestra /visualizacion/horarios cuando no se indica el período
+    HORARIOS_DIAS = int(os.environ.get("HORARIOS_DIAS", 30))
+    # Gráficos que se pueden renderizar a la vez
+    RENDER_HILOS = int(os.environ.get("RENDER_HILOS", min(4, os.cpu_count() or 1)))
+
+    # ====== POOL DE ENCODING ======
+    # Cantidad de procesos worker (0 = codificar dentro del request, sin pool)
+    ENCODING_PROCESOS = int(os.environ.get("ENCODING_PROCESOS", os.cpu_count() or 1))
+    # Trabajos en curso admitidos antes de responder 503
+    ENCODING_MAX_PENDIENTES = int(os.environ.get("ENCODING_MAX_PENDIENTES", 2 * (os.cpu_count() or 1)))
+    # Segundos máximos de espera por cada encoding
+    ENCODING_TIMEOUT = float(os.environ.get("ENCODING_TIMEOUT", 10))
+    # Valor del header Retry-After (segundos) cuando la cola está llena
+    ENCODING_RETRY_AFTER = int(os.environ.get("ENCODING_RETRY_AFTER", 2))
@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import autorizaciones
+import metricas
+from db import get_conn, transaccion, version_tabla
+
+# Resultado de un control de puerta: si pasa y por qué (autorizado, no_autorizado,
+# sin_autorizacion si el área es crítica y el empleado no figura, area_no_critica,
+# sin_datos si nunca se cargó ninguna autorización)
+Decision = namedtuple("Decision", ["permitido", "motivo"])
+
+
+class ControlAcceso:
+    """Decide si un empleado puede entrar a un área con un índice en memoria (dict).
+
+    El índice se arma desde la tabla autorizaciones y se revisa como mucho cada
+    `intervalo` segundos: si cambió el CSV se reimporta (un solo proceso lo hace, el
+    resto ve el cambio por el contador de versiones_tablas) y se recarga. Entre
+    revisiones cada decisión es una búsqueda en el dict, sin leer la DB ni el CSV.
+    """
+
+    def __init__(self, ruta_csv, intervalo=5.0):
+        self.ruta_csv = ruta_csv
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._areas_criticas = set()
+        self._version = None
+        self._proxima_revision = 0.0
+
+    def _huella_csv(self):
+        try:
+            estado = os.stat(self.ruta_csv)
+        except FileNotFoundError:
+            return None
+        return f"{estado.st_mtime_ns}:{estado.st_size}"
+
+    def _importar_si_cambio(self):
+        huella = self._huella_csv()
+        if huella is None or autorizaciones.huella_importada(get_conn().cursor()) == huella:
+            return
+        # Se vuelve a comparar con el lock de escritura tomado: otro worker pudo importarlo recién
+        with transaccion() as c:
+            if autorizaciones.huella_importada(c) == huella:
+                return
+            filas = autorizaciones.importar_csv(c, self.ruta_csv, huella)
+        metricas.registrar_evento("autorizaciones_importadas", archivo=os.path.basename(self.ruta_csv), filas=filas)
+
+    def recargar(self, forzar=False):
+        """Reimporta el CSV si cambió y recarga el índice si cambió la tabla.
+
+        Sin `forzar` no hace nada hasta que pase el intervalo desde la última revisión.
+        """
+        with self._lock:
+            # Si varios hilos vencieron el intervalo a la vez, solo el primero revisa
+            if not forzar and time.monotonic() < self._proxima_revision:
+                return
+            try:
+                self._importar_si_cambio()
+                version = version_tabla("autorizaciones")
+                if forzar or version != self._version:
+                    self._indice, self._areas_criticas = autorizaciones.leer_indice(get_conn())
+                    self._version = version
+            except Exception as e:
+                # Un CSV con filas inválidas (o la DB ocupada) no corta los controles de puerta:
+                # se sigue decidiendo con el último índice bueno y se reintenta en la próxima revisión
+                metricas.registrar_evento("autorizaciones_error", nivel=logging.WARNING,
+                                          archivo=os.path.basename(self.ruta_csv), error=str(e))
+            finally:
+                self._proxima_revision = time.monotonic() + self.intervalo
+
+    def decidir(self, id_empleado, area):
+        """Decision para el empleado (su legajo) en el área (las áreas que no figuran en el CSV son libres).
+
+        Sin autorizaciones cargadas (CSV ausente, vacío o inválido desde el arranque) no se
+        sabe qué áreas son críticas: se niega todo en lugar de abrir todas las puertas.
+        """
+        if time.monotonic() >= self._proxima_revision:
+            self.recargar()
+        if not self._areas_criticas:
+            return Decision(False, "sin_datos")
+        clave = autorizaciones.normalizar_area(area)
+        autorizado = self._indice.get((id_empleado, clave))
+        if autorizado is None:
+            if clave in self._areas_criticas:
+                return Decision(False, "sin_autorizacion")
+            return Decision(True, "area_no_critica")
+        return Decision(autorizado, "autorizado" if autorizado else "no_autorizado")
+
+    def estadisticas(self):
+        return {"reglas": len(self._indice), "areas_criticas": sorted(self._areas_criticas), "version": self._version}
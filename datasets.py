@@ -0,0 +1,194 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from arranque import importar_diferido
+
+pd = importar_diferido("pandas")
+
+# Descripción de cada dataset: archivo CSV, columnas de fecha con su formato explícito,
+# columnas categóricas (pocos valores repetidos) y columnas numéricas a guardar en float32
+Dataset = namedtuple("Dataset", ["archivo", "fechas", "categorias", "float32"], defaults=({}, (), ()))
+
+# Estado de un dataset cargado. generacion cambia solo en las relecturas completas: mientras
+# se mantenga, las filas de una versión anterior siguen siendo un prefijo de las actuales.
+# digesto es el SHA-1 de los bytes ya leídos: confirma que un cambio fue solo un agregado al final
+Carga = namedtuple("Carga", ["huella", "df", "generacion", "digesto"])
+
+DATASETS = {
+    'autorizaciones': Dataset('autorizaciones.csv', categorias=('area_critica', 'autorizado')),
+    'produccion': Dataset('produccion.csv', fechas={'fecha': '%d/%m/%Y'}, categorias=('producto',),
+                          float32=('cantidad_usada(KG)', 'desperdicio')),
+    'proveedores': Dataset('proveedores.csv', categorias=('calidad',), float32=('porcentaje_rechazos',)),
+    'stock': Dataset('stock.csv', fechas={'fecha_ingreso': '%d/%m/%Y', 'fecha_vencimiento': '%d/%m/%Y'},
+                     categorias=('nombre_item',), float32=('cantidad (KG)',)),
+    'trazabilidad': Dataset('trazabilidad_lotes.csv', fechas={'fecha_produccion': '%Y-%m-%d'},
+                            categorias=('producto', 'rol')),
+    'transporte': Dataset('carga_transporte.csv', fechas={'fecha': '%Y-%m-%d'},
+                          categorias=('tipo_operacion', 'vehiculo')),
+    'tiempos_produccion': Dataset('tiempos_produccion.csv', fechas={'fecha': '%d/%m/%Y'}, categorias=('turno',)),
+    'produccion_velocidad': Dataset('produccion_velocidad.csv', fechas={'fecha': '%d/%m/%Y'},
+                                    categorias=('turno', 'producto'), float32=('velocidad_real_upm',)),
+    'calidad': Dataset('calidad.csv', fechas={'fecha': '%d/%m/%Y'}, categorias=('turno', 'tipo_defecto')),
+}
+
+
+def concatenar(anterior, nuevas):
+    """Agrega las filas de `nuevas` al final de `anterior` conservando las columnas categóricas.
+
+    pd.concat convierte a object las categóricas con distintas categorías; acá las
+    categorías nuevas se agregan al final, así los códigos existentes no cambian.
+    """
+    for columna in anterior.columns:
+        if isinstance(anterior[columna].dtype, pd.CategoricalDtype) and columna in nuevas:
+            valores = nuevas[columna].astype(object)
+            faltantes = pd.Index(valores.dropna().unique()).difference(anterior[columna].cat.categories)
+            if len(faltantes):
+                anterior = anterior.assign(**{columna: anterior[columna].cat.add_categories(faltantes)})
+            nuevas = nuevas.assign(**{columna: pd.Categorical(valores, categories=anterior[columna].cat.categories)})
+    return pd.concat([anterior, nuevas], ignore_index=True)
+
+
+class RegistroDatasets:
+    """Carga perezosa de los CSV de Data/ con recarga automática cuando cambia el archivo.
+
+    Cada dataset se lee recién la primera vez que se pide y se vuelve a leer solo si
+    cambió el mtime o el tamaño del archivo, así los cambios en stock.csv o
+    produccion.csv se ven sin reiniciar y sin releer el CSV en cada request.
+    Si el archivo solo creció (filas agregadas al final) se parsean únicamente las
+    filas nuevas.
+    """
+
+    def __init__(self, data_dir, datasets=DATASETS):
+        self.data_dir = data_dir
+        self.datasets = datasets
+        self._cargados = {}
+        self._tiempos = {}
+        self._locks = {nombre: threading.Lock() for nombre in datasets}
+        self._generaciones = 0
+
+    def ruta(self, nombre):
+        return os.path.join(self.data_dir, self.datasets[nombre].archivo)
+
+    def huella(self, nombre):
+        """(mtime_ns, tamaño) del archivo, o None si no existe."""
+        try:
+            st = os.stat(self.ruta(nombre))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def precargar(self):
+        """Carga todos los datasets (lo usa la precarga del arranque)."""
+        for nombre in self.datasets:
+            self.obtener(nombre)
+
+    def obtener(self, nombre):
+        """Devuelve el DataFrame del dataset (o None si no se pudo cargar).
+
+        El DataFrame devuelto es compartido: quien necesite modificarlo debe copiarlo.
+        """
+        return self.obtener_versionado(nombre)[0]
+
+    def obtener_versionado(self, nombre):
+        """(DataFrame, generacion) del dataset, leídos del mismo estado cargado."""
+        huella = self.huella(nombre)
+        cargado = self._cargados.get(nombre)
+        if cargado is not None and cargado.huella == huella:
+            return cargado.df, cargado.generacion
+
+        with self._locks[nombre]:
+            # Otro hilo pudo haberlo recargado mientras se esperaba el lock
+            cargado = self._cargados.get(nombre)
+            if cargado is not None and cargado.huella == huella:
+                return cargado.df, cargado.generacion
+            carga = self._agregar_filas(nombre, cargado, huella)
+            if carga is None:
+                self._generaciones += 1
+                df, digesto = self._leer(nombre, huella)
+                carga = Carga(huella, df, self._generaciones, digesto)
+            self._cargados[nombre] = carga
+            return carga.df, carga.generacion
+
+    def _agregar_filas(self, nombre, cargado, huella):
+        """Carga con solo las filas agregadas al final, o None si el cambio no fue un agregado."""
+        if cargado is None or cargado.df is None or cargado.digesto is None or huella is None:
+            return None
+        anterior = cargado.huella[1]
+        if huella[1] <= anterior:
+            return None
+        spec = self.datasets[nombre]
+        inicio = time.perf_counter()
+        try:
+            with open(self.ruta(nombre), "rb") as f:
+                contenido = f.read(huella[1])
+        except OSError:
+            return None
+        # Todo lo ya leído tiene que seguir idéntico (una fila editada más arriba obliga a
+        # releer) y la última fila leída tenía que estar completa
+        digesto = hashlib.sha1(memoryview(contenido)[:anterior])
+        if len(contenido) != huella[1] or contenido[anterior - 1:anterior] != b"\n" \
+                or digesto.hexdigest() != cargado.digesto:
+            return None
+        digesto.update(memoryview(contenido)[anterior:])
+        try:
+            nuevas = self._parsear(spec, io.BytesIO(contenido[anterior:]), columnas=list(cargado.df.columns))
+            df = concatenar(cargado.df, nuevas)
+        except Exception as e:
+            print(f"⚠️ No se pudieron agregar las filas nuevas de '{spec.archivo}', se relee completo: {str(e)}")
+            return None
+
+        segundos = time.perf_counter() - inicio
+        self._registrar_tiempos(nombre, df, segundos, filas_agregadas=len(nuevas))
+        print(f"✅ Dataset '{spec.archivo}': {len(nuevas)} filas nuevas agregadas ({segundos * 1000:.1f} ms).")
+        return Carga(huella, df, cargado.generacion, digesto.hexdigest())
+
+    def _parsear(self, spec, origen, columnas=None):
+        dtypes = {col: 'category' for col in spec.categorias}
+        dtypes.update({col: 'float32' for col in spec.float32})
+        if columnas is None:
+            df = pd.read_csv(origen, dtype=dtypes)
+        else:
+            df = pd.read_csv(origen, dtype=dtypes, header=None, names=columnas)
+        for columna, formato in spec.fechas.items():
+            df[columna] = pd.to_datetime(df[columna], format=formato)
+        return df
+
+    def _leer(self, nombre, huella):
+        """(DataFrame, digesto de los bytes leídos), o (None, None) si no se pudo cargar."""
+        spec = self.datasets[nombre]
+        if huella is None:
+            print(f"❌ Error cargando '{spec.archivo}': el archivo no existe")
+            return None, None
+
+        inicio = time.perf_counter()
+        try:
+            with open(self.ruta(nombre), "rb") as f:
+                contenido = f.read()
+            df = self._parsear(spec, io.BytesIO(contenido))
+        except Exception as e:
+            print(f"❌ Error cargando '{spec.archivo}': {str(e)}")
+            return None, None
+
+        segundos = time.perf_counter() - inicio
+        self._registrar_tiempos(nombre, df, segundos)
+        print(f"✅ Dataset '{spec.archivo}' cargado correctamente ({len(df)} filas, {segundos * 1000:.1f} ms).")
+        return df, hashlib.sha1(contenido).hexdigest()
+
+    def _registrar_tiempos(self, nombre, df, segundos, filas_agregadas=None):
+        spec = self.datasets[nombre]
+        self._tiempos[nombre] = {
+            "archivo": spec.archivo,
+            "filas": len(df),
+            "filas_agregadas": filas_agregadas,
+            "segundos": round(segundos, 4),
+            "memoria_bytes": int(df.memory_usage(deep=True).sum()),
+            "cargado": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def tiempos(self):
+        """Estadísticas de la última carga de cada dataset."""
+        return dict(self._tiempos)
@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import autorizaciones
+import galeria_rostros
+import resumen_diario
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get("USUARIOS_DB", os.path.join(BASE_DIR, "Data", "usuarios.db"))
+
+# Milisegundos que una conexión espera un lock antes de fallar con "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+_local = threading.local()
+
+
+# ====== CONEXIONES POR HILO ======
+def get_conn():
+    """Devuelve la conexión SQLite del hilo actual, creándola la primera vez.
+
+    Cada hilo de gunicorn reutiliza su propia conexión entre requests en lugar de
+    abrir y cerrar una por llamada. Las conexiones heredadas de otro proceso (fork
+    con --preload) se descartan.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+        # WAL: los lectores no bloquean al escritor (ni viceversa) durante los picos de login
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def liberar_conexion(exception=None):
+    """Deshace cualquier transacción que un request haya dejado abierta (teardown de Flask)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and conn.in_transaction:
+        conn.rollback()
+
+
+@contextmanager
+def transaccion():
+    """Bloque de escritura atómico: BEGIN IMMEDIATE toma el lock de escritura al inicio.
+
+    Así dos logins simultáneos no pueden leer el mismo estado y escribir ambos
+    (en WAL, una transacción diferida fallaría con SQLITE_BUSY_SNAPSHOT).
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        yield c
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# ====== ESQUEMA Y MIGRACIONES ======
+def _esquema_base(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        email TEXT NOT NULL,
+        rostro_path TEXT,
+        role TEXT NOT NULL DEFAULT 'operador',
+        encoding BLOB
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS registros (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_empleado INTEGER,
+        username TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        hora_ingreso TEXT,
+        hora_egreso TEXT,
+        area TEXT,
+        FOREIGN KEY (id_empleado) REFERENCES usuarios(id)
+    )
+    """)
+
+
+def _migracion_1_indices_registros(c):
+    # Índices que cubren las búsquedas de ingreso/egreso abiertos (por empleado o por usuario y fecha)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_registros_empleado_fecha
+    ON registros (id_empleado, fecha, hora_ingreso, hora_egreso)
+    """)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_registros_username_fecha
+    ON registros (username, fecha, hora_ingreso, hora_egreso)
+    """)
+
+
+def _ts_iso(columna_fecha, columna_hora, *modificadores):
+    # 'dd/mm/aaaa' + 'HH:MM' -> 'aaaa-mm-ddTHH:MM:SS' (ISO-8601, ordenable como texto)
+    fecha_iso = f"substr({columna_fecha}, 7, 4) || '-' || substr({columna_fecha}, 4, 2) || '-' || substr({columna_fecha}, 1, 2)"
+    extra = "".join(f", '{m}'" for m in modificadores)
+    return f"strftime('%Y-%m-%dT%H:%M:%S', {fecha_iso} || ' ' || {columna_hora}{extra})"
+
+
+def _migracion_2_timestamps_iso(c):
+    # Marcas de tiempo completas: permiten consultas por rango con índice y turnos que cruzan la medianoche
+    c.execute("ALTER TABLE registros ADD COLUMN ingreso_ts TEXT")
+    c.execute("ALTER TABLE registros ADD COLUMN egreso_ts TEXT")
+    c.execute(f"""
+    UPDATE registros SET ingreso_ts = {_ts_iso("fecha", "hora_ingreso")}
+    WHERE hora_ingreso IS NOT NULL AND hora_ingreso != ''
+    """)
+    # Si la hora de egreso es menor a la de ingreso, el turno terminó al día siguiente
+    c.execute(f"""
+    UPDATE registros SET egreso_ts = CASE
+        WHEN hora_egreso < hora_ingreso THEN {_ts_iso("fecha", "hora_egreso", "+1 day")}
+        ELSE {_ts_iso("fecha", "hora_egreso")}
+    END
+    WHERE ingreso_ts IS NOT NULL AND hora_egreso IS NOT NULL AND hora_egreso != ''
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_registros_ingreso_ts ON registros (ingreso_ts)")
+    # Índices parciales: solo contienen las sesiones abiertas, que son las que buscan ingreso/egreso
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_registros_abiertos_empleado
+    ON registros (id_empleado, ingreso_ts) WHERE egreso_ts IS NULL
+    """)
+    c.execute("""
+    CREATE INDEX IF NOT EXISTS idx_registros_abiertos_username
+    ON registros (username, ingreso_ts) WHERE egreso_ts IS NULL
+    """)
+
+
+def _migracion_3_contador_cambios(c):
+    # Contador de cambios por tabla, mantenido por triggers: sirve de huella barata para
+    # invalidar caches (p. ej. los gráficos de horarios) sin releer la tabla
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS versiones_tablas (
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    c.execute("INSERT OR IGNORE INTO versiones_tablas (tabla, version) VALUES ('registros', 0)")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_registros_version_{evento.lower()}
+        AFTER {evento} ON registros
+        BEGIN
+            UPDATE versiones_tablas SET version = version + 1 WHERE tabla = 'registros';
+        END
+        """)
+
+
+def _migracion_4_resumen_diario(c):
+    # Resumen por empleado y día mantenido en cada ingreso/egreso; se completa con lo ya registrado
+    resumen_diario.crear_tabla(c)
+    resumen_diario.reconstruir(c)
+
+
+def _migracion_5_autorizaciones(c):
+    # Autorizaciones por (empleado, área); el CSV se importa en el primer control de acceso
+    autorizaciones.crear_tabla(c)
+
+
+def _migracion_6_version_usuarios(c):
+    # Contador de cambios de usuarios: cada worker sabe si su snapshot de encodings quedó viejo
+    c.execute("INSERT OR IGNORE INTO versiones_tablas (tabla, version) VALUES ('usuarios', 0)")
+    for nombre, evento in (("insert", "INSERT"), ("delete", "DELETE"), ("update", "UPDATE OF username, encoding")):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_usuarios_version_{nombre}
+        AFTER {evento} ON usuarios
+        BEGIN
+            UPDATE versiones_tablas SET version = version + 1 WHERE tabla = 'usuarios';
+        END
+        """)
+
+
+def _migracion_7_galeria_rostros(c):
+    # Varios encodings por usuario; usuarios.encoding queda como centroide de la galería
+    galeria_rostros.crear_tabla(c)
+    galeria_rostros.inicializar(c)
+
+
+def _migracion_8_enrolamientos_lote(c):
+    # Imágenes ya procesadas por el enrolamiento por lotes, por hash de contenido
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS enrolamientos_lote (
+        hash TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        archivo TEXT NOT NULL,
+        fecha TEXT NOT NULL
+    )
+    """)
+
+
+def _migracion_9_legajo_usuarios(c):
+    # Legajo del empleado (el id_empleado de autorizaciones.csv); usuarios.id es solo la clave interna
+    c.execute("ALTER TABLE usuarios ADD COLUMN legajo INTEGER")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_legajo ON usuarios (legajo)")
+
+
+def _migracion_10_version_resumen_diario(c):
+    # Contador de cambios de resumen_diario: reconstruir-resumen lo cambia sin tocar registros
+    c.execute("INSERT OR IGNORE INTO versiones_tablas (tabla, version) VALUES ('resumen_diario', 0)")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_diario_version_{evento.lower()}
+        AFTER {evento} ON resumen_diario
+        BEGIN
+            UPDATE versiones_tablas SET version = version + 1 WHERE tabla = 'resumen_diario';
+        END
+        """)
+
+
+# Lista ordenada de migraciones; la versión aplicada se guarda en PRAGMA user_version
+MIGRACIONES = [
+    (1, _migracion_1_indices_registros),
+    (2, _migracion_2_timestamps_iso),
+    (3, _migracion_3_contador_cambios),
+    (4, _migracion_4_resumen_diario),
+    (5, _migracion_5_autorizaciones),
+    (6, _migracion_6_version_usuarios),
+    (7, _migracion_7_galeria_rostros),
+    (8, _migracion_8_enrolamientos_lote),
+    (9, _migracion_9_legajo_usuarios),
+    (10, _migracion_10_version_resumen_diario),
+]
+
+
+def version_tabla(tabla):
+    """Contador de cambios de una tabla (se incrementa con cada INSERT/UPDATE/DELETE)."""
+    fila = get_conn().execute("SELECT version FROM versiones_tablas WHERE tabla = ?", (tabla,)).fetchone()
+    return fila[0] if fila else 0
+
+
+def version_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    """Crea las tablas base y aplica las migraciones pendientes."""
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        _esquema_base(c)
+        actual = version_esquema(conn)
+        for version, migracion in MIGRACIONES:
+            if version > actual:
+                migracion(c)
+                c.execute(f"PRAGMA user_version={version}")
+                print(f"✅ Esquema de la DB migrado a la versión {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,48 @@
+import cv2
+import face_recognition
+
+
+def _area(caja):
+    top, right, bottom, left = caja
+    return (bottom - top) * (right - left)
+
+
+def localizar_rostro(frame, ancho_deteccion=320, modelo="hog", upsample=1):
+    """Busca rostros sobre una copia reducida del frame y devuelve la caja del más grande.
+
+    La caja se devuelve en coordenadas del frame original (top, right, bottom, left),
+    o None si no se detectó ningún rostro.
+    """
+    alto, ancho = frame.shape[:2]
+    escala = min(1.0, ancho_deteccion / ancho) if ancho_deteccion else 1.0
+    if escala < 1.0:
+        reducido = cv2.resize(frame, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    else:
+        reducido = frame
+
+    ubicaciones = face_recognition.face_locations(reducido, number_of_times_to_upsample=upsample, model=modelo)
+    if not ubicaciones:
+        return None
+
+    # Volver a escalar la caja al tamaño completo
+    top, right, bottom, left = max(ubicaciones, key=_area)
+    return (
+        max(0, int(round(top / escala))),
+        min(ancho, int(round(right / escala))),
+        min(alto, int(round(bottom / escala))),
+        max(0, int(round(left / escala))),
+    )
+
+
+def codificar_en_caja(frame, caja, jitters=1):
+    """Encoding del rostro que ocupa `caja` (sin volver a detectar)."""
+    # Los landmarks y el encoding se calculan sobre el frame completo, solo para esa caja
+    return face_recognition.face_encodings(frame, known_face_locations=[caja], num_jitters=jitters)[0]
+
+
+def codificar_rostro(frame, ancho_deteccion=320, modelo="hog", upsample=1, jitters=1):
+    """Detecta el rostro más grande del frame y devuelve solo su encoding (o None)."""
+    caja = localizar_rostro(frame, ancho_deteccion, modelo, upsample)
+    if caja is None:
+        return None
+    return codificar_en_caja(frame, caja, jitters)
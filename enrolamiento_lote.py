@@ -0,0 +1,101 @@
+import hashlib
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+import galeria_rostros
+from calidad_rostro import CalidadInsuficiente
+from db import get_conn, transaccion
+from servicio_encoding import codificar_imagen, inicializar_worker
+from serializacion import encoding_a_blob
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg")
+
+
+def username_desde_archivo(nombre_archivo):
+    """'Genaro_20250905000250.png' -> 'Genaro' (se descarta el sufijo de fecha de la captura)."""
+    base = os.path.splitext(nombre_archivo)[0]
+    nombre, _, sufijo = base.rpartition("_")
+    return nombre if nombre and sufijo.isdigit() else base
+
+
+def _codificar_para_lote(imagen_bytes, perfil):
+    # (encoding, motivo de rechazo por calidad): una imagen mala no corta el lote entero
+    try:
+        return codificar_imagen(imagen_bytes, perfil), None
+    except CalidadInsuficiente as rechazo:
+        return None, rechazo.motivo
+
+
+def enrolar_directorio(directorio, perfil, procesos=None, password_inicial=None,
+                       galeria_max=galeria_rostros.GALERIA_MAX):
+    """Codifica en paralelo todas las imágenes de `directorio` y hace upsert en usuarios.
+
+    Cada imagen se suma a la galería de su usuario (varias capturas de la misma persona
+    quedan como galería y usuarios.encoding con su centroide). Las imágenes cuyo hash ya
+    figura en enrolamientos_lote se saltean. Todas las escrituras se hacen en una sola
+    transacción (con la conexión de db.py: WAL y busy_timeout, para convivir con el
+    servidor en ejecución). Devuelve un dict con el resumen.
+    """
+    inicio = time.perf_counter()
+    ya_procesados = {fila[0] for fila in get_conn().execute("SELECT hash FROM enrolamientos_lote")}
+
+    pendientes = []
+    encontradas = 0
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in sorted(archivos):
+            if not archivo.lower().endswith(EXTENSIONES_IMAGEN):
+                continue
+            encontradas += 1
+            ruta = os.path.join(raiz, archivo)
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+            hash_contenido = hashlib.sha256(contenido).hexdigest()
+            if hash_contenido in ya_procesados:
+                continue
+            ya_procesados.add(hash_contenido)
+            pendientes.append((ruta, username_desde_archivo(archivo), hash_contenido, contenido))
+
+    # El encoding (la parte cara) se reparte entre todos los núcleos
+    with ProcessPoolExecutor(max_workers=procesos, initializer=inicializar_worker) as executor:
+        encodings = list(executor.map(_codificar_para_lote, (p[3] for p in pendientes), repeat(perfil), chunksize=4))
+
+    enrolados, sin_rostro, nuevos = 0, 0, 0
+    rechazadas = {}
+    ahora = datetime.now().isoformat(timespec="seconds")
+    with transaccion() as c:
+        existentes = {fila[0] for fila in c.execute("SELECT username FROM usuarios")}
+        for (ruta, username, hash_contenido, _), (encoding, motivo) in zip(pendientes, encodings):
+            if motivo is not None:
+                rechazadas[motivo] = rechazadas.get(motivo, 0) + 1
+                continue
+            if encoding is None:
+                sin_rostro += 1
+                continue
+            if username not in existentes:
+                nuevos += 1
+                existentes.add(username)
+            c.execute("""
+                INSERT INTO usuarios (username, password, email, rostro_path, encoding)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(username) DO UPDATE SET rostro_path=excluded.rostro_path
+            """, (username, password_inicial or secrets.token_urlsafe(12), "", ruta, encoding_a_blob(encoding)))
+            galeria_rostros.agregar(c, username, encoding, galeria_max, origen=ruta)
+            c.execute("INSERT INTO enrolamientos_lote (hash, username, archivo, fecha) VALUES (?, ?, ?, ?)",
+                      (hash_contenido, username, ruta, ahora))
+            enrolados += 1
+
+    duracion = time.perf_counter() - inicio
+    return {
+        "encontradas": encontradas,
+        "salteadas": encontradas - len(pendientes),
+        "procesadas": len(pendientes),
+        "enrolados": enrolados,
+        "usuarios_nuevos": nuevos,
+        "sin_rostro": sin_rostro,
+        "rechazadas_calidad": rechazadas,
+        "segundos": duracion,
+        "imagenes_por_segundo": len(pendientes) / duracion if duracion else 0.0,
+    }
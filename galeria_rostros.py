@@ -0,0 +1,77 @@
+from datetime import datetime
+import numpy as np
+from serializacion import blob_a_encoding, encoding_a_blob
+
+# Galería de encodings por usuario: varias capturas (con y sin anteojos, distinta luz) en
+# lugar de una sola. usuarios.encoding pasa a guardar el centroide (promedio) de la
+# galería, que es lo que recorre la primera etapa del matching; la galería completa solo
+# se compara contra los pocos candidatos más cercanos (ver IndiceRostros.buscar).
+
+# Encodings que se conservan por usuario; al superarlo se descarta el más viejo
+GALERIA_MAX = 5
+
+
+def crear_tabla(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS galeria_rostros (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        encoding BLOB NOT NULL,
+        origen TEXT,
+        fecha TEXT NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_galeria_rostros_username ON galeria_rostros (username, id)")
+    # La galería se va con el usuario (p. ej. /register_face_reject)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_galeria_rostros_usuario_delete
+    AFTER DELETE ON usuarios
+    BEGIN
+        DELETE FROM galeria_rostros WHERE username = OLD.username;
+    END
+    """)
+    # Un cambio en la galería invalida el snapshot de encodings igual que uno en usuarios
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_galeria_rostros_version_{evento.lower()}
+        AFTER {evento} ON galeria_rostros
+        BEGIN
+            UPDATE versiones_tablas SET version = version + 1 WHERE tabla = 'usuarios';
+        END
+        """)
+
+
+def inicializar(c):
+    """Arranca la galería de cada usuario con el encoding que ya tenía registrado."""
+    c.execute("""
+        INSERT INTO galeria_rostros (username, encoding, origen, fecha)
+        SELECT username, encoding, 'registro', ? FROM usuarios
+        WHERE encoding IS NOT NULL AND username NOT IN (SELECT username FROM galeria_rostros)
+    """, (datetime.now().isoformat(timespec="seconds"),))
+    return c.rowcount
+
+
+def agregar(c, username, encoding, maximo=GALERIA_MAX, origen=None):
+    """Suma el encoding a la galería del usuario y recalcula su centroide en usuarios.encoding.
+
+    Corre en la transacción de `c`. Devuelve (centroide, galería) como arrays float32.
+    """
+    c.execute("INSERT INTO galeria_rostros (username, encoding, origen, fecha) VALUES (?, ?, ?, ?)",
+              (username, encoding_a_blob(encoding), origen, datetime.now().isoformat(timespec="seconds")))
+    c.execute("""
+        DELETE FROM galeria_rostros WHERE username = ? AND id NOT IN (
+            SELECT id FROM galeria_rostros WHERE username = ? ORDER BY id DESC LIMIT ?)
+    """, (username, username, maximo))
+    filas = c.execute("SELECT encoding FROM galeria_rostros WHERE username = ? ORDER BY id", (username,)).fetchall()
+    galeria = np.stack([blob_a_encoding(e) for e, in filas]).astype(np.float32, copy=False)
+    centroide = galeria.mean(axis=0)
+    c.execute("UPDATE usuarios SET encoding = ? WHERE username = ?", (encoding_a_blob(centroide), username))
+    return centroide, galeria
+
+
+def leer_galerias(conn):
+    """{username: matriz (m x 128) float32} con la galería de cada usuario."""
+    por_usuario = {}
+    for username, encoding in conn.execute("SELECT username, encoding FROM galeria_rostros ORDER BY id"):
+        por_usuario.setdefault(username, []).append(blob_a_encoding(encoding))
+    return {username: np.stack(encodings).astype(np.float32, copy=False) for username, encodings in por_usuario.items()}
@@ -0,0 +1,150 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Figuras armadas con la API orientada a objetos (Figure + FigureCanvasAgg): cada render
+# tiene su propia figura, sin el estado global de pyplot, así se pueden generar varios
+# gráficos a la vez desde distintos hilos.
+#
+# matplotlib se importa recién con el primer gráfico (o en la precarga): es la mitad del
+# tiempo de arranque de la app y /login no lo necesita.
+
+COLORES_VENCIMIENTO = ['#ff6b6b', '#ffa726', '#42a5f5', '#66bb6a']
+
+
+def importar_matplotlib():
+    from matplotlib import colormaps
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    return colormaps, FigureCanvasAgg, Figure
+
+
+def colores_paleta(nombre, cantidad):
+    """`cantidad` colores de un colormap de matplotlib (p. ej. 'Set3')."""
+    colormaps, _, _ = importar_matplotlib()
+    return colormaps[nombre](range(cantidad))
+
+
+def _nueva_figura(figsize):
+    _, FigureCanvasAgg, Figure = importar_matplotlib()
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _a_png(fig, bbox_inches=None):
+    img = io.BytesIO()
+    fig.savefig(img, format="png", bbox_inches=bbox_inches)
+    return img.getvalue()
+
+
+def _referencias_oee(ax):
+    ax.axhline(y=85, color='green', linestyle='--', alpha=0.7, label='Excelente (85%)')
+    ax.axhline(y=65, color='orange', linestyle='--', alpha=0.7, label='Aceptable (65%)')
+
+
+def _rotar_etiquetas(ax, rotacion, alineacion):
+    for etiqueta in ax.get_xticklabels():
+        etiqueta.set_rotation(rotacion)
+        if alineacion:
+            etiqueta.set_horizontalalignment(alineacion)
+
+
+# ====== CONSTRUCTORES ======
+def grafico_barras(etiquetas, valores, titulo, color, formato=None, ylabel=None, xlabel=None,
+                   figsize=(10, 6), titulo_fontsize=16, rotacion=45, alineacion=None,
+                   referencias_oee=False, leyenda=False, tight_layout=False, bbox_inches="tight"):
+    """Barras con el valor escrito sobre cada una (`formato` recibe la altura y devuelve el texto)."""
+    fig, ax = _nueva_figura(figsize)
+    barras = ax.bar(list(etiquetas), list(valores), color=color)
+    ax.set_title(titulo, fontsize=titulo_fontsize)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    if referencias_oee:
+        _referencias_oee(ax)
+    if leyenda:
+        ax.legend()
+    _rotar_etiquetas(ax, rotacion, alineacion)
+    if formato is not None:
+        for barra in barras:
+            altura = barra.get_height()
+            ax.text(barra.get_x() + barra.get_width() / 2., altura, formato(altura), ha="center", va="bottom")
+    if tight_layout:
+        fig.tight_layout()
+    return _a_png(fig, bbox_inches)
+
+
+def grafico_torta(valores, etiquetas, titulo, colores=None, figsize=(8, 8), startangle=None,
+                  aspecto_igual=False, bbox_inches=None):
+    """Torta con porcentajes."""
+    fig, ax = _nueva_figura(figsize)
+    ax.pie(list(valores), labels=list(etiquetas), autopct='%1.1f%%', startangle=startangle or 0, colors=colores)
+    ax.set_title(titulo, fontsize=16)
+    if aspecto_igual:
+        ax.axis('equal')
+    return _a_png(fig, bbox_inches)
+
+
+def grafico_lineas(series, titulo, ylabel=None, xlabel=None, figsize=(10, 5), rotacion=45,
+                   referencias_oee=False, bbox_inches="tight"):
+    """Una línea por serie; `series` es una lista de (etiqueta, x, y)."""
+    fig, ax = _nueva_figura(figsize)
+    for etiqueta, x, y in series:
+        ax.plot(list(x), list(y), marker='o', label=etiqueta)
+    ax.set_title(titulo, fontsize=14)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    ax.legend()
+    if referencias_oee:
+        _referencias_oee(ax)
+    _rotar_etiquetas(ax, rotacion, None)
+    return _a_png(fig, bbox_inches)
+
+
+# ====== POOL DE RENDER ======
+class PoolRender:
+    """Renderiza gráficos en un pool de hilos acotado.
+
+    Limita cuántos gráficos se generan a la vez (el render es CPU intensivo) y, si
+    llegan varios pedidos del mismo gráfico mientras se está generando, todos esperan
+    el mismo resultado en lugar de renderizarlo de nuevo.
+    """
+
+    def __init__(self, hilos=None):
+        self.hilos = hilos or min(4, os.cpu_count() or 1)
+        self._executor = None
+        self._en_curso = {}
+        # Reentrante: si el render ya terminó, add_done_callback llama a _terminar en el acto
+        self._lock = threading.RLock()
+
+    def configurar(self, hilos):
+        with self._lock:
+            if self._executor is None:
+                self.hilos = hilos
+
+    def renderizar(self, clave, render):
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="render")
+                futuro = self._executor.submit(render)
+                self._en_curso[clave] = futuro
+                futuro.add_done_callback(lambda _: self._terminar(clave, futuro))
+        return futuro.result()
+
+    def _terminar(self, clave, futuro):
+        with self._lock:
+            if self._en_curso.get(clave) is futuro:
+                del self._en_curso[clave]
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
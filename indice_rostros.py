@@ -0,0 +1,364 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import galeria_rostros
+import snapshot_rostros
+from serializacion import blob_a_encoding
+from db import get_conn, version_tabla
+from metricas import CONSULTAS_DB, registrar_evento
+
+DIMENSION_ENCODING = 128
+
+# Resultado de una identificación: el más cercano, su distancia y la diferencia con el segundo.
+# margen es None cuando hay un solo candidato; evaluados indica cuántos encodings se compararon
+# (centroides más los de las galerías de los finalistas).
+ResultadoBusqueda = namedtuple("ResultadoBusqueda", ["username", "distancia", "margen", "evaluados"])
+
+
+# ====== BACKENDS DE BÚSQUEDA ======
+class BackendExacto:
+    """Fuerza bruta: compara contra todas las filas de la matriz (resultado exacto)."""
+
+    nombre = "exacto"
+
+    def reconstruir(self, matriz):
+        pass
+
+    def agregar(self, pos, encoding):
+        pass
+
+    def quitar(self, pos, encoding):
+        pass
+
+    def candidatos(self, encoding):
+        # None = sin filtro, se evalúa la matriz completa
+        return None
+
+
+class BackendLSH:
+    """Índice aproximado por proyecciones aleatorias (LSH de hiperplanos) hecho con NumPy.
+
+    Cada tabla asigna a un encoding un código de `bits` bits según de qué lado cae de
+    cada hiperplano; solo se comparan en forma exacta las filas que comparten código con
+    la consulta en al menos una tabla. Pensado para plantillas grandes.
+    """
+
+    nombre = "lsh"
+
+    def __init__(self, tablas=8, bits=12, semilla=0):
+        self.tablas = tablas
+        self.bits = bits
+        rng = np.random.default_rng(semilla)
+        self._planos = rng.standard_normal((DIMENSION_ENCODING, tablas * bits)).astype(np.float32)
+        self._pesos = (1 << np.arange(bits, dtype=np.int64))
+        self._centro = np.zeros(DIMENSION_ENCODING, dtype=np.float32)
+        self._cubetas = [dict() for _ in range(tablas)]
+
+    def _codigos(self, encodings):
+        # Los encodings no están centrados en el origen: se restan del centro de los datos
+        signos = ((np.atleast_2d(encodings) - self._centro) @ self._planos) > 0
+        return signos.reshape(-1, self.tablas, self.bits) @ self._pesos
+
+    def reconstruir(self, matriz):
+        if len(matriz):
+            self._centro = matriz.mean(axis=0)
+        self._cubetas = [dict() for _ in range(self.tablas)]
+        for pos, codigos in enumerate(self._codigos(matriz) if len(matriz) else []):
+            self._insertar(pos, codigos)
+
+    def _insertar(self, pos, codigos):
+        for tabla, codigo in zip(self._cubetas, codigos):
+            tabla.setdefault(int(codigo), set()).add(pos)
+
+    def agregar(self, pos, encoding):
+        self._insertar(pos, self._codigos(encoding)[0])
+
+    def quitar(self, pos, encoding):
+        for tabla, codigo in zip(self._cubetas, self._codigos(encoding)[0]):
+            cubeta = tabla.get(int(codigo))
+            if cubeta is not None:
+                cubeta.discard(pos)
+                if not cubeta:
+                    del tabla[int(codigo)]
+
+    def candidatos(self, encoding):
+        encontrados = set()
+        for tabla, codigo in zip(self._cubetas, self._codigos(encoding)[0]):
+            encontrados.update(tabla.get(int(codigo), ()))
+        return np.fromiter(encontrados, dtype=np.int64, count=len(encontrados))
+
+
+def crear_backend(nombre, **parametros):
+    """Instancia el backend de búsqueda configurado ("exacto" o "lsh")."""
+    if nombre == BackendExacto.nombre:
+        return BackendExacto()
+    if nombre == BackendLSH.nombre:
+        return BackendLSH(**parametros)
+    raise ValueError(f"Backend de reconocimiento desconocido: {nombre}")
+
+
+class IndiceRostros:
+    """Índice en memoria con los encodings faciales de todos los usuarios registrados.
+
+    Los encodings viven en una única matriz contigua (N x 128, float32), así cada
+    login se resuelve con un solo cálculo vectorizado de distancias en lugar de
+    recorrer la tabla usuarios fila por fila. La selección de filas a comparar la
+    decide el backend (exacto o LSH).
+
+    La matriz guarda el centroide de la galería de cada usuario (galeria_rostros). La
+    búsqueda tiene dos etapas: distancia a todos los centroides y, para los
+    `candidatos_galeria` más cercanos, distancia a cada encoding de su galería.
+
+    Con `snapshot_dir` la matriz no se arma desde la DB sino que se mapea en solo
+    lectura desde el snapshot en disco (snapshot_rostros), compartido por todos los
+    workers. Los cambios de un request se aplican en memoria (sobre una copia privada
+    de la matriz) y el snapshot se reexporta en segundo plano, agrupando los cambios
+    de `intervalo_revision` segundos. Con la misma frecuencia cada worker revisa si hay
+    un snapshot más nuevo para adjuntar o si usuarios cambió y hay que exportar.
+    """
+
+    def __init__(self, backend=None, capacidad_inicial=64, snapshot_dir=None, intervalo_revision=2.0,
+                 candidatos_galeria=3):
+        self.backend = backend or BackendExacto()
+        self.candidatos_galeria = candidatos_galeria
+        self.snapshot_dir = snapshot_dir
+        self.intervalo_revision = intervalo_revision
+        self._lock = threading.RLock()
+        self._cargado = False
+        self._capacidad_inicial = capacidad_inicial
+        self._manifiesto = None
+        self._proxima_revision = 0.0
+        # Versión de usuarios que ya refleja la matriz en memoria (incluidos los cambios locales)
+        self._version_local = -1
+        self._exportacion = None
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._matriz = np.empty((self._capacidad_inicial, DIMENSION_ENCODING), dtype=np.float32)
+        self._normas = np.empty(self._capacidad_inicial, dtype=np.float32)
+        self._usernames = []
+        self._posiciones = {}
+        # username -> matriz (m x 128) con su galería; sin galería se compara solo el centroide
+        self._galerias = {}
+
+    def __len__(self):
+        return len(self._usernames)
+
+    # ====== CARGA INICIAL ======
+    def cargar(self):
+        """Lee todos los encodings de la DB (solo se usa al arrancar o para forzar recarga)."""
+        if self.snapshot_dir:
+            self._adjuntar_snapshot()
+            return
+        c = get_conn().cursor()
+        with CONSULTAS_DB.medir(consulta="cargar_indice"):
+            c.execute("SELECT username, encoding FROM usuarios WHERE encoding IS NOT NULL")
+            filas = c.fetchall()
+            galerias = galeria_rostros.leer_galerias(get_conn())
+
+        with self._lock:
+            self._reiniciar()
+            for username, encoding in filas:
+                if encoding:
+                    self._agregar(username, blob_a_encoding(encoding))
+                    if username in galerias:
+                        self._galerias[username] = galerias[username]
+            self.backend.reconstruir(self._matriz[:len(self._usernames)])
+            self._cargado = True
+
+    def _adjuntar_snapshot(self):
+        self._adjuntar(self._exportar_si_cambio())
+
+    def _exportar_si_cambio(self):
+        """Manifiesto vigente, exportando antes un snapshot nuevo si no refleja la versión de usuarios."""
+        with snapshot_rostros.bloqueo(self.snapshot_dir):
+            # Con el bloqueo tomado se relee: otro hilo o worker puede haber exportado mientras se esperaba.
+            # La versión se lee antes que las filas: si cambian en el medio, el snapshot queda
+            # marcado como viejo y se regenera en la próxima revisión
+            version = version_tabla("usuarios")
+            manifiesto = snapshot_rostros.leer_manifiesto(self.snapshot_dir)
+            if manifiesto is None or manifiesto["version_usuarios"] != version:
+                with CONSULTAS_DB.medir(consulta="exportar_snapshot"):
+                    manifiesto = snapshot_rostros.exportar(get_conn(), self.snapshot_dir, version)
+        return manifiesto
+
+    def _adjuntar(self, manifiesto):
+        # Un snapshot anterior a los cambios ya aplicados en memoria los perdería
+        if self._cargado and manifiesto["version_usuarios"] < self._version_local:
+            return
+        matriz, normas, usernames, galerias = snapshot_rostros.abrir(self.snapshot_dir, manifiesto)
+        with self._lock:
+            if self._cargado and manifiesto["version_usuarios"] < self._version_local:
+                return
+            self._matriz, self._normas, self._usernames = matriz, normas, usernames
+            self._galerias = galerias
+            self._posiciones = {username: pos for pos, username in enumerate(usernames)}
+            self.backend.reconstruir(matriz)
+            self._manifiesto = manifiesto
+            self._version_local = manifiesto["version_usuarios"]
+            self._proxima_revision = time.monotonic() + self.intervalo_revision
+            self._cargado = True
+
+    def _programar_exportacion(self):
+        # Una sola exportación pendiente por proceso: los cambios que llegan mientras tanto van en ella
+        with self._lock:
+            if self._exportacion is None:
+                self._exportacion = threading.Timer(self.intervalo_revision, self._exportar_en_segundo_plano)
+                self._exportacion.daemon = True
+                self._exportacion.start()
+
+    def _exportar_en_segundo_plano(self):
+        with self._lock:
+            # Los cambios posteriores a este punto programan otra exportación
+            self._exportacion = None
+        try:
+            self._adjuntar(self._exportar_si_cambio())
+        except Exception as e:
+            # Los cambios ya están en memoria y en la DB: la próxima revisión vuelve a intentarlo
+            registrar_evento("snapshot_error", nivel=logging.WARNING, error=str(e))
+
+    def _asegurar_cargado(self):
+        if not self._cargado:
+            with self._lock:
+                if not self._cargado:
+                    self.cargar()
+        elif self.snapshot_dir and time.monotonic() >= self._proxima_revision:
+            with self._lock:
+                if time.monotonic() < self._proxima_revision:
+                    return
+                self._proxima_revision = time.monotonic() + self.intervalo_revision
+                # Otro worker publicó un snapshot: adjuntarlo solo mapea los archivos
+                manifiesto = snapshot_rostros.leer_manifiesto(self.snapshot_dir)
+                if manifiesto is not None and manifiesto["id"] != self._manifiesto["id"]:
+                    self._adjuntar(manifiesto)
+                # Otro worker (o el enrolamiento por lotes) cambió usuarios y nadie exportó todavía
+                if version_tabla("usuarios") != self._version_local:
+                    self._programar_exportacion()
+
+    def precargar(self):
+        """Carga el índice si todavía no se cargó (lo usa la precarga del arranque)."""
+        self._asegurar_cargado()
+
+    def estado_snapshot(self):
+        """Manifiesto del snapshot adjuntado (None si el índice no usa snapshot)."""
+        return self._manifiesto
+
+    # ====== ACTUALIZACIÓN INCREMENTAL ======
+    def actualizar(self, username, encoding, galeria=None):
+        """Agrega o reemplaza el centroide (y la galería) de un usuario sin recargar la tabla.
+
+        Con snapshot, la DB ya tiene el cambio: se aplica en memoria y se programa la exportación.
+        """
+        self._asegurar_cargado()
+        encoding = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            self._preparar_escritura()
+            pos = self._posiciones.get(username)
+            if pos is None:
+                pos = self._agregar(username, encoding)
+            else:
+                self.backend.quitar(pos, self._matriz[pos])
+                self._matriz[pos] = encoding
+                self._normas[pos] = np.dot(encoding, encoding)
+            self.backend.agregar(pos, encoding)
+            if galeria is None:
+                self._galerias.pop(username, None)
+            else:
+                self._galerias[username] = np.asarray(galeria, dtype=np.float32)
+            self._cambio_local()
+
+    def eliminar(self, username):
+        """Quita un usuario del índice moviendo la última fila a su lugar (O(1))."""
+        self._asegurar_cargado()
+        with self._lock:
+            if username not in self._posiciones:
+                return
+            self._preparar_escritura()
+            pos = self._posiciones.pop(username)
+            self._galerias.pop(username, None)
+            ultimo = len(self._usernames) - 1
+            self.backend.quitar(pos, self._matriz[pos])
+            if pos != ultimo:
+                self.backend.quitar(ultimo, self._matriz[ultimo])
+                self._matriz[pos] = self._matriz[ultimo]
+                self._normas[pos] = self._normas[ultimo]
+                self.backend.agregar(pos, self._matriz[pos])
+                movido = self._usernames[ultimo]
+                self._usernames[pos] = movido
+                self._posiciones[movido] = pos
+            self._usernames.pop()
+            self._cambio_local()
+
+    def _preparar_escritura(self):
+        # La matriz del snapshot está mapeada en solo lectura: el primer cambio la copia a
+        # memoria privada del proceso, hasta adjuntar el próximo snapshot
+        if not self._matriz.flags.writeable:
+            self._matriz = np.array(self._matriz)
+            self._normas = np.array(self._normas)
+
+    def _cambio_local(self):
+        if self.snapshot_dir:
+            self._version_local = version_tabla("usuarios")
+            self._programar_exportacion()
+
+    def _agregar(self, username, encoding):
+        n = len(self._usernames)
+        if n == self._matriz.shape[0]:
+            # Crecimiento geométrico para que agregar usuarios sea O(1) amortizado
+            capacidad = max(n * 2, self._capacidad_inicial)
+            nueva = np.empty((capacidad, DIMENSION_ENCODING), dtype=np.float32)
+            nueva[:n] = self._matriz[:n]
+            self._matriz = nueva
+            normas = np.empty(capacidad, dtype=np.float32)
+            normas[:n] = self._normas[:n]
+            self._normas = normas
+        self._matriz[n] = encoding
+        self._normas[n] = np.dot(encoding, encoding)
+        self._usernames.append(username)
+        self._posiciones[username] = n
+        return n
+
+    # ====== BÚSQUEDA ======
+    def buscar(self, encoding):
+        """Devuelve el usuario más cercano al encoding (sin aplicar umbral)."""
+        self._asegurar_cargado()
+        encoding = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            n = len(self._usernames)
+            if n == 0:
+                return ResultadoBusqueda(None, None, None, 0)
+
+            filas = self.backend.candidatos(encoding)
+            # Si el backend aproximado no aporta al menos dos candidatos se cae a la búsqueda exacta
+            if filas is None or len(filas) < min(2, n):
+                filas = np.arange(n)
+                # Sin filtro se usa la matriz tal cual: el fancy indexing copiaría todas las
+                # filas (y con snapshot mapeado, páginas privadas por request)
+                matriz, normas = self._matriz[:n], self._normas[:n]
+            else:
+                matriz, normas = self._matriz[filas], self._normas[filas]
+
+            # 1ª etapa, contra los centroides: ||a - b||² = ||a||² + ||b||² - 2·a·b → un solo producto matriz-vector
+            cuadrados = normas + np.dot(encoding, encoding) - 2.0 * (matriz @ encoding)
+            distancias = np.sqrt(np.maximum(cuadrados, 0.0))
+
+            # 2ª etapa: los k centroides más cercanos (al menos dos, para el margen) se
+            # comparan contra cada encoding de su galería y vale el más parecido
+            k = min(max(self.candidatos_galeria, 2), len(filas))
+            evaluados = len(filas)
+            finalistas = []
+            for i in np.argpartition(distancias, k - 1)[:k]:
+                username = self._usernames[int(filas[i])]
+                galeria = self._galerias.get(username)
+                if galeria is None or not len(galeria):
+                    finalistas.append((float(distancias[i]), username))
+                    continue
+                evaluados += len(galeria)
+                finalistas.append((float(np.sqrt(np.min(np.sum((galeria - encoding) ** 2, axis=1)))), username))
+
+            finalistas.sort()
+            distancia, username = finalistas[0]
+            margen = finalistas[1][0] - distancia if len(finalistas) > 1 else None
+            return ResultadoBusqueda(username, distancia, margen, evaluados)
@@ -0,0 +1,209 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_request_context, request
+
+# Métricas en memoria del proceso, expuestas en /metrics con el formato de texto de
+# Prometheus. Con varios workers de gunicorn cada proceso tiene las suyas (el scraper
+# ve el worker que atendió el request).
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas_texto(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monótono, con una serie por combinación de etiquetas."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def lineas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma de buckets fijos (acumulados al exponerse, como espera Prometheus)."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # clave de etiquetas -> [conteo por bucket (+ uno para +Inf), suma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """Observa los segundos que tarda el bloque (aunque termine con una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def lineas(self):
+        with self._lock:
+            series = sorted((clave, list(conteos), suma) for clave, (conteos, suma) in self._series.items())
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else _numero(float(limite))
+                etiquetas = _etiquetas_texto(self.etiquetas, clave, f'le="{le}"')
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _etiquetas_texto(self.etiquetas, clave)
+            yield f"{self.nombre}_sum{etiquetas} {_numero(suma)}"
+            yield f"{self.nombre}_count{etiquetas} {acumulado}"
+
+
+class RegistroMetricas:
+    """Conjunto de métricas del proceso; `exposicion()` arma el texto para /metrics."""
+
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        metrica = Histograma(nombre, ayuda, etiquetas, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def exposicion(self):
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+# ====== MÉTRICAS DE LA APLICACIÓN ======
+ETAPAS_RECONOCIMIENTO = registro.histograma(
+    "reconocimiento_etapa_segundos",
+    "Duración de cada etapa del reconocimiento facial (lectura, imdecode, deteccion, calidad, encoding, matching).",
+    ["etapa"])
+RESULTADOS_LOGIN = registro.contador(
+    "login_face_resultados_total",
+    "Resultados del login facial por endpoint (coincidencia, sin_coincidencia, sin_rostro o motivo de calidad).",
+    ["endpoint", "resultado"])
+CONSULTAS_DB = registro.histograma(
+    "db_consulta_segundos", "Duración de las consultas y transacciones a SQLite.", ["consulta"])
+RENDER_GRAFICOS = registro.histograma(
+    "grafico_render_segundos", "Tiempo de render de cada gráfico de /visualizacion.", ["grafico"])
+ACCESOS_AREA = registro.contador(
+    "acceso_area_decisiones_total", "Decisiones del control de acceso por área y motivo.", ["area", "motivo"])
+ARRANQUE = registro.histograma(
+    "arranque_etapa_segundos",
+    "Duración del arranque: imports al iniciar, cada import diferido y cada tarea de la precarga.",
+    ["etapa"], buckets=BUCKETS_SEGUNDOS + (30.0, 60.0))
+DURACION_REQUESTS = registro.histograma(
+    "http_request_segundos", "Duración de los requests HTTP por endpoint.", ["endpoint", "status"])
+
+
+# ====== LOGS ESTRUCTURADOS ======
+logger = logging.getLogger("control_ingreso")
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento: ts, nivel, evento, request_id y los campos extra."""
+
+    def format(self, record):
+        evento = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "evento": record.getMessage(),
+        }
+        evento.update(getattr(record, "campos", {}))
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def configurar_logs(nivel="INFO"):
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(FormatoJSON())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(nivel)
+
+
+def request_id():
+    """ID del request en curso (o None fuera de un request)."""
+    return g.get("request_id") if has_request_context() else None
+
+
+def registrar_evento(evento, nivel=logging.INFO, **campos):
+    """Log estructurado del evento, con el request_id del request en curso."""
+    if has_request_context():
+        campos = {"request_id": request_id(), **campos}
+    logger.log(nivel, evento, extra={"campos": campos})
+
+
+def instalar(app):
+    """Asigna un request_id a cada request (o respeta X-Request-ID) y mide su duración."""
+
+    @app.before_request
+    def _inicio_request():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.inicio_request = time.perf_counter()
+
+    @app.after_request
+    def _fin_request(respuesta):
+        if "inicio_request" not in g:
+            return respuesta
+        respuesta.headers["X-Request-ID"] = g.request_id
+        DURACION_REQUESTS.observar(time.perf_counter() - g.inicio_request,
+                                   endpoint=request.endpoint or "desconocido", status=respuesta.status_code)
+        return respuesta
@@ -0,0 +1,150 @@
+import threading
+from arranque import importar_diferido
+from datasets import concatenar
+
+pd = importar_diferido("pandas")
+
+FUENTES_OEE = ("tiempos_produccion", "produccion_velocidad", "calidad")
+CLAVE_TURNO = ["fecha", "turno"]
+
+# Indicadores que se promedian y cantidades que se suman en los resúmenes
+INDICADORES = ["Disponibilidad", "Rendimiento", "Calidad", "OEE"]
+CANTIDADES = ["unidades_producidas", "unidades_defectuosas", "unidades_totales",
+              "tiempo_planificado_min", "tiempo_operativo_min", "tiempo_parada_min"]
+
+# Dimensiones de los resúmenes precalculados: nombre -> función que arma la clave de agrupación
+DIMENSIONES = {
+    "dia": lambda df: df["fecha"],
+    "semana": lambda df: df["fecha"].dt.to_period("W-SUN").dt.start_time.rename("semana"),
+    "turno": lambda df: df["turno"].astype(str),
+    "producto": lambda df: df["producto"].astype(str),
+}
+
+
+def _calcular_indicadores(df):
+    """Agrega Disponibilidad, Rendimiento, Calidad y OEE a un merge de las tres fuentes."""
+    df["Disponibilidad"] = df["tiempo_operativo_min"] / df["tiempo_planificado_min"]
+    df["Rendimiento"] = df["unidades_producidas"] / (df["tiempo_operativo_min"] * df["velocidad_ideal_upm"])
+    df["Calidad"] = (df["unidades_totales"] - df["unidades_defectuosas"]) / df["unidades_totales"]
+    df["OEE"] = df["Disponibilidad"] * df["Rendimiento"] * df["Calidad"]
+
+    if 'velocidad_real_upm' not in df.columns:
+        df['velocidad_real_upm'] = df['unidades_producidas'] / (df['tiempo_operativo_min'] / 60)
+    return df
+
+
+def _unir(tiempos, produccion, calidad):
+    return tiempos.merge(produccion, on=CLAVE_TURNO).merge(calidad, on=CLAVE_TURNO)
+
+
+def _sumas(df, dimension):
+    # Sumas parciales por grupo: se pueden acumular entre actualizaciones y promediar al final
+    columnas = INDICADORES + CANTIDADES
+    sumas = df[columnas].groupby(DIMENSIONES[dimension](df)).sum()
+    sumas["turnos"] = df.groupby(DIMENSIONES[dimension](df)).size()
+    return sumas
+
+
+class MotorOEE:
+    """OEE por turno memoizado, con actualización incremental y resúmenes precalculados.
+
+    El merge de tiempos_produccion, produccion_velocidad y calidad se calcula una vez y
+    queda en memoria. Si las fuentes solo recibieron filas nuevas al final (un turno más),
+    se calculan los indicadores únicamente de esas filas y se suman a los resúmenes por
+    día, semana, turno y producto; ante cualquier otro cambio se recalcula todo.
+    """
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._lock = threading.Lock()
+        self._versiones = None
+        self._filas = None
+        self._df = None
+        self._sumas = {}
+
+    def _fuentes(self):
+        fuentes = [self.datasets.obtener_versionado(nombre) for nombre in FUENTES_OEE]
+        if any(df is None for df, _ in fuentes):
+            return None, None
+        return [df for df, _ in fuentes], tuple(generacion for _, generacion in fuentes)
+
+    def _actualizar(self):
+        frames, versiones = self._fuentes()
+        if frames is None:
+            return False
+        filas = tuple(len(df) for df in frames)
+        if versiones == self._versiones and filas == self._filas:
+            return True
+
+        with self._lock:
+            # Se releen con el lock tomado: un hilo que esperó el lock con frames más viejos que
+            # los ya aplicados los tomaría por un cambio y volvería a un estado anterior
+            frames, versiones = self._fuentes()
+            if frames is None:
+                return False
+            filas = tuple(len(df) for df in frames)
+            if versiones == self._versiones and filas == self._filas:
+                return True
+            if self._versiones is not None and any(
+                    (generacion, n) < aplicada
+                    for generacion, n, aplicada in zip(versiones, filas, zip(self._versiones, self._filas))):
+                return True
+            solo_agregados = (versiones == self._versiones
+                              and all(n >= previas for n, previas in zip(filas, self._filas)))
+            if solo_agregados:
+                self._agregar(frames)
+            else:
+                self._recalcular(frames)
+            self._versiones, self._filas = versiones, filas
+            return True
+
+    def _recalcular(self, frames):
+        df = _calcular_indicadores(_unir(*frames))
+        self._df = df
+        self._sumas = {dimension: _sumas(df, dimension) for dimension in DIMENSIONES}
+
+    def _agregar(self, frames):
+        # Join incremental: (T+ΔT)⋈(P+ΔP)⋈(C+ΔC) - T⋈P⋈C = ΔT⋈P'⋈C' ∪ T⋈ΔP⋈C' ∪ T⋈P⋈ΔC
+        viejas = [df.iloc[:n] for df, n in zip(frames, self._filas)]
+        nuevas = [df.iloc[n:] for df, n in zip(frames, self._filas)]
+        (t, p, c), (dt, dp, dc), (t2, p2, c2) = viejas, nuevas, frames
+        partes = [parte for parte in (_unir(dt, p2, c2), _unir(t, dp, c2), _unir(t, p, dc)) if len(parte)]
+        if not partes:
+            return
+        delta = _calcular_indicadores(pd.concat(partes, ignore_index=True))
+        self._df = concatenar(self._df, delta)
+        for dimension, acumuladas in self._sumas.items():
+            self._sumas[dimension] = acumuladas.add(_sumas(delta, dimension), fill_value=0)
+
+    # ====== CONSULTAS ======
+    def por_turno(self):
+        """DataFrame con una fila por turno y sus indicadores (compartido: no modificar)."""
+        if not self._actualizar():
+            return None
+        return self._df
+
+    def resumen(self, dimension, promediar_cantidades=False):
+        """Indicadores promedio y cantidades totales agrupados por dia/semana/turno/producto."""
+        if not self._actualizar():
+            return None
+        sumas = self._sumas[dimension]
+        resumen = sumas[INDICADORES].div(sumas["turnos"], axis=0)
+        cantidades = sumas[CANTIDADES]
+        if promediar_cantidades:
+            cantidades = cantidades.div(sumas["turnos"], axis=0)
+        else:
+            cantidades = cantidades.round().astype("int64")
+        resumen[CANTIDADES] = cantidades
+        resumen["turnos"] = sumas["turnos"].astype(int)
+        resumen["tasa_defectos"] = sumas["unidades_defectuosas"] / sumas["unidades_totales"] * 100
+        return resumen.rename_axis(dimension).reset_index()
+
+    def promedios(self):
+        """Promedio general de cada indicador, a partir de los resúmenes (sin recorrer los turnos)."""
+        if not self._actualizar():
+            return None
+        sumas = self._sumas["turno"]
+        turnos = sumas["turnos"].sum()
+        if not turnos:
+            return None
+        return {indicador: float(sumas[indicador].sum() / turnos) for indicador in INDICADORES}
@@ -0,0 +1,184 @@
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+from arranque import importar_diferido
+
+pd = importar_diferido("pandas")
+
+# Estado de vencimiento según los días que faltan, en intervalos [desde, hasta)
+LIMITES_VENCIMIENTO = [-np.inf, 0, 30, 90, np.inf]
+ESTADOS_VENCIMIENTO = ['Vencido', 'Por vencer (≤30 días)', 'Próximo a vencer (31-90 días)', 'Vigente (>90 días)']
+# Lotes que la página de inventario lista como próximos a vencer (incluye los vencidos)
+DIAS_PROXIMOS = 30
+
+COLUMNAS_LOTE = ["id_item", "nombre_item", "lote", "proveedor_id", "cantidad (KG)", "fecha_ingreso",
+                 "fecha_vencimiento"]
+
+# Índice de una versión del CSV: lotes ordenados por vencimiento (filas del DataFrame), sus
+# fechas, KG acumulados y los lotes de cada producto. Se reemplaza entero al cambiar el CSV.
+IndiceStock = namedtuple("IndiceStock", ["version", "df", "orden", "vencimientos", "acumulado", "productos"])
+
+# Lotes de un producto ordenados por vencimiento: filas del DataFrame, vencimientos y
+# cantidades acumuladas (acumulado[i] = KG de los primeros i lotes)
+LotesProducto = namedtuple("LotesProducto", ["filas", "vencimientos", "acumulado"])
+
+# Resumen del inventario para un día: (por producto, próximos a vencer, por proveedor, detalle)
+ResumenStock = namedtuple("ResumenStock", ["por_producto", "proximos", "por_proveedor", "detalle"])
+
+
+def _dia(valor):
+    return np.datetime64(valor, "D")
+
+
+def _acumular(cantidades):
+    acumulado = np.zeros(len(cantidades) + 1)
+    np.cumsum(cantidades, out=acumulado[1:])
+    return acumulado
+
+
+def _indexar(version, df):
+    vencimientos = df["fecha_vencimiento"].to_numpy().astype("datetime64[D]")
+    cantidades = np.clip(df["cantidad (KG)"].to_numpy(dtype=np.float64), 0, None)
+    # Los lotes sin fecha de vencimiento no se pueden ordenar: quedan fuera del picking y las alertas
+    validos = np.flatnonzero(~np.isnat(vencimientos))
+    orden = validos[np.argsort(vencimientos[validos], kind="stable")]
+
+    productos = {}
+    nombres = df["nombre_item"].astype(str).to_numpy()[orden]
+    for nombre, posiciones in pd.Series(orden).groupby(nombres).indices.items():
+        filas = orden[posiciones]
+        productos[nombre.casefold()] = LotesProducto(filas, vencimientos[filas], _acumular(cantidades[filas]))
+    return IndiceStock(version, df, orden, vencimientos[orden], _acumular(cantidades[orden]), productos)
+
+
+def _lotes(df, filas, hoy):
+    lotes = df.iloc[filas][COLUMNAS_LOTE].copy()
+    lotes["dias_hasta_vencer"] = (lotes["fecha_vencimiento"].to_numpy().astype("datetime64[D]") - hoy).astype(int)
+    return lotes
+
+
+class MotorStock:
+    """Vencimientos y picking FEFO sobre el dataset de stock.
+
+    Por cada versión del CSV se arma una sola vez un índice de lotes ordenado por fecha
+    de vencimiento (global y por producto, con cantidades acumuladas). Con él, el picking
+    FEFO y las alertas de vencimiento son búsquedas binarias (np.searchsorted): O(log n)
+    más los lotes devueltos. El estado de vencimiento depende del día, así que el resumen
+    de la página de inventario se calcula (con pd.cut) una vez por día y versión.
+    """
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self._lock = threading.Lock()
+        self._indice = None
+        # (clave, ResumenStock) del último resumen calculado
+        self._resumen = (None, None)
+
+    def _actual(self):
+        """IndiceStock de la versión vigente del CSV (None si no hay stock)."""
+        df, generacion = self.datasets.obtener_versionado("stock")
+        if df is None:
+            return None
+        version = (generacion, len(df))
+        indice = self._indice
+        if indice is not None and indice.version == version:
+            return indice
+        with self._lock:
+            # Se relee con el lock tomado para no reemplazar el índice por uno de datos más viejos
+            df, generacion = self.datasets.obtener_versionado("stock")
+            if df is None:
+                return None
+            version = (generacion, len(df))
+            if self._indice is None or self._indice.version < version:
+                self._indice = _indexar(version, df)
+            return self._indice
+
+    def precargar(self):
+        """Arma el índice de lotes (lo usa la precarga del arranque)."""
+        self._actual()
+
+    # ====== CONSULTAS ======
+    def picking_fefo(self, producto, kg, hoy=None):
+        """Lotes de `producto` a usar para `kg`, del que vence primero al último (sin los vencidos).
+
+        Devuelve None si el producto no figura en el stock. El último lote puede usarse
+        en parte (columna usar_kg); si no alcanza, faltante_kg indica cuánto falta.
+        """
+        indice = self._actual()
+        lotes_producto = indice and indice.productos.get(producto.strip().casefold())
+        if not lotes_producto:
+            return None
+        hoy = _dia(hoy or date.today())
+        filas, vencimientos, acumulado = lotes_producto
+
+        # Primer lote sin vencer y primer lote con el que se completan los kg pedidos
+        inicio = int(np.searchsorted(vencimientos, hoy, side="left"))
+        base = acumulado[inicio]
+        fin = min(int(np.searchsorted(acumulado, base + kg, side="left")), len(filas))
+
+        lotes = _lotes(indice.df, filas[inicio:fin], hoy)
+        usar = np.diff(acumulado[inicio:fin + 1])
+        if fin > inicio:
+            usar[-1] -= max(acumulado[fin] - base - kg, 0)
+        lotes["usar_kg"] = usar
+        disponible = float(acumulado[-1] - base)
+        return {
+            "producto": str(indice.df["nombre_item"].iloc[filas[0]]),
+            "solicitado_kg": kg,
+            "disponible_kg": disponible,
+            "faltante_kg": max(kg - disponible, 0.0),
+            "lotes": lotes,
+        }
+
+    def por_vencer(self, dias, incluir_vencidos=False, limite=None, hoy=None):
+        """Lotes que vencen en los próximos `dias` días (y los vencidos, si se pide), por fecha.
+
+        total_lotes y total_kg cuentan todos los lotes del rango aunque se devuelvan `limite`.
+        """
+        indice = self._actual()
+        if indice is None:
+            return None
+        hoy = _dia(hoy or date.today())
+        limite_fecha = hoy + np.timedelta64(dias, "D")
+        desde = 0 if incluir_vencidos else int(np.searchsorted(indice.vencimientos, hoy, side="left"))
+        hasta = int(np.searchsorted(indice.vencimientos, limite_fecha, side="right"))
+        filas = indice.orden[desde:hasta if limite is None else min(hasta, desde + limite)]
+
+        lotes = _lotes(indice.df, filas, hoy)
+        lotes["estado_vencimiento"] = pd.cut(lotes["dias_hasta_vencer"], LIMITES_VENCIMIENTO, right=False,
+                                             labels=ESTADOS_VENCIMIENTO).astype(object)
+        return {
+            "hasta": str(limite_fecha),
+            "total_lotes": hasta - desde,
+            "total_kg": float(indice.acumulado[hasta] - indice.acumulado[desde]),
+            "lotes": lotes,
+        }
+
+    def resumen(self, hoy=None):
+        """ResumenStock del día (compartido entre requests: no modificar los DataFrames)."""
+        indice = self._actual()
+        if indice is None:
+            return None
+        proveedores, version_proveedores = self.datasets.obtener_versionado("proveedores")
+        hoy = hoy or date.today()
+        clave = (indice.version, version_proveedores, None if proveedores is None else len(proveedores), hoy)
+        clave_anterior, resumen = self._resumen
+        if clave_anterior == clave:
+            return resumen
+
+        df = indice.df.copy()
+        df["dias_hasta_vencer"] = (df["fecha_vencimiento"] - pd.Timestamp(hoy)).dt.days
+        df["estado_vencimiento"] = pd.cut(df["dias_hasta_vencer"], LIMITES_VENCIMIENTO, right=False,
+                                          labels=ESTADOS_VENCIMIENTO).astype(object)
+        # El índice está ordenado por vencimiento: los próximos a vencer son un prefijo
+        hasta = int(np.searchsorted(indice.vencimientos, _dia(hoy + timedelta(days=DIAS_PROXIMOS)), side="right"))
+        proximos = df.iloc[indice.orden[:hasta]]
+        por_producto = df.groupby("nombre_item", observed=True)["cantidad (KG)"].sum().reset_index()
+        por_proveedor = df.groupby("proveedor_id")["cantidad (KG)"].sum().reset_index()
+        if proveedores is not None:
+            por_proveedor = por_proveedor.merge(proveedores[["proveedor_id", "nombre"]], on="proveedor_id", how="left")
+
+        resumen = ResumenStock(por_producto, proximos, por_proveedor, df)
+        self._resumen = (clave, resumen)
+        return resumen
@@ -0,0 +1,173 @@
+import time
+from collections import namedtuple
+import numpy as np
+from arranque import importar_diferido
+from carga_imagen import ImagenInvalida
+
+cv2 = importar_diferido("cv2")
+
+# Resultado de procesar un flujo de frames: usuario confirmado (o None) y contadores
+# para medir cuánto trabajo se ahorró respecto de analizar cada frame por separado.
+ResultadoFlujo = namedtuple("ResultadoFlujo", ["username", "distancia", "frames", "detecciones", "encodings", "motivo"])
+
+
+# ====== LECTURA DEL FLUJO ======
+def partes_multipart(stream, boundary, max_bytes_parte=2 * 1024 * 1024, tamaño_lectura=64 * 1024):
+    """Genera el contenido de cada parte de un cuerpo multipart a medida que llega.
+
+    Sirve tanto para multipart/x-mixed-replace (MJPEG de una cámara) como para un
+    multipart/form-data enviado con Transfer-Encoding: chunked. Lanza ImagenInvalida
+    (413) si una parte supera `max_bytes_parte`.
+    """
+    delimitador = b"--" + boundary.encode("latin-1")
+    separador = b"\r\n" + delimitador
+    buffer = bytearray()
+    # Lo anterior a `desde` ya se revisó sin encontrar el delimitador: cada bloque nuevo
+    # se busca desde el final del anterior y no se vuelve a recorrer todo el buffer
+    desde = 0
+    dentro = False
+    fin_stream = False
+    while True:
+        if not dentro:
+            i = buffer.find(delimitador, desde)
+            if i >= 0:
+                del buffer[:i + len(delimitador)]
+                desde = 0
+                dentro = True
+                continue
+        else:
+            j = buffer.find(separador, desde)
+            if j > max_bytes_parte or (j < 0 and len(buffer) > max_bytes_parte):
+                raise ImagenInvalida("La imagen supera el tamaño máximo permitido", 413)
+            if j >= 0:
+                _, _, cuerpo = buffer[:j].partition(b"\r\n\r\n")
+                del buffer[:j + len(separador)]
+                desde = 0
+                if cuerpo:
+                    yield bytes(cuerpo)
+                if buffer.startswith(b"--"):
+                    return
+                continue
+        if fin_stream:
+            return
+        bloque = stream.read(tamaño_lectura)
+        if not bloque:
+            fin_stream = True
+        desde = max(len(buffer) - len(separador) + 1, 0)
+        buffer += bloque
+
+
+# ====== SEGUIMIENTO ENTRE DETECCIONES ======
+class SeguidorRostro:
+    """Sigue la caja del rostro entre detecciones con template matching (cv2.matchTemplate).
+
+    Trabaja sobre una copia en escala de grises reducida a `ancho` píxeles y busca la
+    plantilla solo en una ventana alrededor de la posición anterior, así cada frame
+    cuesta una fracción de una detección completa.
+    """
+
+    def __init__(self, ancho=320, margen=0.5, similitud_minima=0.6):
+        self.ancho = ancho
+        self.margen = margen
+        self.similitud_minima = similitud_minima
+        self._plantilla = None
+        self._caja = None
+        self._escala = 1.0
+
+    def _gris_reducido(self, frame_gris):
+        alto, ancho = frame_gris.shape[:2]
+        self._escala = min(1.0, self.ancho / ancho) if self.ancho else 1.0
+        if self._escala < 1.0:
+            return cv2.resize(frame_gris, None, fx=self._escala, fy=self._escala, interpolation=cv2.INTER_AREA)
+        return frame_gris
+
+    def reiniciar(self, frame_gris, caja):
+        """Toma como plantilla la zona de `caja` (top, right, bottom, left, en el frame completo)."""
+        reducido = self._gris_reducido(frame_gris)
+        top, right, bottom, left = (int(round(v * self._escala)) for v in caja)
+        if bottom - top < 8 or right - left < 8:
+            self._plantilla = None
+            return
+        self._plantilla = reducido[top:bottom, left:right].copy()
+        self._caja = (top, right, bottom, left)
+
+    def seguir(self, frame_gris):
+        """Nueva caja en coordenadas del frame completo, o None si se perdió el rostro."""
+        if self._plantilla is None:
+            return None
+        reducido = self._gris_reducido(frame_gris)
+        top, right, bottom, left = self._caja
+        alto, ancho = bottom - top, right - left
+        dy, dx = int(alto * self.margen), int(ancho * self.margen)
+        y0, x0 = max(0, top - dy), max(0, left - dx)
+        y1, x1 = min(reducido.shape[0], bottom + dy), min(reducido.shape[1], right + dx)
+        ventana = reducido[y0:y1, x0:x1]
+        if ventana.shape[0] < alto or ventana.shape[1] < ancho:
+            self._plantilla = None
+            return None
+
+        puntajes = cv2.matchTemplate(ventana, self._plantilla, cv2.TM_CCOEFF_NORMED)
+        _, maximo, _, (mx, my) = cv2.minMaxLoc(puntajes)
+        if maximo < self.similitud_minima:
+            self._plantilla = None
+            return None
+
+        top, left = y0 + my, x0 + mx
+        self._caja = (top, left + ancho, top + alto, left)
+        return tuple(int(round(v / self._escala)) for v in self._caja)
+
+
+# ====== RECONOCIMIENTO SOBRE EL FLUJO ======
+def reconocer_flujo(frames, analizar, buscar, umbral, detectar_cada=5, confirmaciones=3,
+                    max_frames=300, timeout=15.0, ancho_seguimiento=320):
+    """Identifica al usuario de un flujo de frames (bytes JPEG/PNG).
+
+    Detecta el rostro solo cada `detectar_cada` frames y en los intermedios sigue la
+    caja con SeguidorRostro; con la caja conocida solo se calcula el encoding. En
+    cuanto el mismo usuario coincide en `confirmaciones` frames seguidos se deja de
+    procesar. `analizar(imagen_bytes, caja)` devuelve (caja, encoding) y
+    `buscar(encoding)` un ResultadoBusqueda del índice de rostros.
+    """
+    seguidor = SeguidorRostro(ancho=ancho_seguimiento)
+    limite = time.monotonic() + timeout
+    frames_leidos = detecciones = encodings = 0
+    caja, desde_deteccion = None, 0
+    candidato, racha, distancia = None, 0, None
+
+    for imagen_bytes in frames:
+        frames_leidos += 1
+        gris = cv2.imdecode(np.frombuffer(imagen_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gris is None:
+            continue
+
+        # Entre detecciones la caja sale del seguimiento; si se pierde, se vuelve a detectar
+        caja = seguidor.seguir(gris) if caja is not None and desde_deteccion < detectar_cada else None
+        if caja is None:
+            detecciones += 1
+            desde_deteccion = 0
+        desde_deteccion += 1
+
+        caja, encoding = analizar(imagen_bytes, caja)
+        if encoding is None:
+            candidato, racha = None, 0
+        else:
+            encodings += 1
+            seguidor.reiniciar(gris, caja)
+            resultado = buscar(encoding)
+            if resultado.username is not None and resultado.distancia <= umbral:
+                if resultado.username == candidato:
+                    racha += 1
+                else:
+                    candidato, racha = resultado.username, 1
+                distancia = resultado.distancia
+                if racha >= confirmaciones:
+                    return ResultadoFlujo(candidato, distancia, frames_leidos, detecciones, encodings, "confirmado")
+            else:
+                candidato, racha = None, 0
+
+        if frames_leidos >= max_frames:
+            return ResultadoFlujo(None, None, frames_leidos, detecciones, encodings, "max_frames")
+        if time.monotonic() > limite:
+            return ResultadoFlujo(None, None, frames_leidos, detecciones, encodings, "timeout")
+
+    return ResultadoFlujo(None, None, frames_leidos, detecciones, encodings, "fin_flujo")
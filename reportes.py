@@ -0,0 +1,172 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from arranque import importar_diferido
+
+pd = importar_diferido("pandas")
+
+try:
+    pa = importar_diferido("pyarrow")
+except ImportError:  # opcional: solo hace falta para exportar en Parquet
+    pa = None
+
+# Filas que se leen de la DB (y se escriben en la respuesta) por vez durante una exportación
+FILAS_POR_BLOQUE = 5000
+
+# Columnas de cada exportación con su tipo (para el esquema Parquet)
+COLUMNAS_EXPORTACION = {
+    "registros": [("id", "int64"), ("id_empleado", "int64"), ("username", "string"), ("area", "string"),
+                  ("ingreso_ts", "timestamp"), ("egreso_ts", "timestamp"), ("horas_trabajadas", "float64")],
+    "diario": [("username", "string"), ("dia", "date"), ("id_empleado", "int64"), ("minutos", "float64"),
+               ("sesiones", "int64"), ("primer_ingreso", "timestamp"), ("ultimo_egreso", "timestamp"),
+               ("sesion_abierta", "bool")],
+}
+
+# Horas entre ingreso y egreso calculadas en SQLite (julianday está en días)
+_HORAS_SQL = "(julianday(egreso_ts) - julianday(ingreso_ts)) * 24"
+
+
+def _filtros(desde, hasta, username):
+    # El rango se aplica sobre ingreso_ts (indexado): [desde 00:00, hasta + 1 día 00:00)
+    condiciones = ["ingreso_ts IS NOT NULL", "egreso_ts IS NOT NULL"]
+    parametros = []
+    if desde is not None:
+        condiciones.append("ingreso_ts >= ?")
+        parametros.append(datetime.combine(desde, datetime.min.time()).isoformat(timespec="seconds"))
+    if hasta is not None:
+        condiciones.append("ingreso_ts < ?")
+        parametros.append(datetime.combine(hasta + timedelta(days=1), datetime.min.time()).isoformat(timespec="seconds"))
+    if username:
+        condiciones.append("username = ?")
+        parametros.append(username)
+    return " AND ".join(condiciones), parametros
+
+
+def horas_por_empleado(conn, desde=None, hasta=None, username=None):
+    """Horas trabajadas por empleado en el período, a partir de resumen_diario (una fila por empleado y día)."""
+    condiciones, parametros = [], []
+    if desde is not None:
+        condiciones.append("dia >= ?")
+        parametros.append(desde.isoformat())
+    if hasta is not None:
+        condiciones.append("dia <= ?")
+        parametros.append(hasta.isoformat())
+    if username:
+        condiciones.append("username = ?")
+        parametros.append(username)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return pd.read_sql_query(f"""
+        SELECT MAX(id_empleado) AS id_empleado, username, SUM(minutos) / 60.0 AS horas_trabajadas
+        FROM resumen_diario
+        {where}
+        GROUP BY username
+        HAVING SUM(sesiones) > 0
+        ORDER BY username
+    """, conn, params=parametros)
+
+
+def _iterar(conn, sql, parametros, tamaño_bloque):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, parametros)
+        while True:
+            filas = cursor.fetchmany(tamaño_bloque)
+            if not filas:
+                break
+            yield filas
+    finally:
+        cursor.close()
+
+
+def iterar_registros(conn, desde=None, hasta=None, username=None, tamaño_bloque=FILAS_POR_BLOQUE):
+    """Genera los registros del período en bloques de `tamaño_bloque` filas (sin cargarlos todos)."""
+    where, parametros = _filtros(desde, hasta, username)
+    return _iterar(conn, f"""
+        SELECT id, id_empleado, username, area, ingreso_ts, egreso_ts, ROUND({_HORAS_SQL}, 4)
+        FROM registros
+        WHERE {where}
+        ORDER BY ingreso_ts
+    """, parametros, tamaño_bloque)
+
+
+def iterar_resumen_diario(conn, desde=None, hasta=None, username=None, tamaño_bloque=FILAS_POR_BLOQUE):
+    """Igual que iterar_registros, pero con las filas ya agregadas por empleado y día."""
+    condiciones, parametros = ["dia >= ?", "dia <= ?"], [desde.isoformat(), hasta.isoformat()]
+    if username:
+        condiciones.append("username = ?")
+        parametros.append(username)
+    return _iterar(conn, f"""
+        SELECT username, dia, id_empleado, ROUND(minutos, 2), sesiones, primer_ingreso, ultimo_egreso, sesion_abierta
+        FROM resumen_diario
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY dia, username
+    """, parametros, tamaño_bloque)
+
+
+# ====== FORMATOS DE EXPORTACIÓN ======
+def exportar_csv(bloques, tipo="registros"):
+    """Convierte los bloques de filas en fragmentos de texto CSV (el primero lleva el encabezado)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([columna for columna, _ in COLUMNAS_EXPORTACION[tipo]])
+    for filas in bloques:
+        writer.writerows(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _SalidaParcial(io.RawIOBase):
+    # Archivo de solo escritura que se vacía después de cada row group, para poder
+    # mandar el Parquet en partes sin armarlo completo en memoria
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def parquet_disponible():
+    return pa is not None
+
+
+def _tipo_arrow(tipo):
+    return {"int64": pa.int64(), "string": pa.string(), "float64": pa.float64(), "bool": pa.bool_(),
+            "timestamp": pa.timestamp("s"), "date": pa.date32()}[tipo]
+
+
+def exportar_parquet(bloques, tipo="registros"):
+    """Escribe cada bloque como un row group Parquet y va devolviendo los bytes generados."""
+    import pyarrow.parquet as pq
+    esquema = pa.schema([(columna, _tipo_arrow(t)) for columna, t in COLUMNAS_EXPORTACION[tipo]])
+    salida = _SalidaParcial()
+    with pq.ParquetWriter(salida, esquema) as writer:
+        for filas in bloques:
+            columnas = list(zip(*filas))
+            arrays = [
+                # Fechas (texto ISO) y booleanos (0/1) llegan de SQLite con otro tipo: se convierten con cast
+                pa.array(valores, type=pa.string()).cast(campo.type)
+                if pa.types.is_timestamp(campo.type) or pa.types.is_date(campo.type)
+                else pa.array(valores, type=pa.int64()).cast(campo.type) if pa.types.is_boolean(campo.type)
+                else pa.array(valores, type=campo.type)
+                for valores, campo in zip(columnas, esquema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+# Resumen materializado de asistencia: una fila por empleado y día (el día del ingreso,
+# así un turno que cruza la medianoche cuenta entero para el día en que empezó).
+# Los minutos suman solo sesiones cerradas.
+
+_MINUTOS_SQL = "(julianday(egreso_ts) - julianday(ingreso_ts)) * 1440"
+
+_COLUMNAS_AGREGADAS = f"""
+    MAX(id_empleado),
+    COALESCE(SUM(CASE WHEN egreso_ts IS NOT NULL THEN {_MINUTOS_SQL} END), 0),
+    COUNT(egreso_ts),
+    MIN(ingreso_ts),
+    MAX(egreso_ts),
+    MAX(egreso_ts IS NULL)
+"""
+
+_UPSERT = """
+    ON CONFLICT(username, dia) DO UPDATE SET
+        id_empleado = excluded.id_empleado,
+        minutos = excluded.minutos,
+        sesiones = excluded.sesiones,
+        primer_ingreso = excluded.primer_ingreso,
+        ultimo_egreso = excluded.ultimo_egreso,
+        sesion_abierta = excluded.sesion_abierta
+"""
+
+
+def crear_tabla(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS resumen_diario (
+        username TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        id_empleado INTEGER,
+        minutos REAL NOT NULL DEFAULT 0,
+        sesiones INTEGER NOT NULL DEFAULT 0,
+        primer_ingreso TEXT,
+        ultimo_egreso TEXT,
+        sesion_abierta INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (username, dia)
+    )
+    """)
+    # Los reportes filtran por rango de días (y opcionalmente por empleado)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_resumen_diario_dia ON resumen_diario (dia)")
+    # Para recalcular un (empleado, día) leyendo solo sus registros
+    c.execute("CREATE INDEX IF NOT EXISTS idx_registros_username_ingreso ON registros (username, ingreso_ts)")
+
+
+def actualizar_dia(c, username, ingreso_ts):
+    """Recalcula la fila del empleado para el día de `ingreso_ts` (en la transacción de `c`)."""
+    dia = ingreso_ts[:10]
+    siguiente = (datetime.strptime(dia, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    c.execute(f"""
+        INSERT INTO resumen_diario
+            (username, dia, id_empleado, minutos, sesiones, primer_ingreso, ultimo_egreso, sesion_abierta)
+        SELECT username, ?, {_COLUMNAS_AGREGADAS}
+        FROM registros
+        WHERE username = ? AND ingreso_ts >= ? AND ingreso_ts < ?
+        GROUP BY username
+        {_UPSERT}
+    """, (dia, username, dia, siguiente))
+
+
+def reconstruir(c, desde=None):
+    """Regenera el resumen a partir de registros (todo, o desde el día `desde` AAAA-MM-DD)."""
+    if desde is None:
+        c.execute("DELETE FROM resumen_diario")
+        filtro, parametros = "", ()
+    else:
+        c.execute("DELETE FROM resumen_diario WHERE dia >= ?", (desde,))
+        filtro, parametros = "AND ingreso_ts >= ?", (desde,)
+    c.execute(f"""
+        INSERT INTO resumen_diario
+            (username, dia, id_empleado, minutos, sesiones, primer_ingreso, ultimo_egreso, sesion_abierta)
+        SELECT username, substr(ingreso_ts, 1, 10), {_COLUMNAS_AGREGADAS}
+        FROM registros
+        WHERE ingreso_ts IS NOT NULL {filtro}
+        GROUP BY username, substr(ingreso_ts, 1, 10)
+    """, parametros)
+    return c.execute("SELECT COUNT(*) FROM resumen_diario").fetchone()[0]
@@ -0,0 +1,72 @@
+import json
+import sqlite3
+import struct
+import numpy as np
+
+# Formato binario de usuarios.encoding:
+#   cabecera de 8 bytes = magic "FE" | versión (uint8) | dtype ('f' = float32) | dimensión (uint16) | 2 bytes de relleno
+#   seguida de los valores float32 little-endian.
+# El relleno deja los datos alineados a 8 bytes para leerlos sin copia con np.frombuffer.
+MAGIC = b"FE"
+VERSION_FORMATO = 1
+_CABECERA = struct.Struct("<2sBcH2x")
+_DTYPES = {b"f": np.dtype("<f4")}
+
+
+def encoding_a_blob(encoding):
+    """Serializa un encoding facial a bytes (cabecera + float32)."""
+    datos = np.ascontiguousarray(encoding, dtype="<f4")
+    return _CABECERA.pack(MAGIC, VERSION_FORMATO, b"f", datos.shape[0]) + datos.tobytes()
+
+
+def blob_a_encoding(valor):
+    """Decodifica un encoding guardado en la DB.
+
+    Acepta el formato binario (sin copia, vía np.frombuffer) y también el JSON
+    de texto que se guardaba antes, para no romper bases sin migrar.
+    """
+    if isinstance(valor, str):
+        return np.asarray(json.loads(valor), dtype=np.float32)
+
+    magic, version, dtype, dimension = _CABECERA.unpack_from(valor)
+    if magic != MAGIC or version != VERSION_FORMATO or dtype not in _DTYPES:
+        raise ValueError(f"Formato de encoding desconocido (magic={magic!r}, versión={version})")
+    return np.frombuffer(valor, dtype=_DTYPES[dtype], count=dimension, offset=_CABECERA.size)
+
+
+def _convertir_tabla(c, tabla):
+    c.execute(f"SELECT id, encoding FROM {tabla} WHERE typeof(encoding) = 'text'")
+    filas = [(encoding_a_blob(blob_a_encoding(encoding)), fila_id) for fila_id, encoding in c.fetchall()]
+    c.executemany(f"UPDATE {tabla} SET encoding=? WHERE id=?", filas)
+    return len(filas)
+
+
+def migrar_encodings(db_path):
+    """Convierte todos los encodings JSON de usuarios y de galeria_rostros al formato binario.
+
+    La galería se inició copiando usuarios.encoding (migración 7), así que en una base
+    sin migrar también tiene JSON. Las dos tablas se convierten en la misma transacción.
+    Devuelve (usuarios convertidos, galería convertidos, tamaño de la DB antes, tamaño después).
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    tamanio_antes = _tamanio_db(c)
+
+    with conn:
+        usuarios = _convertir_tabla(c, "usuarios")
+        hay_galeria = c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'galeria_rostros'").fetchone()
+        galeria = _convertir_tabla(c, "galeria_rostros") if hay_galeria else 0
+
+    # Recompactar el archivo para liberar el espacio que ocupaba el texto
+    if usuarios or galeria:
+        c.execute("VACUUM")
+    tamanio_despues = _tamanio_db(c)
+    conn.close()
+    return usuarios, galeria, tamanio_antes, tamanio_despues
+
+
+def _tamanio_db(cursor):
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
@@ -0,0 +1,229 @@
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from arranque import importar_diferido
+from calidad_rostro import CalidadInsuficiente, evaluar_calidad
+
+cv2 = importar_diferido("cv2")
+
+
+class ColaLlena(Exception):
+    """No hay lugar en la cola de encoding: el cliente debe reintentar más tarde."""
+
+
+class WorkerCaido(ColaLlena):
+    """Un worker del pool murió con el trabajo en curso; el pool ya se recreó y se puede reintentar."""
+
+
+# Con reducción, libjpeg decodifica directamente a 1/2, 1/4 u 1/8 del tamaño (más rápido y menos memoria).
+# Son nombres de constantes de cv2, que recién se importa con la primera imagen
+_FLAGS_REDUCCION = {
+    1: "IMREAD_COLOR",
+    2: "IMREAD_REDUCED_COLOR_2",
+    4: "IMREAD_REDUCED_COLOR_4",
+    8: "IMREAD_REDUCED_COLOR_8",
+}
+
+
+# ====== CÓDIGO QUE CORRE DENTRO DE LOS WORKERS ======
+def inicializar_worker():
+    # face_recognition carga los modelos de dlib al importarse: se hace una sola vez por proceso
+    import cv2  # noqa: F401
+    import face_recognition  # noqa: F401
+
+
+@contextmanager
+def _etapa(tiempos, nombre):
+    # Segundos de cada etapa del worker; vuelven al proceso web junto con el resultado
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if tiempos is not None:
+            tiempos[nombre] = time.perf_counter() - inicio
+
+
+def decodificar_imagen(imagen_bytes, reduccion=1):
+    """cv2.imdecode directo sobre los bytes (sin copias intermedias)."""
+    flag = getattr(cv2, _FLAGS_REDUCCION.get(reduccion, "IMREAD_COLOR"))
+    return cv2.imdecode(np.frombuffer(imagen_bytes, np.uint8), flag)
+
+
+def codificar_imagen(imagen_bytes, perfil, tiempos=None):
+    """Decodifica la imagen y devuelve el encoding float32 del rostro más grande (o None).
+
+    Si se pasa `tiempos` (dict), se cargan los segundos de imdecode, deteccion, calidad y
+    encoding. Lanza CalidadInsuficiente si el rostro no pasa los umbrales del perfil.
+    """
+    from deteccion import localizar_rostro, codificar_en_caja
+
+    reduccion = perfil.get("reduccion", 1)
+    with _etapa(tiempos, "imdecode"):
+        frame = decodificar_imagen(imagen_bytes, reduccion)
+    if frame is None:
+        return None
+    with _etapa(tiempos, "deteccion"):
+        caja = localizar_rostro(frame, perfil["ancho_deteccion"], perfil["modelo"], perfil["upsample"])
+    if caja is None:
+        return None
+    # Los frames que no podrían coincidir se descartan antes de la red de encoding
+    with _etapa(tiempos, "calidad"):
+        evaluar_calidad(frame, caja, perfil, reduccion)
+    with _etapa(tiempos, "encoding"):
+        return codificar_en_caja(frame, caja, perfil["jitters"]).astype(np.float32)
+
+
+def analizar_imagen(imagen_bytes, perfil, caja=None, tiempos=None):
+    """(caja, encoding) del rostro más grande; si se pasa `caja` no se vuelve a detectar.
+
+    Devuelve (None, None) si la imagen no se puede leer o no tiene rostros y lanza
+    CalidadInsuficiente si el rostro no pasa los umbrales del perfil.
+    """
+    from deteccion import localizar_rostro, codificar_en_caja
+
+    reduccion = perfil.get("reduccion", 1)
+    with _etapa(tiempos, "imdecode"):
+        frame = decodificar_imagen(imagen_bytes, reduccion)
+    if frame is None:
+        return None, None
+    # La caja se recibe y se devuelve en coordenadas de la imagen original
+    if caja is None:
+        with _etapa(tiempos, "deteccion"):
+            caja = localizar_rostro(frame, perfil["ancho_deteccion"], perfil["modelo"], perfil["upsample"])
+        if caja is None:
+            return None, None
+    else:
+        caja = tuple(v // reduccion for v in caja)
+    with _etapa(tiempos, "calidad"):
+        evaluar_calidad(frame, caja, perfil, reduccion)
+    with _etapa(tiempos, "encoding"):
+        encoding = codificar_en_caja(frame, caja, perfil["jitters"]).astype(np.float32)
+    return tuple(v * reduccion for v in caja), encoding
+
+
+def _medido(funcion, *args):
+    # Corre en el worker: devuelve el resultado junto con los tiempos de cada etapa (también
+    # cuando el rostro se rechaza por calidad, para medir cuánto se ahorró)
+    tiempos = {}
+    try:
+        return funcion(*args, tiempos=tiempos), tiempos, None
+    except CalidadInsuficiente as rechazo:
+        return None, tiempos, rechazo
+
+
+# ====== SERVICIO USADO DESDE FLASK ======
+class ServicioEncoding:
+    """Pool de procesos para el encoding facial, fuera del hilo del request.
+
+    La cola es acotada: si ya hay `max_pendientes` trabajos en curso se lanza
+    ColaLlena en lugar de encolar (backpressure). Con `procesos=0` el encoding
+    se hace en el mismo proceso (útil para desarrollo). `al_medir(tiempos)` recibe
+    los segundos de cada etapa de cada trabajo terminado.
+    """
+
+    def __init__(self, procesos, max_pendientes, timeout, al_medir=None):
+        self.procesos = procesos
+        self.timeout = timeout
+        self.al_medir = al_medir
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _obtener_executor(self):
+        # Se crea recién en el primer uso, después del fork de gunicorn (--preload).
+        # Con "spawn" los workers no heredan hilos, locks ni conexiones SQLite del proceso web.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=inicializar_worker,
+                )
+            return self._executor
+
+    def _reiniciar_executor(self, roto):
+        with self._lock:
+            if self._executor is roto:
+                self._executor = None
+        roto.shutdown(wait=False, cancel_futures=True)
+
+    def precalentar(self):
+        """Levanta los workers y carga los modelos (con procesos=0, en este proceso)."""
+        if not self.procesos:
+            inicializar_worker()
+            return
+        executor = self._obtener_executor()
+        # Con "spawn" el pool levanta un worker por trabajo mientras no haya uno libre
+        for futuro in [executor.submit(os.getpid) for _ in range(self.procesos)]:
+            futuro.result(timeout=self.timeout)
+
+    def codificar(self, imagen_bytes, perfil, tiempos=None):
+        """Encola la imagen y espera su encoding como máximo `timeout` segundos.
+
+        Lanza ColaLlena si la cola está completa (WorkerCaido si murió el worker que lo
+        procesaba), TimeoutError si el trabajo no terminó a tiempo y CalidadInsuficiente si
+        el rostro no pasa el control de calidad del perfil.
+        Si se pasa `tiempos` (dict), se completa con los segundos de cada etapa.
+        """
+        return self._ejecutar(tiempos, codificar_imagen, imagen_bytes, perfil)
+
+    def analizar(self, imagen_bytes, perfil, caja=None, tiempos=None):
+        """Como codificar, pero devuelve (caja, encoding) y permite saltear la detección."""
+        return self._ejecutar(tiempos, analizar_imagen, imagen_bytes, perfil, caja)
+
+    def _ejecutar(self, tiempos, funcion, *args):
+        resultado, tiempos_worker, rechazo = self._enviar(_medido, funcion, *args)
+        if tiempos is not None:
+            tiempos.update(tiempos_worker)
+        if self.al_medir is not None:
+            self.al_medir(tiempos_worker)
+        if rechazo is not None:
+            raise rechazo
+        return resultado
+
+    def _enviar(self, funcion, *args):
+        if not self.procesos:
+            return funcion(*args)
+
+        if not self._cupos.acquire(blocking=False):
+            raise ColaLlena()
+        try:
+            executor = self._obtener_executor()
+            try:
+                futuro = executor.submit(funcion, *args)
+            except BrokenProcessPool:
+                # Un worker murió (p. ej. sin memoria): se recrea el pool y se reintenta una vez
+                self._reiniciar_executor(executor)
+                executor = self._obtener_executor()
+                futuro = executor.submit(funcion, *args)
+        except BrokenProcessPool as e:
+            self._cupos.release()
+            self._reiniciar_executor(executor)
+            raise WorkerCaido() from e
+        except Exception:
+            self._cupos.release()
+            raise
+        # El cupo se libera cuando el worker termina, aunque el request ya haya expirado
+        futuro.add_done_callback(lambda _: self._cupos.release())
+
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise
+        except BrokenProcessPool as e:
+            # El worker murió mientras se esperaba el resultado: el pool roto no se deja para el
+            # próximo request y el cliente recibe el mismo 503 con Retry-After que con la cola llena
+            self._reiniciar_executor(executor)
+            raise WorkerCaido() from e
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import galeria_rostros
+from serializacion import blob_a_encoding
+
+try:
+    import fcntl
+except ImportError:  # Windows: las exportaciones se serializan solo dentro del proceso
+    fcntl = None
+
+# Snapshot en disco de todos los encodings enrolados, para que cada worker de gunicorn los
+# mapee en memoria (np.load con mmap_mode="r") en lugar de armar su propia copia desde la DB:
+# las páginas del archivo se comparten entre procesos a través del page cache.
+#
+#   manifiesto.json             -> snapshot vigente (se reemplaza con os.replace, atómico)
+#   <id>.encodings.npy          -> matriz N x 128 float32
+#   <id>.normas.npy             -> ||e||² de cada fila (N float32)
+#   <id>.usernames.json         -> tabla fila -> username
+#   <id>.galeria.npy            -> galerías de todos los usuarios, una tras otra (M x 128 float32)
+#   <id>.galeria_inicio.npy     -> fila de la galería donde empieza cada usuario (N + 1 int64)
+#
+# Cada snapshot tiene archivos propios: un worker que todavía tiene mapeado el anterior
+# sigue leyéndolo sin problemas hasta que adjunta el nuevo.
+
+MANIFIESTO = "manifiesto.json"
+ARCHIVO_BLOQUEO = ".exportacion.lock"
+VERSION_FORMATO = 2
+DIMENSION_ENCODING = 128
+# Snapshots anteriores que se conservan (además del vigente) antes de borrarlos
+SNAPSHOTS_A_CONSERVAR = 2
+
+_lock_exportacion = threading.Lock()
+
+
+def leer_manifiesto(directorio):
+    """Manifiesto del snapshot vigente, o None si todavía no se exportó ninguno."""
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifiesto if manifiesto.get("formato") == VERSION_FORMATO else None
+
+
+@contextmanager
+def bloqueo(directorio):
+    """Serializa las exportaciones entre hilos del proceso y entre workers (flock en el directorio)."""
+    os.makedirs(directorio, exist_ok=True)
+    with _lock_exportacion, open(os.path.join(directorio, ARCHIVO_BLOQUEO), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _guardar_atomico(ruta, escribir, modo="wb"):
+    # Temporal con nombre único: dos escrituras del mismo archivo no se pisan el temporal
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix=os.path.basename(ruta) + ".",
+                                            suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, modo, **({} if "b" in modo else {"encoding": "utf-8"})) as f:
+            escribir(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def exportar(conn, directorio, version_usuarios):
+    """Escribe un snapshot nuevo con los encodings de usuarios y lo publica en el manifiesto.
+
+    `version_usuarios` es el contador de cambios de la tabla usuarios al momento de leerla;
+    los workers lo comparan con el de la DB para saber si el snapshot quedó viejo.
+    Quien exporta debe tener tomado `bloqueo(directorio)`.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    filas = conn.execute(
+        "SELECT username, encoding FROM usuarios WHERE encoding IS NOT NULL ORDER BY id").fetchall()
+    filas = [(username, encoding) for username, encoding in filas if encoding]
+    usernames = [username for username, _ in filas]
+    matriz = np.empty((len(filas), DIMENSION_ENCODING), dtype=np.float32)
+    for i, (_, encoding) in enumerate(filas):
+        matriz[i] = blob_a_encoding(encoding)
+    normas = np.einsum("ij,ij->i", matriz, matriz).astype(np.float32)
+
+    galerias = galeria_rostros.leer_galerias(conn)
+    cantidades = [len(galerias.get(username, ())) for username in usernames]
+    galeria_inicio = np.zeros(len(usernames) + 1, dtype=np.int64)
+    np.cumsum(cantidades, out=galeria_inicio[1:])
+    galeria = np.empty((int(galeria_inicio[-1]), DIMENSION_ENCODING), dtype=np.float32)
+    for i, username in enumerate(usernames):
+        if cantidades[i]:
+            galeria[galeria_inicio[i]:galeria_inicio[i + 1]] = galerias[username]
+
+    id_snapshot = f"{datetime.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    archivos = {
+        "encodings": f"{id_snapshot}.encodings.npy",
+        "normas": f"{id_snapshot}.normas.npy",
+        "usernames": f"{id_snapshot}.usernames.json",
+        "galeria": f"{id_snapshot}.galeria.npy",
+        "galeria_inicio": f"{id_snapshot}.galeria_inicio.npy",
+    }
+    _guardar_atomico(os.path.join(directorio, archivos["encodings"]), lambda f: np.save(f, matriz))
+    _guardar_atomico(os.path.join(directorio, archivos["normas"]), lambda f: np.save(f, normas))
+    _guardar_atomico(os.path.join(directorio, archivos["galeria"]), lambda f: np.save(f, galeria))
+    _guardar_atomico(os.path.join(directorio, archivos["galeria_inicio"]), lambda f: np.save(f, galeria_inicio))
+    _guardar_atomico(os.path.join(directorio, archivos["usernames"]),
+                     lambda f: json.dump(usernames, f, ensure_ascii=False), modo="w")
+
+    manifiesto = {
+        "formato": VERSION_FORMATO,
+        "id": id_snapshot,
+        "version_usuarios": version_usuarios,
+        "usuarios": len(usernames),
+        "encodings_galeria": len(galeria),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "archivos": archivos,
+    }
+    # Recién cuando todos los archivos están completos se publica el manifiesto
+    _guardar_atomico(os.path.join(directorio, MANIFIESTO),
+                     lambda f: json.dump(manifiesto, f, ensure_ascii=False, indent=2), modo="w")
+    _limpiar(directorio, id_snapshot)
+    return manifiesto
+
+
+def _limpiar(directorio, vigente):
+    # Solo se borran snapshots anteriores al vigente: uno posterior puede estar escribiéndose
+    ids = sorted({nombre.split(".", 1)[0] for nombre in os.listdir(directorio)
+                  if nombre.endswith((".npy", ".json")) and nombre != MANIFIESTO})
+    viejos = [i for i in ids if i < vigente][:-SNAPSHOTS_A_CONSERVAR or None]
+    for nombre in os.listdir(directorio):
+        if nombre.split(".", 1)[0] in viejos:
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except FileNotFoundError:
+                pass
+
+
+def _mapear(directorio, archivo, forma_vacia, dtype):
+    # Un archivo sin filas no se puede mapear
+    if forma_vacia[0] == 0:
+        return np.empty(forma_vacia, dtype=dtype)
+    return np.load(os.path.join(directorio, archivo), mmap_mode="r")
+
+
+def abrir(directorio, manifiesto):
+    """(matriz, normas, usernames, galerías) del snapshot, con las matrices mapeadas en solo lectura.
+
+    Las galerías son {username: vista (m x 128) de la matriz de galerías}, sin copias.
+    """
+    archivos = manifiesto["archivos"]
+    n, m = manifiesto["usuarios"], manifiesto["encodings_galeria"]
+    matriz = _mapear(directorio, archivos["encodings"], (n, DIMENSION_ENCODING), np.float32)
+    normas = _mapear(directorio, archivos["normas"], (n,), np.float32)
+    galeria = _mapear(directorio, archivos["galeria"], (m, DIMENSION_ENCODING), np.float32)
+    inicio = np.load(os.path.join(directorio, archivos["galeria_inicio"]))
+    with open(os.path.join(directorio, archivos["usernames"]), encoding="utf-8") as f:
+        usernames = json.load(f)
+    galerias = {username: galeria[inicio[i]:inicio[i + 1]]
+                for i, username in enumerate(usernames) if inicio[i + 1] > inicio[i]}
+    return matriz, normas, usernames, galerias
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de la app viven en la raíz del proyecto (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """Conexión a una DB nueva en tmp_path con el esquema y todas las migraciones aplicadas."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "usuarios.db"))
+    db._local.conn = None
+    db.init_db()
+    yield db.get_conn()
+    db.get_conn().close()
+    db._local.conn = None
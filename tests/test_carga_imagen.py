@@ -0,0 +1,48 @@
+import struct
+
+import pytest
+
+from carga_imagen import ImagenInvalida, dimensiones_imagen, validar_imagen
+
+
+def png(ancho, alto):
+    ihdr = struct.pack(">II", ancho, alto) + bytes([8, 2, 0, 0, 0])
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + bytes(4)
+
+
+def jpeg(ancho, alto):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, alto, ancho, 1) + bytes(3)
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+@pytest.mark.parametrize("generar", [png, jpeg])
+def test_dimensiones_desde_la_cabecera(generar):
+    assert dimensiones_imagen(generar(640, 480)) == (640, 480)
+
+
+@pytest.mark.parametrize("generar", [png, jpeg])
+def test_dentro_del_limite(generar):
+    datos = generar(4096, 100)
+    assert validar_imagen(datos, max_bytes=1024, max_lado=4096) is datos
+
+
+@pytest.mark.parametrize("generar", [png, jpeg])
+@pytest.mark.parametrize("ancho, alto", [(4097, 100), (100, 50000), (0, 100)])
+def test_dimensiones_fuera_de_limite(generar, ancho, alto):
+    with pytest.raises(ImagenInvalida) as error:
+        validar_imagen(generar(ancho, alto), max_bytes=1024, max_lado=4096)
+    assert error.value.status == 400
+
+
+def test_demasiados_bytes():
+    with pytest.raises(ImagenInvalida) as error:
+        validar_imagen(png(10, 10), max_bytes=16, max_lado=4096)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize("datos", [b"GIF89a" + bytes(20), b"\xff\xd8" + bytes(20), b"\x89PNG\r\n\x1a\n"])
+def test_formato_no_soportado(datos):
+    with pytest.raises(ImagenInvalida) as error:
+        validar_imagen(datos, max_bytes=1024, max_lado=4096)
+    assert error.value.status == 415
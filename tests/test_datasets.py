@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from datasets import Dataset, RegistroDatasets
+
+ENCABEZADO = "fecha,turno,valor\n"
+
+
+def fila(i, valor=None):
+    return f"{i + 1:02d}/01/2026,{'AB'[i % 2]},{i if valor is None else valor}\n"
+
+
+@pytest.fixture
+def registro(tmp_path):
+    (tmp_path / "datos.csv").write_text(ENCABEZADO + "".join(fila(i) for i in range(20)))
+    spec = Dataset("datos.csv", fechas={"fecha": "%d/%m/%Y"}, categorias=("turno",), float32=("valor",))
+    return RegistroDatasets(str(tmp_path), {"datos": spec})
+
+
+def escribir(registro, contenido, modo="a"):
+    ruta = registro.ruta("datos")
+    with open(ruta, modo) as f:
+        f.write(contenido)
+    # Fuerza un mtime distinto aunque el sistema de archivos tenga poca resolución
+    st = os.stat(ruta)
+    os.utime(ruta, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_agregado_al_final_es_incremental(registro):
+    df, generacion = registro.obtener_versionado("datos")
+    escribir(registro, fila(20) + fila(21))
+
+    nuevo, nueva_generacion = registro.obtener_versionado("datos")
+    assert nueva_generacion == generacion
+    assert len(nuevo) == 22
+    assert registro.tiempos()["datos"]["filas_agregadas"] == 2
+    assert str(nuevo["turno"].dtype) == "category"
+    assert str(nuevo["valor"].dtype) == "float32"
+    assert nuevo["fecha"].iloc[-1].day == 22
+
+
+def test_edicion_mas_agregado_relee_todo(registro):
+    _, generacion = registro.obtener_versionado("datos")
+    # Edición del mismo largo: el prefijo ya leído termina igual en "\n" pero cambió
+    filas = [fila(i) for i in range(20)]
+    filas[3] = fila(3, valor=9)
+    escribir(registro, ENCABEZADO + "".join(filas) + fila(20), modo="w")
+
+    df, nueva_generacion = registro.obtener_versionado("datos")
+    assert nueva_generacion != generacion
+    assert registro.tiempos()["datos"]["filas_agregadas"] is None
+    assert len(df) == 21
+    assert df["valor"].iloc[3] == 9
+
+    # La relectura completa vuelve a habilitar los agregados incrementales
+    escribir(registro, fila(21))
+    df, generacion_agregado = registro.obtener_versionado("datos")
+    assert generacion_agregado == nueva_generacion
+    assert len(df) == 22
+    assert df["valor"].iloc[3] == 9
+
+
+def test_ultima_fila_incompleta_relee_todo(registro):
+    escribir(registro, "21/01/2026,A,")
+    _, generacion = registro.obtener_versionado("datos")
+    escribir(registro, "20\n")
+
+    df, nueva_generacion = registro.obtener_versionado("datos")
+    assert nueva_generacion != generacion
+    assert len(df) == 21
+    assert df["valor"].iloc[-1] == 20
+
+
+def test_archivo_inexistente(tmp_path):
+    registro = RegistroDatasets(str(tmp_path), {"datos": Dataset("datos.csv")})
+    assert registro.obtener("datos") is None
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from indice_rostros import BackendExacto, BackendLSH, IndiceRostros
+from serializacion import encoding_a_blob
+
+
+@pytest.fixture
+def encodings(conn):
+    """Usuarios con encodings aleatorios guardados en la DB de prueba."""
+    rng = np.random.default_rng(1)
+    matriz = rng.standard_normal((200, 128)).astype(np.float32) * 0.1
+    conn.executemany("INSERT INTO usuarios (username, password, email, encoding) VALUES (?, '', '', ?)",
+                     [(f"u{i}", encoding_a_blob(e)) for i, e in enumerate(matriz)])
+    conn.commit()
+    return matriz
+
+
+def cargar(backend):
+    indice = IndiceRostros(backend=backend)
+    indice.cargar()
+    return indice
+
+
+def test_exacto_devuelve_el_mas_cercano(encodings):
+    consulta = encodings[42] + 0.001
+    distancias = np.linalg.norm(encodings - consulta, axis=1)
+    resultado = cargar(BackendExacto()).buscar(consulta)
+
+    assert resultado.username == "u42"
+    assert resultado.distancia == pytest.approx(distancias[42], abs=1e-5)
+    assert resultado.margen == pytest.approx(np.partition(distancias, 1)[1] - distancias[42], abs=1e-5)
+    assert resultado.evaluados == len(encodings)
+
+
+def test_lsh_filtra_y_coincide_con_el_exacto(encodings):
+    indice = cargar(BackendLSH(tablas=8, bits=6))
+    consulta = encodings[7] + 0.001
+    resultado = indice.buscar(consulta)
+
+    assert resultado.username == "u7"
+    assert 2 <= resultado.evaluados < len(encodings)
+    assert resultado.distancia == pytest.approx(cargar(BackendExacto()).buscar(consulta).distancia, abs=1e-5)
+
+
+def test_lsh_sin_candidatos_cae_al_exacto(encodings):
+    # Con una sola tabla de 32 bits una consulta lejana no comparte cubeta con nadie
+    backend = BackendLSH(tablas=1, bits=32)
+    indice = cargar(backend)
+    consulta = -encodings.mean(axis=0) * 50
+    assert len(backend.candidatos(consulta)) < 2
+
+    resultado = indice.buscar(consulta)
+    exacto = cargar(BackendExacto()).buscar(consulta)
+    assert (resultado.username, resultado.evaluados) == (exacto.username, len(encodings))
+    assert resultado.distancia == pytest.approx(exacto.distancia)
+
+
+def test_actualizar_y_eliminar_sin_recargar(encodings):
+    indice = cargar(BackendLSH(tablas=8, bits=6))
+    nuevo = np.full(128, 0.5, dtype=np.float32)
+    indice.actualizar("nuevo", nuevo)
+    assert indice.buscar(nuevo).username == "nuevo"
+
+    indice.eliminar("nuevo")
+    assert len(indice) == len(encodings)
+    assert indice.buscar(nuevo).username != "nuevo"
+
+
+def test_indice_vacio(conn):
+    assert cargar(BackendExacto()).buscar(np.zeros(128)).username is None
@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+from datasets import DATASETS, RegistroDatasets
+from motor_stock import MotorStock
+
+STOCK = """id_item,nombre_item,fecha_ingreso,lote,proveedor_id,cantidad (KG),fecha_vencimiento
+1,Harina,01/01/2026,L1,3,100,10/02/2026
+2,Harina,01/01/2026,L2,3,50,01/03/2026
+3,Harina,01/01/2026,L3,4,200,15/03/2026
+4,Harina,01/01/2026,L4,4,80,20/02/2026
+5,Harina,01/01/2026,L5,3,120,30/04/2026
+6,Azucar,01/01/2026,L6,5,90,01/03/2026
+"""
+
+HOY = date(2026, 2, 15)
+
+
+@pytest.fixture
+def motor(tmp_path):
+    (tmp_path / "stock.csv").write_text(STOCK, encoding="utf-8")
+    return MotorStock(RegistroDatasets(str(tmp_path), {"stock": DATASETS["stock"]}))
+
+
+def test_fefo_saltea_los_vencidos(motor):
+    picking = motor.picking_fefo("harina", 260, hoy=HOY)
+
+    # L1 venció el 10/02; siguen L4 (20/02), L2 (01/03) y L3 (15/03), usado en parte
+    assert list(picking["lotes"]["lote"]) == ["L4", "L2", "L3"]
+    assert list(picking["lotes"]["usar_kg"]) == [80, 50, 130]
+    assert picking["disponible_kg"] == 450
+    assert picking["faltante_kg"] == 0
+
+
+def test_fefo_sin_stock_suficiente(motor):
+    picking = motor.picking_fefo("Harina", 500, hoy=HOY)
+    assert list(picking["lotes"]["lote"]) == ["L4", "L2", "L3", "L5"]
+    assert picking["lotes"]["usar_kg"].sum() == 450
+    assert picking["faltante_kg"] == 50
+
+
+def test_fefo_con_todos_los_lotes_vencidos(motor):
+    picking = motor.picking_fefo("Harina", 10, hoy=date(2026, 5, 1))
+    assert picking["lotes"].empty
+    assert picking["faltante_kg"] == 10
+
+
+def test_fefo_producto_inexistente(motor):
+    assert motor.picking_fefo("Sal", 10, hoy=HOY) is None
+
+
+def test_por_vencer_incluye_vencidos_a_pedido(motor):
+    assert list(motor.por_vencer(15, hoy=HOY)["lotes"]["lote"]) == ["L4", "L2", "L6"]
+    alertas = motor.por_vencer(15, incluir_vencidos=True, hoy=HOY)
+    assert list(alertas["lotes"]["lote"]) == ["L1", "L4", "L2", "L6"]
+    assert alertas["lotes"]["estado_vencimiento"].iloc[0] == "Vencido"
+    assert alertas["total_kg"] == 320
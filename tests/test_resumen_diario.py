@@ -0,0 +1,50 @@
+import resumen_diario
+
+
+def registrar(c, username, ingreso_ts, egreso_ts=None):
+    c.execute("INSERT INTO registros (id_empleado, username, fecha, ingreso_ts, egreso_ts) VALUES (?, ?, ?, ?, ?)",
+              (7, username, ingreso_ts[:10], ingreso_ts, egreso_ts))
+    resumen_diario.actualizar_dia(c, username, ingreso_ts)
+
+
+def resumen(conn, username):
+    return conn.execute("""
+        SELECT dia, minutos, sesiones, primer_ingreso, ultimo_egreso, sesion_abierta
+        FROM resumen_diario WHERE username = ? ORDER BY dia
+    """, (username,)).fetchall()
+
+
+def test_turno_que_cruza_la_medianoche(conn):
+    c = conn.cursor()
+    registrar(c, "ana", "2026-03-01T22:00:00", "2026-03-02T06:00:00")
+
+    # El turno cuenta entero para el día en que empezó
+    (dia, minutos, sesiones, primer_ingreso, ultimo_egreso, abierta), = resumen(conn, "ana")
+    assert dia == "2026-03-01"
+    assert round(minutos) == 480
+    assert (sesiones, abierta) == (1, 0)
+    assert (primer_ingreso, ultimo_egreso) == ("2026-03-01T22:00:00", "2026-03-02T06:00:00")
+
+
+def test_sesion_abierta_y_cierre_despues_de_medianoche(conn):
+    c = conn.cursor()
+    registrar(c, "ana", "2026-03-01T08:00:00", "2026-03-01T12:00:00")
+    registrar(c, "ana", "2026-03-01T23:00:00")
+    (_, minutos, sesiones, _, _, abierta), = resumen(conn, "ana")
+    assert (round(minutos), sesiones, abierta) == (240, 1, 1)
+
+    c.execute("UPDATE registros SET egreso_ts = '2026-03-02T01:30:00' WHERE egreso_ts IS NULL")
+    resumen_diario.actualizar_dia(c, "ana", "2026-03-01T23:00:00")
+    (dia, minutos, sesiones, _, ultimo_egreso, abierta), = resumen(conn, "ana")
+    assert (dia, round(minutos), sesiones, abierta) == ("2026-03-01", 390, 2, 0)
+    assert ultimo_egreso == "2026-03-02T01:30:00"
+
+
+def test_reconstruir_coincide_con_lo_incremental(conn):
+    c = conn.cursor()
+    registrar(c, "ana", "2026-03-01T22:00:00", "2026-03-02T06:00:00")
+    registrar(c, "ana", "2026-03-02T22:00:00", "2026-03-03T05:00:00")
+    incremental = resumen(conn, "ana")
+
+    assert resumen_diario.reconstruir(c) == 2
+    assert resumen(conn, "ana") == incremental
@@ -0,0 +1,37 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from serializacion import MAGIC, VERSION_FORMATO, blob_a_encoding, encoding_a_blob
+
+
+def test_blob_ida_y_vuelta():
+    encoding = np.random.default_rng(0).standard_normal(128)
+    blob = encoding_a_blob(encoding)
+
+    assert blob[:2] == MAGIC
+    assert len(blob) == 8 + 128 * 4
+    np.testing.assert_array_equal(blob_a_encoding(blob), encoding.astype(np.float32))
+
+
+def test_blob_se_lee_sin_copia():
+    decodificado = blob_a_encoding(encoding_a_blob(np.ones(128)))
+    assert decodificado.dtype == np.float32
+    assert not decodificado.flags.owndata
+
+
+def test_acepta_el_json_anterior():
+    valores = [0.5, -0.25, 1.0]
+    np.testing.assert_array_equal(blob_a_encoding(json.dumps(valores)), np.float32(valores))
+
+
+@pytest.mark.parametrize("cabecera", [
+    struct.pack("<2sBcH2x", b"XX", VERSION_FORMATO, b"f", 128),
+    struct.pack("<2sBcH2x", MAGIC, VERSION_FORMATO + 1, b"f", 128),
+    struct.pack("<2sBcH2x", MAGIC, VERSION_FORMATO, b"d", 128),
+])
+def test_cabecera_desconocida(cabecera):
+    with pytest.raises(ValueError):
+        blob_a_encoding(cabecera + bytes(128 * 4))
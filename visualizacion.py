@@ -1,89 +1,96 @@
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Para evitar problemas con hilos en Flask
-from flask import Flask, render_template, Blueprint
+from flask import (Flask, render_template, Blueprint, Response, request, session, url_for, abort, jsonify,
+                   current_app, stream_with_context)
 import io
-import base64
-from datetime import datetime
+import gzip
+import hashlib
+import json
+from datetime import datetime, date, timedelta
 from decorators import facial_auth_required, role_required
-import sqlite3
+from db import get_conn, version_tabla
+from cache_graficos import CacheGraficos
+from graficos import (PoolRender, grafico_barras, grafico_torta, grafico_lineas, colores_paleta,
+                      COLORES_VENCIMIENTO)
+from datasets import RegistroDatasets
+from motor_oee import MotorOEE
+from motor_stock import MotorStock
+from metricas import CONSULTAS_DB, RENDER_GRAFICOS
+from reportes import (horas_por_empleado, iterar_registros, iterar_resumen_diario, exportar_csv, exportar_parquet,
+                      parquet_disponible)
+from arranque import importar_diferido
+
+pd = importar_diferido("pandas")
 
 # --- 1. Inicialización de la Aplicación Flask ---
 app = Flask(__name__)
 
 visualizacion_bp = Blueprint("visualizacion", __name__)
 
+# Gráficos renderizados (y respuestas de la API JSON), compartidos por todos los requests del proceso
+cache_graficos = CacheGraficos()
+# Hilos que renderizan gráficos (cada uno con su propia figura, sin estado global de pyplot)
+pool_render = PoolRender()
+
+@visualizacion_bp.record_once
+def _configurar_cache(state):
+    cache_graficos.configurar(
+        max_bytes=state.app.config.get("CACHE_GRAFICOS_MAX_MB", 32) * 1024 * 1024,
+        max_entradas=state.app.config.get("CACHE_GRAFICOS_MAX_ENTRADAS", 256),
+    )
+    pool_render.configurar(state.app.config.get("RENDER_HILOS", pool_render.hilos))
+
 # --- 2. Rutas y Directorios ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "Data")
-DB_PATH = os.path.join(DATA_DIR, "usuarios.db")
-
-# Diccionario para mapear nombres amigables a los archivos CSV (menos ingresos/egresos que ya va a DB)
-files = {
-    'autorizaciones': 'autorizaciones.csv',
-    'produccion': 'produccion.csv',
-    'proveedores': 'proveedores.csv',
-    'stock': 'stock.csv',
-    'trazabilidad': 'trazabilidad_lotes.csv',
-    'transporte': 'carga_transporte.csv',
-}
+# Se puede apuntar a otro directorio (p. ej. los CSV escalados de benchmark.py)
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "Data"))
 
-# Cargar datasets CSV
-dataframes = {}
-for name, filename in files.items():
-    try:
-        if name == 'produccion':
-            content = globals().get(f"{name}_content", "")
-            if content:
-                dataframes[name] = pd.read_csv(io.StringIO(content), parse_dates=['fecha'], dayfirst=True)
-            else:
-                path = os.path.join(DATA_DIR, filename)
-                dataframes[name] = pd.read_csv(path, parse_dates=['fecha'], dayfirst=True)
-        else:
-            content = globals().get(f"{name}_content", "")
-            if content:
-                dataframes[name] = pd.read_csv(io.StringIO(content))
-            else:
-                path = os.path.join(DATA_DIR, filename)
-                dataframes[name] = pd.read_csv(path)
-
-        print(f"✅ Dataset '{filename}' cargado correctamente.")
-    except Exception as e:
-        print(f"❌ Error cargando '{filename}': {str(e)}")
+# Datasets CSV (menos ingresos/egresos que ya va a DB): se cargan recién al usarse y se
+# recargan solos cuando cambia el archivo
+datasets = RegistroDatasets(DATA_DIR)
+
+# OEE memoizado: se recalcula solo lo que cambió en los CSV de producción
+motor_oee = MotorOEE(datasets)
+
+# Lotes de stock indexados por vencimiento: picking FEFO y alertas sin recorrer el CSV
+motor_stock = MotorStock(datasets)
 
 # --- 3. Procesamiento de Datos para Análisis de Desperdicios ---
 def procesar_datos_desperdicios():
-    if 'produccion' not in dataframes:
+    produccion = datasets.obtener('produccion')
+    if produccion is None:
         return None
 
-    desperdicio_por_producto = dataframes['produccion'].groupby('producto')['desperdicio'].sum().reset_index()
+    desperdicio_por_producto = produccion.groupby('producto', observed=True)['desperdicio'].sum().reset_index()
     desperdicio_por_producto = desperdicio_por_producto.sort_values('desperdicio', ascending=False)
     return desperdicio_por_producto
 
 # --- 4. Procesar Horas Trabajadas desde la DB ---
-def procesar_horas_trabajadas():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM registros", conn)
-    conn.close()
-
-    if df.empty:
+def procesar_horas_trabajadas(desde=None, hasta=None, username=None):
+    # Sale de resumen_diario (empleado x día), mantenido en cada ingreso/egreso: no se recorren los registros
+    with CONSULTAS_DB.medir(consulta="horas_por_empleado"):
+        horas = horas_por_empleado(get_conn(), desde, hasta, username)
+    if horas.empty:
         return None
+    return horas
 
-    # Convertir horas a datetime
-    df['hora_ingreso'] = pd.to_datetime(df['hora_ingreso'], format='%H:%M', errors='coerce')
-    df['hora_egreso'] = pd.to_datetime(df['hora_egreso'], format='%H:%M', errors='coerce')
-
-    # Filtrar solo registros con ingreso y egreso válidos
-    df = df.dropna(subset=['hora_ingreso', 'hora_egreso'])
-
-    # Calcular horas trabajadas
-    df['horas_trabajadas'] = (df['hora_egreso'] - df['hora_ingreso']).dt.total_seconds() / 3600
-
-    # Agrupar por empleado
-    horas_por_empleado = df.groupby(['id_empleado', 'username'])['horas_trabajadas'].sum().reset_index()
-    return horas_por_empleado
+def _periodo_horarios(args):
+    """desde/hasta (AAAA-MM-DD) y empleado de la query string; por defecto los últimos HORARIOS_DIAS días."""
+    try:
+        hasta = datetime.strptime(args["hasta"], "%Y-%m-%d").date() if args.get("hasta") else date.today()
+        if args.get("desde"):
+            desde = datetime.strptime(args["desde"], "%Y-%m-%d").date()
+        else:
+            desde = hasta - timedelta(days=current_app.config.get("HORARIOS_DIAS", 30) - 1)
+    except ValueError:
+        abort(400)
+    if desde > hasta:
+        abort(400)
+    return {"desde": desde, "hasta": hasta, "username": args.get("empleado") or None}
+
+def _args_periodo(periodo):
+    # Para armar URLs (gráfico, API, exportación) con el mismo período que se muestra
+    return {"desde": periodo["desde"].isoformat(), "hasta": periodo["hasta"].isoformat(),
+            "empleado": periodo["username"]}
 
 # --- 5. Rutas de la Aplicación Flask ---
 @visualizacion_bp.route('/')
@@ -91,29 +98,14 @@ def procesar_horas_trabajadas():
 @role_required("ADMIN")
 def index():
     df_oee = calcular_oee()
-    if df_oee is not None:
-        oee_promedio = df_oee['OEE'].mean() * 100
-
-        plt.figure(figsize=(8, 4))
-        bars = plt.bar(df_oee["turno"] + " " + df_oee["fecha"].dt.strftime("%d-%m"), df_oee["OEE"]*100, color="royalblue")
-        plt.title("OEE por Turno", fontsize=14)
-        plt.ylabel("OEE (%)")
-        plt.xticks(rotation=45)
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
-                     f"{height:.1f}%", ha="center", va="bottom")
-        img = io.BytesIO()
-        plt.savefig(img, format="png", bbox_inches="tight")
-        img.seek(0)
-        oee_plot_url = base64.b64encode(img.getvalue()).decode()
-        plt.close()
-
+    promedios = motor_oee.promedios() if df_oee is not None else None
+    if promedios is not None:
+        oee_promedio = promedios['OEE'] * 100
         oee_data = df_oee.to_dict('records')
 
         return render_template('index.html',
                               oee_value="%.1f" % oee_promedio,
-                              oee_plot_url=oee_plot_url,
+                              oee_plot_url=url_for('visualizacion.grafico', nombre='oee_resumen'),
                               oee_data=oee_data)
     else:
         return render_template('index.html',
@@ -129,106 +121,59 @@ def mostrar_desperdicios():
     if datos_desperdicios is None:
         return "Datos de producción no disponibles", 500
 
-    plt.figure(figsize=(10, 8))
-    colors = plt.cm.Set3(range(len(datos_desperdicios)))
-    plt.pie(datos_desperdicios['desperdicio'],
-            labels=datos_desperdicios['producto'],
-            autopct='%1.1f%%',
-            startangle=90,
-            colors=colors)
-    plt.title('Distribución de Desperdicios por Producto', fontsize=16)
-    plt.axis('equal')
-    img = io.BytesIO()
-    plt.savefig(img, format='png', bbox_inches='tight')
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
-
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(datos_desperdicios['producto'], datos_desperdicios['desperdicio'], color=colors)
-    plt.title('Cantidad de Desperdicio por Producto (KG)', fontsize=16)
-    plt.xlabel('Producto')
-    plt.ylabel('Desperdicio (KG)')
-    plt.xticks(rotation=45, ha='right')
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{height:.2f} KG',
-                ha='center', va='bottom')
-    img2 = io.BytesIO()
-    plt.savefig(img2, format='png', bbox_inches='tight')
-    img2.seek(0)
-    plot_url2 = base64.b64encode(img2.getvalue()).decode()
-    plt.close()
-
     tabla_datos = datos_desperdicios.to_dict('records')
     return render_template('desperdicios.html',
-                          plot_url=plot_url,
-                          plot_url2=plot_url2,
+                          plot_url=url_for('visualizacion.grafico', nombre='desperdicios_torta'),
+                          plot_url2=url_for('visualizacion.grafico', nombre='desperdicios_barras'),
                           tabla_datos=tabla_datos)
 
 @visualizacion_bp.route('/horarios')
 @facial_auth_required
 @role_required("ADMIN")
 def mostrar_horarios():
-    datos_horas = procesar_horas_trabajadas()
-    if datos_horas is None or datos_horas.empty:
-        return "Datos de ingresos/egresos no disponibles", 500
-
-    plt.figure(figsize=(12, 8))
-    bars = plt.bar(datos_horas['username'], datos_horas['horas_trabajadas'], color='skyblue')
-    plt.title('Horas Trabajadas por Empleado', fontsize=16)
-    plt.xlabel('Empleado')
-    plt.ylabel('Horas Trabajadas')
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{height:.2f} h',
-                ha='center', va='bottom')
-    plt.tight_layout()
-    img = io.BytesIO()
-    plt.savefig(img, format='png', bbox_inches='tight')
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
-
-    return render_template('horarios.html', plot_url=plot_url, datos=datos_horas.to_dict('records'))
+    # Solo se consulta el período que se muestra
+    periodo = _periodo_horarios(request.args)
+    datos_horas = procesar_horas_trabajadas(**periodo)
+    args = _args_periodo(periodo)
+
+    return render_template('horarios.html',
+                           plot_url=url_for('visualizacion.grafico', nombre='horas_empleado', **args) if datos_horas is not None else "",
+                           exportar_csv=url_for('visualizacion.exportar_registros', formato='csv', **args),
+                           exportar_diario=url_for('visualizacion.exportar_registros', formato='csv', detalle='diario', **args),
+                           exportar_parquet=url_for('visualizacion.exportar_registros', formato='parquet', **args) if parquet_disponible() else "",
+                           desde=args["desde"], hasta=args["hasta"], empleado=periodo["username"] or "",
+                           datos=datos_horas.to_dict('records') if datos_horas is not None else [])
+
+@visualizacion_bp.route('/horarios/exportar.<formato>')
+@facial_auth_required
+@role_required("ADMIN")
+def exportar_registros(formato):
+    # Los registros se leen y se envían de a bloques: la memoria no depende del tamaño de la tabla
+    # ?detalle=diario exporta el resumen por empleado y día en lugar de cada registro
+    periodo = _periodo_horarios(request.args)
+    tipo = "diario" if request.args.get("detalle") == "diario" else "registros"
+    iterar = iterar_resumen_diario if tipo == "diario" else iterar_registros
+    bloques = iterar(get_conn(), **periodo)
+    nombre = f"{tipo}_{periodo['desde']}_{periodo['hasta']}.{formato}"
+    if formato == "csv":
+        cuerpo, mimetype = exportar_csv(bloques, tipo), "text/csv"
+    elif formato == "parquet":
+        # Sin pyarrow el enlace no se muestra; un pedido directo recibe 501
+        if not parquet_disponible():
+            abort(501)
+        cuerpo, mimetype = exportar_parquet(bloques, tipo), "application/vnd.apache.parquet"
+    else:
+        abort(404)
+    return Response(stream_with_context(cuerpo), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{nombre}"'})
 
 # --- 6. Procesamiento de Stock ---
 def procesar_datos_stock():
-    if 'stock' not in dataframes:
+    # Se calcula una vez por día y versión de los CSV (motor_stock): no copiar ni modificar los DataFrames
+    resumen = motor_stock.resumen()
+    if resumen is None:
         return None, None, None, None
-
-    df = dataframes['stock'].copy()
-    df['fecha_ingreso'] = pd.to_datetime(df['fecha_ingreso'], dayfirst=True)
-    df['fecha_vencimiento'] = pd.to_datetime(df['fecha_vencimiento'], dayfirst=True)
-    hoy = pd.to_datetime(datetime.now().strftime('%Y-%m-%d'))
-    df['dias_hasta_vencer'] = (df['fecha_vencimiento'] - hoy).dt.days
-
-    def categorizar_vencimiento(dias):
-        if dias < 0:
-            return 'Vencido'
-        elif dias < 30:
-            return 'Por vencer (≤30 días)'
-        elif dias < 90:
-            return 'Próximo a vencer (31-90 días)'
-        else:
-            return 'Vigente (>90 días)'
-
-    df['estado_vencimiento'] = df['dias_hasta_vencer'].apply(categorizar_vencimiento)
-    stock_por_producto = df.groupby('nombre_item')['cantidad (KG)'].sum().reset_index()
-    productos_proximos_vencer = df[df['dias_hasta_vencer'] <= 30].copy()
-    stock_por_proveedor = df.groupby('proveedor_id')['cantidad (KG)'].sum().reset_index()
-
-    if 'proveedores' in dataframes:
-        stock_por_proveedor = stock_por_proveedor.merge(
-            dataframes['proveedores'][['proveedor_id', 'nombre']],
-            on='proveedor_id',
-            how='left'
-        )
-
-    return stock_por_producto, productos_proximos_vencer, stock_por_proveedor, df
+    return resumen
 
 @visualizacion_bp.route('/inventario')
 @facial_auth_required
@@ -237,54 +182,6 @@ def mostrar_inventario():
     if stock_producto is None:
         return "Datos de stock no disponibles", 500
 
-    plt.figure(figsize=(10, 6))
-    bars = plt.bar(stock_producto['nombre_item'], stock_producto['cantidad (KG)'], color='lightgreen')
-    plt.title('Cantidad de Stock por Tipo de Producto (KG)', fontsize=16)
-    plt.xlabel('Tipo de Producto')
-    plt.ylabel('Cantidad (KG)')
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{int(height)}',
-                ha='center', va='bottom')
-    plt.tight_layout()
-    img1 = io.BytesIO()
-    plt.savefig(img1, format='png')
-    img1.seek(0)
-    plot_url1 = base64.b64encode(img1.getvalue()).decode()
-    plt.close()
-
-    estado_counts = df_stock['estado_vencimiento'].value_counts()
-    plt.figure(figsize=(8, 8))
-    colors = ['#ff6b6b', '#ffa726', '#42a5f5', '#66bb6a']
-    plt.pie(estado_counts.values, labels=estado_counts.index, autopct='%1.1f%%', colors=colors)
-    plt.title('Distribución de Stock por Estado de Vencimiento', fontsize=16)
-    img2 = io.BytesIO()
-    plt.savefig(img2, format='png')
-    img2.seek(0)
-    plot_url2 = base64.b64encode(img2.getvalue()).decode()
-    plt.close()
-
-    plt.figure(figsize=(10, 6))
-    labels = stock_proveedor['nombre'] if 'nombre' in stock_proveedor.columns else stock_proveedor['proveedor_id'].astype(str)
-    bars = plt.bar(labels, stock_proveedor['cantidad (KG)'], color='orange')
-    plt.title('Cantidad de Stock por Proveedor (KG)', fontsize=16)
-    plt.xlabel('Proveedor')
-    plt.ylabel('Cantidad (KG)')
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{int(height)}',
-                ha='center', va='bottom')
-    plt.tight_layout()
-    img3 = io.BytesIO()
-    plt.savefig(img3, format='png')
-    img3.seek(0)
-    plot_url3 = base64.b64encode(img3.getvalue()).decode()
-    plt.close()
-
     tabla_stock = df_stock.to_dict('records')
     tabla_proximos = productos_proximos.to_dict('records')
     total_stock = df_stock['cantidad (KG)'].sum()
@@ -292,9 +189,9 @@ def mostrar_inventario():
     productos_por_vencer = len(productos_proximos)
 
     return render_template('Inventario.html',
-                          plot_url1=plot_url1,
-                          plot_url2=plot_url2,
-                          plot_url3=plot_url3,
+                          plot_url1=url_for('visualizacion.grafico', nombre='stock_producto'),
+                          plot_url2=url_for('visualizacion.grafico', nombre='stock_vencimiento'),
+                          plot_url3=url_for('visualizacion.grafico', nombre='stock_proveedor'),
                           tabla_stock=tabla_stock,
                           tabla_proximos=tabla_proximos,
                           total_stock=total_stock,
@@ -304,19 +201,7 @@ def mostrar_inventario():
 # --- 7. Calcular OEE ---
 def calcular_oee():
     try:
-        tiempos = pd.read_csv(os.path.join(DATA_DIR, "tiempos_produccion.csv"), parse_dates=["fecha"])
-        produccion = pd.read_csv(os.path.join(DATA_DIR, "produccion_velocidad.csv"), parse_dates=["fecha"])
-        calidad = pd.read_csv(os.path.join(DATA_DIR, "calidad.csv"), parse_dates=["fecha"])
-
-        df = tiempos.merge(produccion, on=["fecha", "turno"]).merge(calidad, on=["fecha", "turno"])
-        df["Disponibilidad"] = df["tiempo_operativo_min"] / df["tiempo_planificado_min"]
-        df["Rendimiento"] = df["unidades_producidas"] / (df["tiempo_operativo_min"] * df["velocidad_ideal_upm"])
-        df["Calidad"] = (df["unidades_totales"] - df["unidades_defectuosas"]) / df["unidades_totales"]
-        df["OEE"] = df["Disponibilidad"] * df["Rendimiento"] * df["Calidad"]
-
-        if 'velocidad_real_upm' not in df.columns:
-            df['velocidad_real_upm'] = df['unidades_producidas'] / (df['tiempo_operativo_min'] / 60)
-        return df
+        return motor_oee.por_turno()
     except Exception as e:
         print(f"Error al calcular OEE: {e}")
         return None
@@ -329,112 +214,331 @@ def mostrar_oee():
     if df is None:
         return "No se pudo calcular OEE", 500
 
-    # Calcular promedios
-    disponibilidad_promedio = df["Disponibilidad"].mean()
-    rendimiento_promedio = df["Rendimiento"].mean()
-    calidad_promedio = df["Calidad"].mean()
-    oee_promedio = df["OEE"].mean()
-
-    # === Gráfico principal OEE ===
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(
-        df["turno"] + " " + df["fecha"].dt.strftime("%d-%m"),
-        df["OEE"] * 100,
-        color=["royalblue" if x >= 0.85 else "orange" if x >= 0.65 else "red" for x in df["OEE"]]
-    )
-    plt.title("Indicador OEE por Turno", fontsize=16)
-    plt.ylabel("OEE (%)")
-    plt.axhline(y=85, color='green', linestyle='--', alpha=0.7, label='Excelente (85%)')
-    plt.axhline(y=65, color='orange', linestyle='--', alpha=0.7, label='Aceptable (65%)')
-    plt.legend()
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height, f"{height:.1f}%", ha="center", va="bottom")
-    img = io.BytesIO()
-    plt.savefig(img, format="png", bbox_inches="tight")
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close()
-
-    # === Gráfico de Disponibilidad ===
-    plt.figure(figsize=(10, 5))
-    bars = plt.bar(df["turno"] + " " + df["fecha"].dt.strftime("%d-%m"), df["Disponibilidad"] * 100, color="lightblue")
-    plt.title("Disponibilidad por Turno", fontsize=14)
-    plt.ylabel("Disponibilidad (%)")
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height, f"{height:.1f}%", ha="center", va="bottom")
-    img_disp = io.BytesIO()
-    plt.savefig(img_disp, format="png", bbox_inches="tight")
-    img_disp.seek(0)
-    plot_disponibilidad = base64.b64encode(img_disp.getvalue()).decode()
-    plt.close()
-
-    # === Gráfico de Rendimiento ===
-    plt.figure(figsize=(10, 5))
-    bars = plt.bar(df["turno"] + " " + df["fecha"].dt.strftime("%d-%m"), df["Rendimiento"] * 100, color="lightgreen")
-    plt.title("Rendimiento por Turno", fontsize=14)
-    plt.ylabel("Rendimiento (%)")
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height, f"{height:.1f}%", ha="center", va="bottom")
-    img_rend = io.BytesIO()
-    plt.savefig(img_rend, format="png", bbox_inches="tight")
-    img_rend.seek(0)
-    plot_rendimiento = base64.b64encode(img_rend.getvalue()).decode()
-    plt.close()
-
-    # === Gráfico de Calidad ===
-    plt.figure(figsize=(10, 5))
-    bars = plt.bar(df["turno"] + " " + df["fecha"].dt.strftime("%d-%m"), df["Calidad"] * 100, color="gold")
-    plt.title("Calidad por Turno", fontsize=14)
-    plt.ylabel("Calidad (%)")
-    plt.xticks(rotation=45)
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height, f"{height:.1f}%", ha="center", va="bottom")
-    img_cal = io.BytesIO()
-    plt.savefig(img_cal, format="png", bbox_inches="tight")
-    img_cal.seek(0)
-    plot_calidad = base64.b64encode(img_cal.getvalue()).decode()
-    plt.close()
-
-    # === Gráfico de Evolución del OEE ===
+    # Promedios y estadísticas salen de los resúmenes precalculados del motor
+    promedios = motor_oee.promedios()
+    stats_por_turno = motor_oee.resumen("turno", promediar_cantidades=True)
+    productos_stats = motor_oee.resumen("producto")
+
+    # Pasar tabla y URLs de los gráficos al template
+    return render_template("oee.html",
+                           tabla_oee=df.to_dict("records"),
+                           plot_url=url_for('visualizacion.grafico', nombre='oee_turno'),
+                           plot_disponibilidad=url_for('visualizacion.grafico', nombre='oee_disponibilidad'),
+                           plot_rendimiento=url_for('visualizacion.grafico', nombre='oee_rendimiento'),
+                           plot_calidad=url_for('visualizacion.grafico', nombre='oee_calidad'),
+                           plot_evolucion=url_for('visualizacion.grafico', nombre='oee_evolucion'),
+                           stats_por_turno=stats_por_turno.to_dict("records"),
+                           productos_stats=productos_stats.to_dict("records"),
+                           disponibilidad_promedio=promedios["Disponibilidad"],
+                           rendimiento_promedio=promedios["Rendimiento"],
+                           calidad_promedio=promedios["Calidad"],
+                           oee_promedio=promedios["OEE"])
+
+# --- 8. Gráficos (servidos como imágenes aparte, con cache y ETag) ---
+def _etiquetas_turno(df):
+    return df["turno"].astype(str) + " " + df["fecha"].dt.strftime("%d-%m")
+
+def _porcentaje(h):
+    return f"{h:.1f}%"
+
+def _grafico_oee_resumen():
+    df_oee = calcular_oee()
+    if df_oee is None:
+        return None
+    return grafico_barras(_etiquetas_turno(df_oee), df_oee["OEE"] * 100, "OEE por Turno", "royalblue",
+                          formato=_porcentaje, ylabel="OEE (%)", figsize=(8, 4), titulo_fontsize=14)
+
+def _grafico_oee_turno():
+    df = calcular_oee()
+    if df is None:
+        return None
+    colores = ["royalblue" if x >= 0.85 else "orange" if x >= 0.65 else "red" for x in df["OEE"]]
+    return grafico_barras(_etiquetas_turno(df), df["OEE"] * 100, "Indicador OEE por Turno", colores,
+                          formato=_porcentaje, ylabel="OEE (%)", figsize=(12, 6),
+                          referencias_oee=True, leyenda=True)
+
+def _grafico_oee_componente(columna, titulo, color):
+    def render():
+        df = calcular_oee()
+        if df is None:
+            return None
+        return grafico_barras(_etiquetas_turno(df), df[columna] * 100, f"{titulo} por Turno", color,
+                              formato=_porcentaje, ylabel=f"{titulo} (%)", figsize=(10, 5), titulo_fontsize=14)
+    return render
+
+def _grafico_oee_evolucion():
+    df = calcular_oee()
+    if df is None:
+        return None
     df_sorted = df.sort_values('fecha')
-    plt.figure(figsize=(10, 5))
+    series = []
     for turno in df_sorted['turno'].unique():
         df_turno = df_sorted[df_sorted['turno'] == turno]
-        plt.plot(df_turno['fecha'].dt.strftime("%d-%m"), df_turno['OEE'] * 100,
-                 marker='o', label=f"Turno {turno}")
-    plt.title("Evolución del OEE", fontsize=14)
-    plt.ylabel("OEE (%)")
-    plt.xlabel("Fecha")
-    plt.legend()
-    plt.axhline(y=85, color='green', linestyle='--', alpha=0.7, label='Excelente (85%)')
-    plt.axhline(y=65, color='orange', linestyle='--', alpha=0.7, label='Aceptable (65%)')
-    plt.xticks(rotation=45)
-    img_evo = io.BytesIO()
-    plt.savefig(img_evo, format="png", bbox_inches="tight")
-    img_evo.seek(0)
-    plot_evolucion = base64.b64encode(img_evo.getvalue()).decode()
-    plt.close()
-
-    # Pasar tabla y gráficos al template
-    return render_template("oee.html",
-                           tabla_oee=df.to_dict("records"),
-                           plot_url=plot_url,
-                           plot_disponibilidad=plot_disponibilidad,
-                           plot_rendimiento=plot_rendimiento,
-                           plot_calidad=plot_calidad,
-                           plot_evolucion=plot_evolucion,
-                           disponibilidad_promedio=disponibilidad_promedio,
-                           rendimiento_promedio=rendimiento_promedio,
-                           calidad_promedio=calidad_promedio,
-                           oee_promedio=oee_promedio)
+        series.append((f"Turno {turno}", df_turno['fecha'].dt.strftime("%d-%m"), df_turno['OEE'] * 100))
+    return grafico_lineas(series, "Evolución del OEE", ylabel="OEE (%)", xlabel="Fecha", referencias_oee=True)
 
+def _grafico_desperdicios_torta():
+    datos_desperdicios = procesar_datos_desperdicios()
+    if datos_desperdicios is None:
+        return None
+    return grafico_torta(datos_desperdicios['desperdicio'], datos_desperdicios['producto'],
+                         'Distribución de Desperdicios por Producto',
+                         colores=colores_paleta('Set3', len(datos_desperdicios)),
+                         figsize=(10, 8), startangle=90, aspecto_igual=True, bbox_inches='tight')
+
+def _grafico_desperdicios_barras():
+    datos_desperdicios = procesar_datos_desperdicios()
+    if datos_desperdicios is None:
+        return None
+    return grafico_barras(datos_desperdicios['producto'], datos_desperdicios['desperdicio'],
+                          'Cantidad de Desperdicio por Producto (KG)', colores_paleta('Set3', len(datos_desperdicios)),
+                          formato=lambda h: f'{h:.2f} KG', ylabel='Desperdicio (KG)', xlabel='Producto',
+                          figsize=(12, 6), alineacion='right')
+
+def _grafico_horas_empleado(**periodo):
+    datos_horas = procesar_horas_trabajadas(**periodo)
+    if datos_horas is None or datos_horas.empty:
+        return None
+    return grafico_barras(datos_horas['username'], datos_horas['horas_trabajadas'], 'Horas Trabajadas por Empleado',
+                          'skyblue', formato=lambda h: f'{h:.2f} h', ylabel='Horas Trabajadas', xlabel='Empleado',
+                          figsize=(12, 8), tight_layout=True)
+
+def _grafico_stock_producto():
+    stock_producto, _, _, _ = procesar_datos_stock()
+    if stock_producto is None:
+        return None
+    return grafico_barras(stock_producto['nombre_item'], stock_producto['cantidad (KG)'],
+                          'Cantidad de Stock por Tipo de Producto (KG)', 'lightgreen',
+                          formato=lambda h: f'{int(h)}', ylabel='Cantidad (KG)', xlabel='Tipo de Producto',
+                          tight_layout=True, bbox_inches=None)
+
+def _grafico_stock_vencimiento():
+    _, _, _, df_stock = procesar_datos_stock()
+    if df_stock is None:
+        return None
+    estado_counts = df_stock['estado_vencimiento'].value_counts()
+    return grafico_torta(estado_counts.values, estado_counts.index, 'Distribución de Stock por Estado de Vencimiento',
+                         colores=COLORES_VENCIMIENTO)
+
+def _grafico_stock_proveedor():
+    _, _, stock_proveedor, _ = procesar_datos_stock()
+    if stock_proveedor is None:
+        return None
+    labels = stock_proveedor['nombre'] if 'nombre' in stock_proveedor.columns else stock_proveedor['proveedor_id'].astype(str)
+    return grafico_barras(labels, stock_proveedor['cantidad (KG)'], 'Cantidad de Stock por Proveedor (KG)', 'orange',
+                          formato=lambda h: f'{int(h)}', ylabel='Cantidad (KG)', xlabel='Proveedor',
+                          tight_layout=True, bbox_inches=None)
+
+# Huellas de los datos de origen: cambian cuando cambia el archivo o la tabla
+def _huella_datasets(*nombres):
+    def huella():
+        return tuple((nombre, datasets.huella(nombre)) for nombre in nombres)
+    return huella
+
+def _huella_registros():
+    # Las horas salen de resumen_diario, que también cambia al reconstruirlo desde la CLI
+    return ("registros", version_tabla("registros"), version_tabla("resumen_diario"))
+
+_huella_oee = _huella_datasets("tiempos_produccion", "produccion_velocidad", "calidad")
+_huella_produccion = _huella_datasets("produccion")
+# El estado de vencimiento depende del día actual
+_huella_stock_archivos = _huella_datasets("stock", "proveedores")
+def _huella_stock():
+    return _huella_stock_archivos() + (datetime.now().strftime('%Y-%m-%d'),)
+
+# nombre -> (función de huella, función de render, roles habilitados o None = cualquier usuario autenticado)
+GRAFICOS = {
+    "oee_resumen": (_huella_oee, _grafico_oee_resumen, ("ADMIN",)),
+    "oee_turno": (_huella_oee, _grafico_oee_turno, ("ADMIN",)),
+    "oee_disponibilidad": (_huella_oee, _grafico_oee_componente("Disponibilidad", "Disponibilidad", "lightblue"), ("ADMIN",)),
+    "oee_rendimiento": (_huella_oee, _grafico_oee_componente("Rendimiento", "Rendimiento", "lightgreen"), ("ADMIN",)),
+    "oee_calidad": (_huella_oee, _grafico_oee_componente("Calidad", "Calidad", "gold"), ("ADMIN",)),
+    "oee_evolucion": (_huella_oee, _grafico_oee_evolucion, ("ADMIN",)),
+    "desperdicios_torta": (_huella_produccion, _grafico_desperdicios_torta, ("ADMIN",)),
+    "desperdicios_barras": (_huella_produccion, _grafico_desperdicios_barras, ("ADMIN",)),
+    "horas_empleado": (_huella_registros, _grafico_horas_empleado, ("ADMIN",)),
+    "stock_producto": (_huella_stock, _grafico_stock_producto, None),
+    "stock_vencimiento": (_huella_stock, _grafico_stock_vencimiento, None),
+    "stock_proveedor": (_huella_stock, _grafico_stock_proveedor, None),
+}
+
+def _parametros_fefo(args):
+    """producto y kg (> 0) a retirar, ambos obligatorios."""
+    producto = (args.get("producto") or "").strip()
+    try:
+        kg = float(args.get("kg", ""))
+    except ValueError:
+        abort(400)
+    if not producto or not kg > 0 or kg == float("inf"):
+        abort(400)
+    return {"producto": producto, "kg": kg}
+
+def _parametros_alertas(args):
+    """dias hacia adelante (30 por defecto), vencidos=1 para incluir los ya vencidos y limite de lotes."""
+    try:
+        dias = int(args.get("dias", 30))
+        limite = int(args.get("limite", 100))
+    except ValueError:
+        abort(400)
+    if dias < 0 or limite < 1:
+        abort(400)
+    return {"dias": dias, "vencidos": args.get("vencidos") in ("1", "true", "si"), "limite": limite}
+
+# Gráficos y endpoints de la API que reciben filtros por query string: nombre -> función que los lee
+PARAMETROS = {
+    "horas_empleado": _periodo_horarios,
+    "horarios": _periodo_horarios,
+    "stock_fefo": _parametros_fefo,
+    "stock_alertas": _parametros_alertas,
+}
+
+def _parametros(nombre):
+    parametros = PARAMETROS[nombre](request.args) if nombre in PARAMETROS else {}
+    # Los filtros forman parte de la clave de cache y del ETag
+    return parametros, tuple(sorted(parametros.items()))
+
+@visualizacion_bp.route("/datasets")
+@facial_auth_required
+@role_required("ADMIN")
+def estado_datasets():
+    # Tiempos de carga, filas y memoria de cada dataset, para detectar CSVs que crecen demasiado
+    return jsonify(datasets.tiempos())
+
+def _respuesta_cacheada(clave, generar, mimetype, content_encoding=None):
+    # El ETag sale de la huella de los datos: si no cambiaron, se responde 304 sin generar nada
+    etag = hashlib.sha1(repr(clave).encode()).hexdigest()
+    if etag in request.if_none_match:
+        respuesta = Response(status=304)
+    else:
+        cuerpo = cache_graficos.obtener(clave)
+        if cuerpo is None:
+            cuerpo = generar()
+            if cuerpo is None:
+                abort(404)
+            cache_graficos.guardar(clave, cuerpo)
+        respuesta = Response(cuerpo, mimetype=mimetype)
+        if content_encoding:
+            respuesta.headers["Content-Encoding"] = content_encoding
+
+    respuesta.set_etag(etag)
+    # El navegador puede guardarla, pero debe revalidar con If-None-Match en cada carga
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+@visualizacion_bp.route("/grafico/<nombre>.png")
+@facial_auth_required
+def grafico(nombre):
+    if nombre not in GRAFICOS:
+        abort(404)
+    huella, render, roles = GRAFICOS[nombre]
+    if roles is not None and session.get("role") not in roles:
+        abort(403)
+    parametros, filtros = _parametros(nombre)
+    clave = (nombre, huella(), filtros)
+    # Se renderiza en el pool; pedidos simultáneos del mismo gráfico comparten un único render
+    def renderizar():
+        with RENDER_GRAFICOS.medir(grafico=nombre):
+            return render(**parametros)
+    return _respuesta_cacheada(clave, lambda: pool_render.renderizar(clave, renderizar), "image/png")
+
+# --- 9. API JSON (mismos datos agregados que los gráficos, para graficar en el navegador) ---
+def _columna_json(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        serie = serie.dt.strftime('%Y-%m-%d')
+    elif pd.api.types.is_float_dtype(serie):
+        if serie.dtype == 'float32':
+            # Pasando por texto se conserva el valor corto (50.21 y no 50.209999084472656)
+            serie = serie.astype(str).astype('float64')
+        serie = serie.replace([float('inf'), float('-inf')], float('nan'))
+    serie = serie.astype(object)
+    return serie.where(serie.notna(), None).tolist()
+
+def _columnar(df):
+    """DataFrame -> {"columnas": [...], "datos": {columna: [valores]}} (una lista por columna)."""
+    if df is None:
+        return None
+    return {
+        "columnas": [str(c) for c in df.columns],
+        "datos": {str(c): _columna_json(df[c]) for c in df.columns},
+    }
+
+def _api_oee():
+    df = calcular_oee()
+    if df is None:
+        return None
+    columnas = ["fecha", "turno", "producto", "Disponibilidad", "Rendimiento", "Calidad", "OEE",
+                "unidades_producidas", "unidades_defectuosas", "tiempo_parada_min"]
+    return {
+        "turnos": _columnar(df[columnas]),
+        "promedios": motor_oee.promedios(),
+        "resumenes": {dimension: _columnar(motor_oee.resumen(dimension))
+                      for dimension in ("dia", "semana", "turno", "producto")},
+    }
+
+def _api_desperdicios():
+    return _columnar(procesar_datos_desperdicios())
+
+def _api_horarios(**periodo):
+    return _columnar(procesar_horas_trabajadas(**periodo))
+
+def _api_inventario():
+    stock_producto, productos_proximos, stock_proveedor, df_stock = procesar_datos_stock()
+    if stock_producto is None:
+        return None
+    return {
+        "por_producto": _columnar(stock_producto),
+        "por_vencimiento": _columnar(df_stock['estado_vencimiento'].value_counts().rename_axis('estado').reset_index(name='cantidad')),
+        "por_proveedor": _columnar(stock_proveedor),
+        "proximos_a_vencer": _columnar(productos_proximos),
+        "total_stock": float(df_stock['cantidad (KG)'].sum()),
+    }
+
+def _api_stock_fefo(producto, kg):
+    picking = motor_stock.picking_fefo(producto, kg)
+    if picking is None:
+        return None
+    return {**picking, "lotes": _columnar(picking["lotes"])}
+
+def _api_stock_alertas(dias, vencidos, limite):
+    alertas = motor_stock.por_vencer(dias, incluir_vencidos=vencidos, limite=limite)
+    if alertas is None:
+        return None
+    return {**alertas, "lotes": _columnar(alertas["lotes"])}
+
+# nombre -> (función de huella, función que arma los datos, roles habilitados o None = cualquier usuario autenticado)
+API = {
+    "oee": (_huella_oee, _api_oee, ("ADMIN",)),
+    "desperdicios": (_huella_produccion, _api_desperdicios, ("ADMIN",)),
+    "horarios": (_huella_registros, _api_horarios, ("ADMIN",)),
+    "inventario": (_huella_stock, _api_inventario, None),
+    "stock_fefo": (_huella_stock, _api_stock_fefo, None),
+    "stock_alertas": (_huella_stock, _api_stock_alertas, None),
+}
+
+@visualizacion_bp.route("/api/<nombre>")
+@facial_auth_required
+def api_datos(nombre):
+    if nombre not in API:
+        abort(404)
+    huella, datos, roles = API[nombre]
+    if roles is not None and session.get("role") not in roles:
+        abort(403)
+
+    comprimir = "gzip" in request.accept_encodings
+    parametros, filtros = _parametros(nombre)
+
+    def generar():
+        contenido = datos(**parametros)
+        if contenido is None:
+            return None
+        cuerpo = json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return gzip.compress(cuerpo, compresslevel=6) if comprimir else cuerpo
+
+    # La versión comprimida y la plana se cachean (y llevan ETag) por separado
+    respuesta = _respuesta_cacheada(("api", nombre, huella(), filtros, comprimir), generar, "application/json",
+                                    content_encoding="gzip" if comprimir else None)
+    respuesta.vary.add("Accept-Encoding")
+    return respuesta
 
 if __name__== '__main__':
     app.run(port=int(os.environ.get("FLASK_PORT", 5000)))